@@ -1,16 +1,18 @@
 import os
 import json
 import io
+import logging
+from contextlib import contextmanager, nullcontext
 import streamlit as st
-import pandas as pd
 from datetime import datetime
+from decimal import Decimal
 from pathlib import Path
 
 
-from tebi_books_transformers.io_reader import load_file
-from tebi_books_transformers.transform_twinfield import build_twinfield_xml
-from tebi_books_transformers.transform_exact import build_exact_csv
-from tebi_books_transformers.export_xml import xml_to_bytes
+# Only light modules here: pandas and the transformers are imported where they are
+# first used, so a cold instance draws Step 1 at once (warm_up_thread loads them meanwhile)
+from tebi_books_transformers.targets import EXACT_XML_TARGET
+from tebi_books_transformers.instrument import recording, span
 
 # ---------- Assets & page config ----------
 ASSETS = Path(__file__).parent / "assets"
@@ -52,6 +54,60 @@ with st.container():
         safe_image(["Tebi_logo.png", "Tebi logo.png", "tebi_logo.png"], width=110)
 st.divider()
 
+# Autoscale instances start cold: import pandas and the transformers and run a tiny
+# conversion on a background thread while the first screen is used (TEBI_WARMUP=0 to skip)
+@st.cache_resource
+def warm_up_thread():
+    from tebi_books_transformers.warmup import warm_up
+    return warm_up()
+
+if os.environ.get("TEBI_WARMUP", "1") != "0":
+    warm_up_thread()
+
+# One parse cache per server process, shared by all sessions.
+# TEBI_PARSE_CACHE_DIR enables on-disk spill so identical exports survive restarts too.
+@st.cache_resource
+def parse_cache():
+    from tebi_books_transformers.cache import ParseCache
+    return ParseCache(
+        max_bytes=int(os.environ.get("TEBI_PARSE_CACHE_MB", "512")) * 1024 * 1024,
+        spill_dir=os.environ.get("TEBI_PARSE_CACHE_DIR") or None,
+    )
+
+# GL mappings remembered per administration (SQLite). Set TEBI_MAPPING_DB to a
+# persistent volume on hosts with an ephemeral filesystem.
+@st.cache_resource
+def mapping_store():
+    from tebi_books_transformers.mapping_store import MappingStore
+    return MappingStore(os.environ.get("TEBI_MAPPING_DB") or (Path(__file__).parent / "data" / "gl_mappings.sqlite3"))
+
+# Per-day output fragments + the days last converted per administration (SQLite).
+# Re-exports of overlapping periods only rebuild the days that changed; fragments
+# not used for TEBI_FRAGMENT_DAYS (default 90) are dropped when the app starts.
+@st.cache_resource
+def fragment_store():
+    from tebi_books_transformers.incremental import FragmentStore
+    store = FragmentStore(os.environ.get("TEBI_FRAGMENT_DB") or (Path(__file__).parent / "data" / "fragments.sqlite3"))
+    store.prune(int(os.environ.get("TEBI_FRAGMENT_DAYS", "90")))
+    return store
+
+# Builds run as background jobs on a small thread pool shared by all sessions. Finished
+# outputs are kept (LRU, TEBI_JOB_CACHE_MB) so a rerun with the same inputs doesn't build again.
+@st.cache_resource
+def build_jobs():
+    from tebi_books_transformers.jobs import JobQueue
+    return JobQueue(
+        workers=int(os.environ.get("TEBI_JOB_WORKERS", "2")),
+        max_bytes=int(os.environ.get("TEBI_JOB_CACHE_MB", "256")) * 1024 * 1024,
+        sizeof=lambda result: len(result["data"]),
+    )
+
+# Diagnostics are logged as one JSON line per stage on the package logger
+_log = logging.getLogger("tebi_books_transformers")
+if not _log.handlers:
+    _log.addHandler(logging.StreamHandler())
+    _log.setLevel(logging.INFO)
+
 # -------------------------
 # App session defaults
 # -------------------------
@@ -68,6 +124,18 @@ defaults = {
     "currency": "EUR",
     "use_kpl": False,
     "kpl_code": "",
+    "split_mode": "Single file",  # Twinfield: Single file / Per month / Every N days / Max size per file
+    "split_days": 7,
+    "split_mb": 5,
+    "diagnostics": os.environ.get("TEBI_DIAGNOSTICS", "") == "1",
+    "trace_memory": False,
+    "diagnostics_spans": {},  # {stage: spans} from the last upload / build
+    "twinfield_output": None,  # XML / ZIP bytes of the last Twinfield build, for "Send to Twinfield"
+    "per_ledger": {},  # {name: (ledger, args, result)}, see per_ledger()
+    "build_job": None,  # jobs.Job of the last build of this session
+    "build_requested": False,  # Step 5: build once the missing mappings are filled in
+    "validate_xml": True,  # Exact XML: check the output against the eExact XSD before offering it
+    "download_as": "Plain file",  # Plain file / Compressed (.gz) / ZIP with balance report
 }
 for k, v in defaults.items():
     if k not in st.session_state:
@@ -81,27 +149,245 @@ def prev_step():
     st.session_state.prev_step_num = st.session_state.step
     st.session_state.step = max(1, st.session_state.step - 1)
 
-def format_date_for_filename(d):
-    if pd.isna(d):
-        return "unknown"
-    try:
-        return pd.to_datetime(d).date().strftime("%Y-%m-%d")
-    except Exception:
-        return str(d)
-
-def build_filename(admin_code, df, target="Twinfield"):
-    if "Date" in df.columns:
-        dates = pd.to_datetime(df["Date"], errors="coerce", dayfirst=True).dropna()
-        if not dates.empty:
-            start = format_date_for_filename(dates.min())
-            end = format_date_for_filename(dates.max())
+@contextmanager
+def diagnostics(stage):
+    """With Diagnostics on: record the stage's spans, log them and keep them for Step 4."""
+    if not st.session_state.diagnostics:
+        yield
+        return
+    with recording(memory=st.session_state.trace_memory) as rec:
+        yield
+    rec.log(stage=stage, admin_code=st.session_state.admin_code, target=st.session_state.target)
+    st.session_state.diagnostics_spans[stage] = rec.spans()
+
+def diagnostics_table(spans):
+    import pandas as pd
+    return pd.DataFrame({
+        "stage": ["\u2003" * s["depth"] + s["stage"].rsplit("/", 1)[-1] for s in spans],
+        "calls": [s["calls"] for s in spans],
+        "seconds": [s["seconds"] for s in spans],
+        "rows": [s["rows"] for s in spans],
+        "peak MiB": [None if s["peak_bytes"] is None else round(s["peak_bytes"] / 2**20, 2) for s in spans],
+        "MiB read → kept": [f"{s['read_bytes'] / 2**20:.1f} → {s['ledger_bytes'] / 2**20:.1f}"
+                            if "read_bytes" in s else None for s in spans],
+    })
+
+SPLIT_MODES = ["Single file", "Per month", "Every N days", "Max size per file"]
+
+def twinfield_split():
+    """split_parts() arguments for the Step 3 choice, or None for a single file."""
+    mode = st.session_state.split_mode
+    if mode == "Per month":
+        return {"by_month": True}
+    if mode == "Every N days":
+        return {"days": int(st.session_state.split_days)}
+    if mode == "Max size per file":
+        return {"max_bytes": int(st.session_state.split_mb * 1024 * 1024)}
+    return None
+
+# Step 3 download choice -> bundle compression
+DOWNLOADS = {"Plain file": None, "Compressed (.gz)": "gzip", "ZIP with balance report": "zip"}
+# Days off by at most this much get a rounding line; passed to the builders and the Step 4 plan
+ROUND_TOLERANCE = Decimal("0.05")
+
+def per_ledger(name, df, fn, *args):
+    """fn(df, *args), computed once per ledger object and args in this session (ledgers are read-only)."""
+    cached = st.session_state.per_ledger.get(name)
+    if cached is None or cached[0] is not df or cached[1] != args:
+        cached = st.session_state.per_ledger[name] = (df, args, fn(df, *args))
+    return cached[2]
+
+def show_balance_plan(df):
+    """Step 4 dry run: per-day totals and what the build will do, before anything is built."""
+    from tebi_books_transformers.balance_plan import balance_plan, MONEY_COLUMNS
+    with diagnostics("plan"):
+        days, summary = per_ledger("balance_plan", df, balance_plan, st.session_state.target, ROUND_TOLERANCE)
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Days", summary["days"])
+    c2.metric("Lines", f"{summary['lines']:,}")
+    c3.metric("Rounding lines", summary["rounding_lines"])
+    c4.metric("Days over tolerance", len(summary["over_tolerance"]))
+    if summary["over_tolerance"]:
+        st.warning(f"{len(summary['over_tolerance'])} day(s) are off by more than €{ROUND_TOLERANCE:.2f} and get "
+                   f"no rounding line (€{summary['unbalanced'] / 100:,.2f} in total): " + ", ".join(summary["over_tolerance"][:10])
+                   + (" …" if len(summary["over_tolerance"]) > 10 else ""))
+    skipped = [f"{summary['unmapped_rows']} rows without GL ({len(summary['unmapped_accounts'])} accounts)",
+               f"{summary['zero_lines']} zero lines", f"{summary['undated_rows']} rows without date"]
+    st.caption("Not exported: " + ", ".join(skipped))
+    with st.expander("Balance per day"):
+        st.dataframe(days.assign(**{c: days[c] / 100 for c in MONEY_COLUMNS}), hide_index=True,
+                     use_container_width=True)
+
+def _build_output(job, store, df, target, args, split, validate, compress, file_name, extra, diagnostics_on,
+                  trace_memory):
+    """
+    Build job (runs on build_jobs()): the export bytes with the changed-day
+    report, the ZIP part names when split, the uncompressed size, validation
+    state and diagnostics spans. With compress the output goes through gzip or
+    into a ZIP (with the extra entries) as it is assembled, so the whole
+    uncompressed file is never held.
+    """
+    from tebi_books_transformers.incremental import incremental_fragments, iter_document
+    from tebi_books_transformers.twinfield_parts import iter_parts
+    from tebi_books_transformers.bundle import compressed, write_bundle
+    from tebi_books_transformers.export_xml import write_xml_chunks
+    with (recording(memory=trace_memory) if diagnostics_on else nullcontext()) as rec:
+        def progress(done, total):
+            job.update(0.9 * done / max(total, 1), f"{done}/{total} days")
+        names, checked = None, None
+        fragments, report = incremental_fragments(store, df, target, progress=progress, **args)
+        buf = io.BytesIO()
+        if split:
+            # Whole days per file, each balancing on its own, zipped as they are assembled
+            job.update(stage="zipping")
+            entries = write_bundle(buf, [*iter_parts(fragments, args["admin_code"], **split), *extra])
+            names = [e["name"] for e in entries[:len(entries) - len(extra)]]
+            raw = sum(e["bytes"] for e in entries)
         else:
-            start = end = "unknown"
+            chunks = iter_document(target, (frag for _, frag in fragments), args["journal_type"])
+            if validate:
+                try:
+                    import lxml  # noqa: F401 (validated needs it)
+                    from tebi_books_transformers.transform_exact_xml import validated
+                    chunks, checked = validated(chunks), True
+                except ImportError:
+                    checked = False
+            job.update(0.95, "validating against the eExact XSD" if checked else "assembling")
+            with compressed(buf, compress, file_name, extra) as out:
+                raw = write_xml_chunks(out, chunks)
+        data = buf.getvalue()
+    if rec is not None:
+        rec.log(stage="build", admin_code=args["admin_code"], target=target)
+    return {"data": data, "report": report, "names": names, "bytes": raw, "validated": checked,
+            "spans": rec.spans() if rec is not None else None}
+
+@st.fragment(run_every=0.5)
+def build_progress(job, label):
+    """Polls a running build job; reruns the page once it is done."""
+    if job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"{label} {job.stage} ({job.seconds:.0f}s)")
+
+def build_and_offer_download(df):
+    """
+    Build the export for the selected software as a background job (reusing
+    unchanged days) and show the download once it is done. The job is keyed by
+    the ledger's content and every setting, so reruns don't build again.
+    """
+    from tebi_books_transformers.jobs import ledger_digest
+    from tebi_books_transformers.ledger import output_filename
+    from tebi_books_transformers.bundle import compressed_name, report_name
+    is_exact = st.session_state.target.startswith("Exact Online")
+    is_exact_xml = (st.session_state.target == EXACT_XML_TARGET)
+    split = None if is_exact else twinfield_split()
+    compress = DOWNLOADS[st.session_state.download_as]
+    if split and compress == "gzip":
+        compress = None  # the parts are zipped anyway
+    if is_exact_xml:
+        label = "Building Exact Online XML (KAS journal)…"
     else:
-        start = end = "unknown"
-
-    ext = ".xml" if target == "Twinfield" else ".csv"
-    return f"Tebi import {admin_code} {start} - {end}{ext}"
+        label = "Building Exact Online CSV (KAS journal)…" if is_exact else "Building Twinfield XML (concept)…"
+    args = dict(
+        admin_code=st.session_state.admin_code,
+        journal_code=st.session_state.journal_code,
+        diff_ledger=st.session_state.diff_ledger,
+        currency=st.session_state.currency,
+        destiny="concept",
+        cost_center_code=(st.session_state.kpl_code.strip() if st.session_state.use_kpl else None),
+        journal_type="KAS",
+        round_tolerance=ROUND_TOLERANCE,
+    )
+    validate = is_exact_xml and st.session_state.validate_xml
+    file_name = output_filename(st.session_state.admin_code, df, target=st.session_state.target)
+    key = (ledger_digest(df), st.session_state.target, tuple(sorted(args.items())),
+           tuple(sorted(split.items())) if split else None, validate, compress,
+           st.session_state.diagnostics, st.session_state.trace_memory)
+    job = st.session_state.build_job
+    if job is None or job.key != key:
+        extra = []
+        if compress == "zip":
+            from tebi_books_transformers.balance_plan import balance_plan, plan_csv
+            days, _ = per_ledger("balance_plan", df, balance_plan, st.session_state.target, ROUND_TOLERANCE)
+            extra.append((report_name(file_name), plan_csv(days)))
+        job = build_jobs().submit(key, _build_output, fragment_store(), df, st.session_state.target, args, split,
+                                  validate, compress, file_name, extra, st.session_state.diagnostics,
+                                  st.session_state.trace_memory)
+        st.session_state.build_job = job
+
+    st.session_state.twinfield_output = None
+    if not job.done:
+        build_progress(job, label)
+        return
+    if job.status == "failed":
+        hint = " Check the codes in Step 3 and the GL mappings." if job.error.startswith("ExactXmlError") else ""
+        st.error(f"The build failed: {job.error}.{hint}")
+        return
+
+    result = job.result
+    data, report, names = result["data"], result["report"], result["names"]
+    if result["spans"] is not None:
+        st.session_state.diagnostics_spans["build"] = result["spans"]
+    if result["validated"] is False:
+        st.warning("XSD validation needs lxml (pip install lxml); the XML was not validated.")
+    st.session_state.twinfield_output = None if is_exact else data
+    download_name = compressed_name(file_name, "zip" if split else compress)
+    if split or compress == "zip":
+        mime, kind = "application/zip", "ZIP"
+    elif compress == "gzip":
+        mime, kind = "application/gzip", "gzip"
+    else:
+        mime, kind = ("text/csv", "") if st.session_state.target == "Exact Online" else ("application/xml", "")
+    if is_exact_xml:
+        st.success("XML built. Download below and import via Exact Online → Import → XML (GL transactions).")
+        label = "Download Exact XML (KAS)"
+    elif is_exact:
+        st.success("CSV built. Download below and import via Exact Online → Financieel → Import.")
+        label = "Download Exact CSV (KAS)"
+    elif split:
+        st.success(f"XML built as {len(names)} files. Download the ZIP below and import the files one by one.")
+        label = "Download Twinfield XML"
+    else:
+        st.success("XML built. Download below.")
+        label = "Download Twinfield XML"
+    st.download_button(f"{label} ({kind})" if kind else label, data=data, file_name=download_name, mime=mime)
+    if kind:
+        st.caption(f"{len(data) / 2**20:,.2f} MB to download, {result['bytes'] / 2**20:,.2f} MB unpacked"
+                   + (" (with the balance report)" if compress == "zip" else ""))
+    if report["changed"] or report["unchanged"]:
+        st.info(f"Since the last conversion for {st.session_state.admin_code}: {len(report['new'])} new day(s), "
+                f"{len(report['changed'])} changed, {len(report['unchanged'])} unchanged.")
+        if report["changed"]:
+            st.caption("Changed days: " + ", ".join(report["changed"]))
+
+def send_to_twinfield():
+    """Post the last built Twinfield output to the XML web service (concurrent batches, retried)."""
+    with st.expander("Send to Twinfield"):
+        st.caption("Posts the transactions as concept straight to Twinfield instead of importing the file by hand.")
+        cluster_url = st.text_input("Cluster URL", value=os.environ.get("TWINFIELD_CLUSTER_URL", ""),
+                                    placeholder="https://accounting.twinfield.com")
+        token = st.text_input("Access token", value=os.environ.get("TWINFIELD_ACCESS_TOKEN", ""), type="password")
+        if not st.button("Send", disabled=not (cluster_url and token)):
+            return
+        import pandas as pd
+        from tebi_books_transformers.twinfield_client import submit_offices, transactions_from_output, summarize
+        office = st.session_state.admin_code
+        with st.spinner("Sending to Twinfield…"), diagnostics("submit"):
+            results = submit_offices({office: transactions_from_output(st.session_state.twinfield_output)},
+                                     cluster_url=cluster_url, access_token=token)
+        summary = summarize(results)
+        if summary["indeterminate"]:
+            st.warning(f"For {summary['indeterminate']} day transactions the answer was lost: Twinfield may have "
+                       "booked them. Check them in Twinfield before sending again.")
+        if summary["failed"] > summary["indeterminate"]:
+            st.error(f"{summary['failed'] - summary['indeterminate']} of {summary['sent']} day transactions "
+                     "were rejected.")
+        if summary["failed"]:
+            st.dataframe(pd.DataFrame([{"Date": r["date"], "Messages": "; ".join(r["messages"])}
+                                       for r in results[office] if not r["ok"]]),
+                         hide_index=True, use_container_width=True)
+        else:
+            st.success(f"All {summary['sent']} day transactions were accepted by Twinfield.")
 
 st.title("Tebi → Bookkeeping — Step-by-step")
 st.caption("Select → Upload → Fill info → Run → Map missing GL → Rerun (Twinfield XML posts as concept).")
@@ -121,6 +407,10 @@ with st.sidebar:
         st.markdown(f"{label} {mark}")
     if st.session_state.step > 1:
         st.button("← Back", on_click=prev_step, use_container_width=True)
+    st.divider()
+    st.checkbox("Diagnostics", key="diagnostics", help="Time every stage of upload and build (shown in Step 4, also logged)")
+    if st.session_state.diagnostics:
+        st.checkbox("Trace memory (slower)", key="trace_memory")
 
 # --- STEP 1 ---
 if st.session_state.step == 1:
@@ -135,8 +425,9 @@ if st.session_state.step == 1:
 
     st.session_state.target = st.radio(
         "Choose:",
-        ["Twinfield", "Exact Online"],
+        ["Twinfield", "Exact Online", EXACT_XML_TARGET],
         index=0,
+        help="Exact Online imports either the CSV or the eExact XML (GL transactions).",
         horizontal=True,
     )
 
@@ -144,6 +435,9 @@ if st.session_state.step == 1:
 
 # --- STEP 2 ---
 elif st.session_state.step == 2:
+    import pandas as pd
+    from tebi_books_transformers.merge import load_merged
+    from tebi_books_transformers.ledger import preview, memory_bytes
     if st.session_state.prev_step_num > 2:
         st.session_state.df = None
         st.session_state.missing_accounts = []
@@ -151,7 +445,7 @@ elif st.session_state.step == 2:
         st.session_state.prev_step_num = 2
     
     st.header("Step 2 — Upload data")
-    st.markdown("Upload your Tebi export file (CSV or XLSX format)")
+    st.markdown("Upload your Tebi export file(s) (CSV or XLSX format). Several exports are merged into one.")
     
     if st.session_state.df is not None:
         st.info("✓ File already loaded. Upload a new file to replace it, or click 'Clear' to start fresh.")
@@ -159,12 +453,34 @@ elif st.session_state.step == 2:
             st.session_state.df = None
             st.rerun()
     
-    up = st.file_uploader("Upload file", type=["csv", "xlsx", "xls"], key="file_upload_step2")
-    if up:
-        df, _missing = load_file(up)
+    ups = st.file_uploader("Upload file(s)", type=["csv", "xlsx", "xls"], accept_multiple_files=True,
+                           key="file_upload_step2")
+    if ups:
+        with diagnostics("upload"):
+            # Parsed concurrently (through the shared parse cache), overlapping days de-duplicated
+            df, _missing, merge_report = load_merged(ups, loader=parse_cache().load)
         st.session_state.df = df
-        st.success("File loaded.")
-        st.dataframe(df.head(50), use_container_width=True)
+        st.session_state.twinfield_output = None
+        st.session_state.build_requested = False
+        if len(ups) == 1:
+            st.success("File loaded.")
+        else:
+            st.success(f"{len(ups)} files loaded and merged into {len(df)} rows"
+                       f" ({merge_report['rows_dropped']} duplicate rows dropped).")
+            if merge_report["duplicate_days"]:
+                st.caption(f"{len(merge_report['duplicate_days'])} day(s) were in more than one file and identical: kept once.")
+            if merge_report["conflicts"]:
+                st.warning(f"{len(merge_report['conflicts'])} day(s) differ between files. "
+                           "The newest export is used for those days; check the totals below.")
+                st.dataframe(pd.DataFrame([
+                    {"Date": c["day"], "File": f["name"], "Rows": f["rows"], "Total": f["total"],
+                     "Used": f["name"] == c["kept"]}
+                    for c in merge_report["conflicts"] for f in c["files"]
+                ]), hide_index=True, use_container_width=True)
+        st.caption(f"{len(df):,} rows · {memory_bytes(df) / 2**20:.1f} MiB in memory")
+        for col, rows in df.attrs.get("unparsed_amounts", {}).items():
+            st.warning(f"Could not read {len(rows)} value(s) in column '{col}' (rows: {', '.join(map(str, rows[:10]))}{' …' if len(rows) > 10 else ''}).")
+        st.dataframe(preview(df, 50), use_container_width=True)
 
     st.button("Next →", on_click=next_step, type="primary", disabled=st.session_state.df is None)
 
@@ -173,7 +489,7 @@ elif st.session_state.step == 2:
 elif st.session_state.step == 3:
     st.header("Step 3 — Fill in information")
     
-    is_exact = (st.session_state.target == "Exact Online")
+    is_exact = st.session_state.target.startswith("Exact Online")
     
     # Common fields for both systems
     c1, c2, c3, c4 = st.columns(4)
@@ -210,70 +526,79 @@ elif st.session_state.step == 3:
         if not kpl_input.strip():
             st.info("Please enter the KPL code. Leave blank only if this admin should not use a cost center.")
 
+    if st.session_state.target == EXACT_XML_TARGET:
+        st.markdown("#### Output file")
+        st.session_state.validate_xml = st.checkbox(
+            "Validate against the eExact XSD", value=st.session_state.validate_xml,
+            help="Checks the XML before the download is offered, so Exact won't reject it on structure.")
+    if not is_exact:
+        st.markdown("#### Output files")
+        st.session_state.split_mode = st.radio(
+            "Split the Twinfield XML?", SPLIT_MODES, index=SPLIT_MODES.index(st.session_state.split_mode),
+            horizontal=True, help="Smaller files import faster, and a rejected day only affects its own file.")
+        if st.session_state.split_mode == "Every N days":
+            st.session_state.split_days = st.number_input("Days per file", min_value=1, value=st.session_state.split_days)
+        elif st.session_state.split_mode == "Max size per file":
+            st.session_state.split_mb = st.number_input("Max MB per file", min_value=0.1, value=float(st.session_state.split_mb))
+    st.markdown("#### Download")
+    st.session_state.download_as = st.radio(
+        "Download as", list(DOWNLOADS), index=list(DOWNLOADS).index(st.session_state.download_as), horizontal=True,
+        help="Compressed downloads are about ten times smaller. The ZIP also holds the balance per day (CSV); "
+             "unpack it before importing.")
+
     st.button("Next →", on_click=next_step, type="primary")
 
 # --- STEP 4 ---
 elif st.session_state.step == 4:
+    from tebi_books_transformers.mapping_store import apply_mappings, missing_accounts as find_missing_accounts
     st.header("Step 4 — Run")
-    df = st.session_state.df.copy()
-    is_exact = (st.session_state.target == "Exact Online")
+    df = st.session_state.df  # read-only ledger, shared without copying
+    is_exact = st.session_state.target.startswith("Exact Online")
 
     if st.session_state.use_kpl and (not st.session_state.kpl_code.strip()):
         st.error("This admin uses a Cost center, but no KPL code was provided in Step 3.")
         st.button("← Back to Step 3", on_click=prev_step)
         st.stop()
 
-    if "Account Mapped" in df.columns:
-        need = df["Account Mapped"].isna() | (df["Account Mapped"].astype(str).str.strip() == "")
-    else:
-        df["Account Mapped"] = ""
-        need = df["Account Mapped"] == ""
+    # Saved mappings for this admin (session edits win), applied in one vectorized pass
+    mapping = {**mapping_store().get(st.session_state.admin_code), **st.session_state.mapping_dict}
+    with diagnostics("mappings"), span("apply_mappings", rows=len(df)):
+        df, filled = per_ledger("mappings", df, lambda d, items: apply_mappings(d, dict(items)),
+                                tuple(sorted(mapping.items())))
+    if filled:
+        st.session_state.df = df
+        st.info(f"Applied saved GL mappings to {filled} rows.")
+
+    show_balance_plan(df)
 
-    missing_accounts = sorted(set(df.loc[need, "Account"].astype(str)))
+    missing_accounts = per_ledger("missing_accounts", df, find_missing_accounts)
     st.session_state.missing_accounts = missing_accounts
 
     if missing_accounts:
         st.warning(f"Missing GL mapping for {len(missing_accounts)} source accounts. Proceed to Step 5 to map and rerun.")
         st.button("Go to Step 5 →", on_click=lambda: st.session_state.update(step=5), type="primary")
     else:
-        # Generate file based on selected software
-        if is_exact:
-            with st.spinner("Building Exact Online CSV (KAS journal)…"):
-                csv_bytes = build_exact_csv(
-                    df,
-                    admin_code=st.session_state.admin_code,
-                    journal_code=st.session_state.journal_code,
-                    differences_ledger=st.session_state.diff_ledger,
-                    currency=st.session_state.currency,
-                    cost_center_code=(st.session_state.kpl_code.strip() if st.session_state.use_kpl else None),
-                    journal_type="KAS"
-                )
-            st.success("CSV built. Download below and import via Exact Online → Financieel → Import.")
-            file_name = build_filename(st.session_state.admin_code, df, target="Exact Online")
-            st.download_button("Download Exact CSV (KAS)", data=csv_bytes, file_name=file_name, mime="text/csv")
-        else:
-            with st.spinner("Building Twinfield XML (concept)…"):
-                root = build_twinfield_xml(
-                    df,
-                    st.session_state.admin_code,
-                    st.session_state.journal_code,
-                    st.session_state.diff_ledger,
-                    currency=st.session_state.currency,
-                    destiny="concept",
-                    cost_center_code=(st.session_state.kpl_code.strip() if st.session_state.use_kpl else None),
-                )
-                xml_bytes = xml_to_bytes(root)
-            st.success("XML built. Download below.")
-            file_name = build_filename(st.session_state.admin_code, df, target="Twinfield")
-            st.download_button("Download Twinfield XML", data=xml_bytes, file_name=file_name, mime="application/xml")
+        build_and_offer_download(df)
+        if not is_exact and st.session_state.twinfield_output is not None:
+            send_to_twinfield()
+
+    if st.session_state.diagnostics:
+        with st.expander("Diagnostics"):
+            if not st.session_state.diagnostics_spans:
+                st.caption("Nothing recorded yet: upload the file again with Diagnostics on.")
+            for stage, spans in st.session_state.diagnostics_spans.items():
+                st.markdown(f"**{stage}** — {sum(s['seconds'] for s in spans if s['depth'] == 0):.3f}s")
+                st.dataframe(diagnostics_table(spans), hide_index=True, use_container_width=True)
     st.button("← Back", on_click=prev_step)
 
 # --- STEP 5 ---
 elif st.session_state.step == 5:
+    import pandas as pd
+    from tebi_books_transformers.mapping_store import apply_mappings, missing_accounts as find_missing_accounts
     st.header("Step 5 — Map missing ledgers & rerun")
-    df = st.session_state.df.copy()
+    df = st.session_state.df
     missing_accounts = st.session_state.missing_accounts
-    is_exact = (st.session_state.target == "Exact Online")
+    is_exact = st.session_state.target.startswith("Exact Online")
     button_label = "Save mappings & Build CSV" if is_exact else "Save mappings & Build XML"
 
     if not missing_accounts:
@@ -286,57 +611,34 @@ elif st.session_state.step == 5:
     edited = st.data_editor(map_df, num_rows="dynamic", use_container_width=True, key="map_editor")
 
     if st.button(button_label):
+        new_mappings = {}
         for _, r in edited.iterrows():
             acc = str(r.get("Account", "")).strip()
             gl = str(r.get("Mapped GL", "")).strip()
             if acc and gl:
-                st.session_state.mapping_dict[acc] = gl
-
-        for acc, gl in st.session_state.mapping_dict.items():
-            mask = df["Account"].astype(str) == acc
-            need = df["Account Mapped"].isna() | (df["Account Mapped"].astype(str).str.strip() == "")
-            df.loc[mask & need, "Account Mapped"] = gl
+                new_mappings[acc] = gl
+        st.session_state.mapping_dict.update(new_mappings)
+        # Remember for the next export of this administration
+        mapping_store().save(st.session_state.admin_code, new_mappings)
 
+        df, _filled = apply_mappings(df, st.session_state.mapping_dict)
         st.session_state.df = df
-        need_mask = df["Account Mapped"].isna() | (df["Account Mapped"].astype(str).str.strip() == "")
-        st.session_state.missing_accounts = sorted(set(df.loc[need_mask, "Account"].astype(str)))
+        st.session_state.missing_accounts = find_missing_accounts(df)
 
+        st.session_state.build_requested = False
         if st.session_state.missing_accounts:
             st.warning(f"Still missing {len(st.session_state.missing_accounts)} mappings. Add the rest and click the button again.")
         else:
             if st.session_state.use_kpl and (not st.session_state.kpl_code.strip()):
                 st.error("This admin uses a Cost center, but no KPL code was provided in Step 3.")
             else:
-                # Generate file based on selected software
-                if is_exact:
-                    with st.spinner("Building Exact Online CSV (KAS journal)…"):
-                        csv_bytes = build_exact_csv(
-                            df,
-                            admin_code=st.session_state.admin_code,
-                            journal_code=st.session_state.journal_code,
-                            differences_ledger=st.session_state.diff_ledger,
-                            currency=st.session_state.currency,
-                            cost_center_code=(st.session_state.kpl_code.strip() if st.session_state.use_kpl else None),
-                            journal_type="KAS"
-                        )
-                    st.success("CSV built. Download below and import via Exact Online → Financieel → Import.")
-                    file_name = build_filename(st.session_state.admin_code, df, target="Exact Online")
-                    st.download_button("Download Exact CSV (KAS)", data=csv_bytes, file_name=file_name, mime="text/csv")
-                else:
-                    with st.spinner("Building Twinfield XML (concept)…"):
-                        root = build_twinfield_xml(
-                            df,
-                            st.session_state.admin_code,
-                            st.session_state.journal_code,
-                            st.session_state.diff_ledger,
-                            currency=st.session_state.currency,
-                            destiny="concept",
-                            cost_center_code=(st.session_state.kpl_code.strip() if st.session_state.use_kpl else None),
-                        )
-                        xml_bytes = xml_to_bytes(root)
-                    st.success("XML built. Download below.")
-                    file_name = build_filename(st.session_state.admin_code, df, target="Twinfield")
-                    st.download_button("Download Twinfield XML", data=xml_bytes, file_name=file_name, mime="application/xml")
+                st.session_state.build_requested = True
+    # Outside the button branch: the build job is polled across reruns, and pressing
+    # "Send" reruns the page without building again
+    if st.session_state.build_requested and not st.session_state.missing_accounts:
+        build_and_offer_download(st.session_state.df)
+        if not is_exact and st.session_state.twinfield_output is not None:
+            send_to_twinfield()
     st.button("← Back", on_click=prev_step)
 
 # --- Footer ---
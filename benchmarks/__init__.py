@@ -0,0 +1 @@
+"""Synthetic Tebi exports and throughput benchmarks (not part of the app)."""
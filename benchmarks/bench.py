@@ -0,0 +1,182 @@
+"""
+Throughput benchmarks: time and peak memory of load_file, build_twinfield_xml,
+xml_to_bytes and build_exact_csv on synthetic exports of growing size.
+
+    python -m benchmarks.bench                              # 1k .. 1M rows
+    python -m benchmarks.bench --sizes 1k,100k,5M --out results.json
+    python -m benchmarks.bench --compare results-main.json  # flag regressions
+
+Each operation is timed --repeat times (best run counts) and then run once more
+under tracemalloc for its peak allocation. Results are written as JSON; with
+--compare, operations that got slower than --threshold are listed and the exit
+code is 1.
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from tebi_books_transformers.cli import LocalUpload
+from tebi_books_transformers.io_reader import load_file
+from tebi_books_transformers.ledger import memory_bytes
+from tebi_books_transformers.transform_twinfield import build_twinfield_xml
+from tebi_books_transformers.transform_exact import build_exact_csv
+from tebi_books_transformers.export_xml import xml_to_bytes
+
+from .synthetic import generate, write_export
+
+DEFAULT_SIZES = "1k,10k,100k,1M"
+XLSX_MAX_ROWS = 100_000  # writing/reading bigger workbooks takes minutes
+BUILD_ARGS = {"admin_code": "1001", "journal_code": "TEBI"}
+
+
+def parse_size(text):
+    """ "10k" -> 10000, "5M" -> 5000000."""
+    text = str(text).strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * mult)
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def measure(fn, repeat=3, memory=True):
+    """(result of the last call, best seconds, all seconds, peak bytes or None)."""
+    times = []
+    result = None
+    for _ in range(max(1, repeat)):
+        result = None
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    peak = None
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, min(times), times, peak
+
+
+def bench_file(path, rows, repeat=3, memory=True):
+    """Results for one input file: load, build both targets, serialize the XML."""
+    results = []
+
+    def record(op, fn):
+        out, best, times, peak = measure(fn, repeat=repeat, memory=memory)
+        results.append({"rows": rows, "format": path.suffix.lstrip("."), "op": op,
+                        "seconds": round(best, 6), "runs": [round(t, 6) for t in times],
+                        "rows_per_s": round(rows / best) if best else None, "peak_bytes": peak})
+        print(f"{rows:>10,} {path.suffix:<6} {op:<20} {best:9.3f}s  "
+              f"{'' if peak is None else f'{peak / 2**20:9.1f} MiB'}", flush=True)
+        return out
+
+    df, _ = record("load_file", lambda: load_file(LocalUpload(path)))
+    results[-1]["ledger_bytes"] = memory_bytes(df)
+    tree = record("build_twinfield_xml", lambda: build_twinfield_xml(df, diff_ledger="9899", **BUILD_ARGS))
+    record("xml_to_bytes", lambda: xml_to_bytes(tree))
+    del tree
+    record("build_exact_csv", lambda: build_exact_csv(df, differences_ledger="9899", **BUILD_ARGS))
+    return results
+
+
+def run(sizes, formats=("csv",), repeat=3, memory=True, days=None, work_dir=None, seed=0):
+    """Generate each size/format, benchmark it and return the JSON-ready report."""
+    results = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        for rows in sizes:
+            export = generate(rows, days=days or max(1, min(365, rows // 40)), seed=seed)
+            for fmt in formats:
+                if fmt == "xlsx" and rows > XLSX_MAX_ROWS:
+                    print(f"{rows:>10,} .xlsx  skipped (more than {XLSX_MAX_ROWS:,} rows)")
+                    continue
+                path = write_export(Path(tmp) / f"bench_{rows}.{fmt}", export)
+                results.extend(bench_file(path, len(export), repeat=repeat if rows < 1_000_000 else 1,
+                                          memory=memory))
+                path.unlink()
+            del export
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold=0.2, min_seconds=0.05):
+    """
+    Operations that are more than threshold (0.2 = 20%) slower than in baseline.
+    Operations that take less than min_seconds are too noisy and are skipped.
+    """
+    before = {(r["rows"], r["format"], r["op"]): r for r in baseline.get("results", [])}
+    slower = []
+    for r in report["results"]:
+        old = before.get((r["rows"], r["format"], r["op"]))
+        if not old or max(old["seconds"], r["seconds"]) < min_seconds:
+            continue
+        if r["seconds"] > old["seconds"] * (1 + threshold):
+            slower.append({**r, "baseline_seconds": old["seconds"], "ratio": round(r["seconds"] / old["seconds"], 2)})
+    return slower
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__.strip().splitlines()[0])
+    p.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Row counts, e.g. 1k,10k,5M (default {DEFAULT_SIZES})")
+    p.add_argument("--formats", default="csv", help="csv and/or xlsx (XLS-macro output), comma separated")
+    p.add_argument("--days", type=int, default=None, help="Days per export (default: about 40 rows per day, max 365)")
+    p.add_argument("--repeat", type=int, default=3, help="Timed runs per operation below 1M rows")
+    p.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak-memory run")
+    p.add_argument("--out", default=None, help="Write the results as JSON to this path")
+    p.add_argument("--compare", default=None, help="Earlier results JSON to check for regressions")
+    p.add_argument("--threshold", type=float, default=0.2, help="Slowdown that counts as a regression (0.2 = 20%%)")
+    p.add_argument("--min-seconds", type=float, default=0.05, help="Ignore operations faster than this in --compare")
+    p.add_argument("--work-dir", default=None, help="Directory for the generated inputs (default: system temp)")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+
+    report = run([parse_size(s) for s in args.sizes.split(",") if s.strip()],
+                 formats=[f.strip().lower() for f in args.formats.split(",") if f.strip()],
+                 repeat=args.repeat, memory=not args.no_memory, days=args.days,
+                 work_dir=args.work_dir, seed=args.seed)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Results → {args.out}")
+
+    if args.compare:
+        slower = compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")),
+                         args.threshold, args.min_seconds)
+        for r in slower:
+            print(f"SLOWER {r['rows']:>10,} {r['format']:<5} {r['op']:<20} "
+                  f"{r['baseline_seconds']:.3f}s → {r['seconds']:.3f}s (x{r['ratio']})")
+        if slower:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Exact push benchmark: push a month of KAS entries for many divisions to the local
+mock (tebi_books_transformers.exact_mock) and report the throughput.
+
+    python -m benchmarks.push --divisions 20 --concurrency 1,4,16 --latency 0.2
+    python -m benchmarks.push --per-minute 60 --calls-per-minute 60   # Exact's real limit
+
+Divisions are pushed side by side (one client each, like separate CLI workers);
+the mock's per-minute limit and the client's pacing apply per division.
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from tebi_books_transformers.cli import LocalUpload
+from tebi_books_transformers.io_reader import load_file
+from tebi_books_transformers.exact_push import ExactClient, push_days
+from tebi_books_transformers.incremental import day_digests
+from tebi_books_transformers.transform_exact import iter_exact_day_frames
+from tebi_books_transformers.exact_mock import mock_server, MOCK_TOKEN
+
+from .synthetic import generate, write_export
+
+
+async def _push(days, divisions, concurrency, calls_per_minute, per_minute, latency, fail_rate, seed):
+    async with mock_server(per_minute=per_minute, latency=latency, fail_rate=fail_rate, seed=seed) as (url, mock):
+        async def one(division):
+            async with ExactClient(url, MOCK_TOKEN, concurrency=concurrency, calls_per_minute=calls_per_minute,
+                                   backoff=0.05) as client:
+                return await push_days(client, None, division, "10", "KAS", days)
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(str(1000 + i)) for i in range(divisions)))
+        seconds = time.perf_counter() - t0
+    return results, seconds, mock.requests, mock.failures + mock.rate_limited
+
+
+def run(divisions=10, days=31, rows_per_day=60, concurrency=(4,), calls_per_minute=None, per_minute=None,
+        latency=0.1, fail_rate=0.0, seed=0):
+    """One result dict per concurrency level."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_export(Path(tmp) / "month.csv", generate(rows_per_day * days, days=days, seed=seed))
+        df, _ = load_file(LocalUpload(path))
+    digests = {day: digest for day, _, digest in day_digests(df)}
+    entries = [(day, digests[day], rows) for day, rows in iter_exact_day_frames(df, "10", "9899") if len(rows)]
+
+    out = []
+    for level in concurrency:
+        results, seconds, requests, retried = asyncio.run(
+            _push(entries, divisions, level, calls_per_minute, per_minute, latency, fail_rate, seed))
+        pushed = sum(len(p) for p, _, _ in results)
+        failed = sum(len(f) for _, f, _ in results)
+        out.append({"concurrency": level, "divisions": divisions, "entries": pushed, "failed": failed,
+                    "requests": requests, "retried": retried, "seconds": round(seconds, 3),
+                    "entries_per_s": round(pushed / seconds, 1)})
+    return out
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.push", description=__doc__.strip().splitlines()[0])
+    p.add_argument("--divisions", type=int, default=10)
+    p.add_argument("--days", type=int, default=31, help="Day entries per division")
+    p.add_argument("--rows-per-day", type=int, default=60)
+    p.add_argument("--concurrency", default="4", help="Entries in flight per division, e.g. 1,4,16")
+    p.add_argument("--calls-per-minute", type=int, default=None, help="Client pacing per division (default: none)")
+    p.add_argument("--per-minute", type=int, default=None, help="Mock limit per division before 429")
+    p.add_argument("--latency", type=float, default=0.1, help="Mock answer time in seconds")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Share of calls the mock answers with 503")
+    p.add_argument("--out", default=None, help="Write the results as JSON to this path")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+
+    results = run(args.divisions, args.days, args.rows_per_day, [int(c) for c in args.concurrency.split(",")],
+                  args.calls_per_minute, args.per_minute, args.latency, args.fail_rate, args.seed)
+    for r in results:
+        print(f"concurrency {r['concurrency']:>3}: {r['entries']} entries ({r['failed']} failed) in "
+              f"{r['seconds']:.2f}s = {r['entries_per_s']:.0f}/s, {r['requests']} requests ({r['retried']} retried)")
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
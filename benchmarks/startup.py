@@ -0,0 +1,109 @@
+"""
+Cold-start benchmark: import time of every module the app needs, and the
+warm-up (tebi_books_transformers.warmup), each in a fresh interpreter.
+
+    python -m benchmarks.startup --out startup-main.json
+    python -m benchmarks.startup --compare startup-main.json   # exits 1 if an import got >20% slower
+
+"first screen" is what app.py imports before Step 1 is drawn; everything else
+is loaded by the warm-up thread or on first use. The CLI is measured too: it
+imports pandas, the writers, the Twinfield / Exact clients and aiohttp only when
+a run needs them, and the run fails if parsing `--help` loads any of them.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tebi_books_transformers.warmup import import_times, HOT_MODULES, COLD_MODULES
+
+from .bench import _git_revision
+
+FIRST_SCREEN = ("tebi_books_transformers", "tebi_books_transformers.targets", "tebi_books_transformers.instrument")
+CLI = ("tebi_books_transformers.cli",)
+# Must not be loaded before the CLI has parsed its arguments
+HEAVY = ("pandas", "numpy", "aiohttp", "lxml")
+
+
+def _warm_up_timings(python=sys.executable):
+    code = "import json; from tebi_books_transformers.warmup import warm_up; print(json.dumps(warm_up(background=False)))"
+    proc = subprocess.run([python, "-c", code], capture_output=True, text=True,
+                          cwd=Path(__file__).resolve().parent.parent)
+    return json.loads(proc.stdout.strip().splitlines()[-1]) if proc.returncode == 0 else None
+
+
+def _cli_heavy_modules(python=sys.executable):
+    """The HEAVY modules loaded by `main(["--help"])` in a fresh interpreter."""
+    code = ("import contextlib, io, json, sys; from tebi_books_transformers.cli import main\n"
+            "with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit): main(['--help'])\n"
+            f"print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))")
+    proc = subprocess.run([python, "-c", code], capture_output=True, text=True, check=True,
+                          cwd=Path(__file__).resolve().parent.parent)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run(repeat=3):
+    """JSON-ready report: import times (best of repeat) and one warm-up run."""
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "first_screen": list(FIRST_SCREEN),
+        "import_times": import_times(FIRST_SCREEN + HOT_MODULES + COLD_MODULES + CLI, repeat=repeat),
+        "warm_up": _warm_up_timings(),
+        "cli_help_loads": _cli_heavy_modules(),
+    }
+
+
+def compare(report, baseline, threshold=0.2, min_seconds=0.01):
+    """Modules whose import got more than threshold slower than in baseline (below min_seconds: skipped)."""
+    before = baseline.get("import_times", {})
+    slower = []
+    for name, t in report["import_times"].items():
+        old = before.get(name)
+        if not old or max(old["seconds"], t["seconds"]) < min_seconds:
+            continue
+        if t["seconds"] > old["seconds"] * (1 + threshold):
+            slower.append({"module": name, "seconds": t["seconds"], "baseline_seconds": old["seconds"],
+                           "ratio": round(t["seconds"] / old["seconds"], 2)})
+    return slower
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__.strip().splitlines()[0])
+    p.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module (best run counts)")
+    p.add_argument("--out", default=None, help="Write the results as JSON to this path")
+    p.add_argument("--compare", default=None, help="Earlier results JSON to check for regressions")
+    p.add_argument("--threshold", type=float, default=0.2, help="Slowdown that counts as a regression (0.2 = 20%%)")
+    args = p.parse_args(argv)
+
+    report = run(args.repeat)
+    for name, t in report["import_times"].items():
+        tag = "  (first screen)" if name in FIRST_SCREEN else "  (CLI)" if name in CLI else ""
+        print(f"{t['seconds'] * 1000:8.1f} ms  {name}{tag}")
+    if report["warm_up"]:
+        w = report["warm_up"]
+        print(f"warm-up: {w['total'] * 1000:.0f} ms, of which the sample conversion {w.get('convert', 0) * 1000:.0f} ms")
+    if report["cli_help_loads"]:
+        print(f"CLI --help loads {', '.join(report['cli_help_loads'])}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Results → {args.out}")
+
+    if args.compare:
+        slower = compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.threshold)
+        for r in slower:
+            print(f"SLOWER {r['module']:<45} {r['baseline_seconds'] * 1000:.1f} ms → {r['seconds'] * 1000:.1f} ms "
+                  f"(x{r['ratio']})")
+        if slower:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 1 if report["cli_help_loads"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
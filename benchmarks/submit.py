@@ -0,0 +1,79 @@
+"""
+Submission benchmark: push a month of Twinfield transactions for many offices to
+the local mock endpoint (tebi_books_transformers.twinfield_mock) and report the
+throughput at a given concurrency.
+
+    python -m benchmarks.submit --offices 40 --days 31 --concurrency 16 --latency 0.2
+    python -m benchmarks.submit --concurrency 1,4,16,64 --fail-rate 0.05
+
+--latency is the mock's answer time per request (Twinfield itself takes a few
+hundred milliseconds), --fail-rate the share of requests it answers with 503.
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from tebi_books_transformers.cli import LocalUpload
+from tebi_books_transformers.io_reader import load_file
+from tebi_books_transformers.twinfield_parts import twinfield_fragments
+from tebi_books_transformers.twinfield_client import TwinfieldClient, summarize
+from tebi_books_transformers.twinfield_mock import mock_server, MOCK_TOKEN
+
+from .synthetic import generate, write_export
+
+
+async def _submit(jobs, concurrency, batch_size, latency, fail_rate, seed):
+    async with mock_server(latency=latency, fail_rate=fail_rate, seed=seed) as (url, mock):
+        async with TwinfieldClient(url, MOCK_TOKEN, concurrency=concurrency, backoff=0.05) as client:
+            t0 = time.perf_counter()
+            results = await client.submit_many(jobs, batch_size=batch_size)
+            seconds = time.perf_counter() - t0
+    return results, seconds, mock.requests, mock.failures
+
+
+def run(offices=20, days=31, rows_per_day=60, concurrency=(8,), batch_size=5, latency=0.1, fail_rate=0.0, seed=0):
+    """One result dict per concurrency level."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_export(Path(tmp) / "month.csv", generate(rows_per_day * days, days=days, seed=seed))
+        df, _ = load_file(LocalUpload(path))
+    fragments = twinfield_fragments(df, "1001", "TEBI", "9899", workers=1)
+    jobs = {f"{1001 + i}": fragments for i in range(offices)}
+
+    out = []
+    for level in concurrency:
+        results, seconds, requests, failures = asyncio.run(
+            _submit(jobs, level, batch_size, latency, fail_rate, seed))
+        summary = summarize(results)
+        out.append({"concurrency": level, "offices": offices, "transactions": summary["sent"],
+                    "ok": summary["ok"], "requests": requests, "retried": failures,
+                    "seconds": round(seconds, 3), "tx_per_s": round(summary["sent"] / seconds, 1)})
+    return out
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.submit", description=__doc__.strip().splitlines()[0])
+    p.add_argument("--offices", type=int, default=20)
+    p.add_argument("--days", type=int, default=31, help="Day transactions per office")
+    p.add_argument("--rows-per-day", type=int, default=60)
+    p.add_argument("--concurrency", default="8", help="Requests in flight, e.g. 1,4,16")
+    p.add_argument("--batch-size", type=int, default=5, help="Transactions per request")
+    p.add_argument("--latency", type=float, default=0.1, help="Mock answer time in seconds")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests the mock answers with 503")
+    p.add_argument("--out", default=None, help="Write the results as JSON to this path")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+
+    results = run(args.offices, args.days, args.rows_per_day, [int(c) for c in args.concurrency.split(",")],
+                  args.batch_size, args.latency, args.fail_rate, args.seed)
+    for r in results:
+        print(f"concurrency {r['concurrency']:>3}: {r['transactions']} transactions ({r['ok']} ok) in "
+              f"{r['seconds']:.2f}s = {r['tx_per_s']:.0f}/s, {r['requests']} requests ({r['retried']} retried)")
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Synthetic Tebi exports for benchmarks: BookkeepingDayExport CSVs and XLS-macro
+workbooks with realistic accounts, VAT mix and day totals that (nearly) balance.
+
+    python -m benchmarks.synthetic out.csv --rows 100000 --days 365
+    python -m benchmarks.synthetic out.xlsx --rows 20000 --unmapped 0.05
+
+Every day has revenue lines (positive, VAT high / low / none) and payment lines
+(negative) that settle them; a few days are off by some cents so the builders
+write rounding lines. Tax amounts are gross x rate / (100 + rate) with six
+decimals, like Tebi writes them.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TEBI_COLUMNS = ["Grouped", "Currency", "Date", "Account", "Account Mapped", "Amount",
+                "Tax Amount", "Tax Code", "Tax Code Mapped", "Tax Percentage"]
+MACRO_COLUMNS = ["Datum", "Omschrijving", "Grtboekrek.", "Bedrag", "Btwcode", "DebitCredit"]
+
+# (name, GL) as they appear in real exports
+REVENUE_ACCOUNTS = [
+    ("Lunch", "4000"), ("a la carte", "4000"), ("Menus", "4000"), ("Lekkere Bites", "4000"),
+    ("bieren", "4030"), ("Rode wijn per fles", "4040"), ("Witte wijn per glas", "4040"),
+    ("Koude dranken", "4050"), ("Cocktails", "4060"), ("Sterk", "4060"), ("Warme dranken", "4070"),
+    ("Le Brunch", "4080"), ("events", "4080"),
+]
+PAYMENT_ACCOUNTS = [("CARD_RECEIVABLE", "2010"), ("CASH", "1400"), ("ECOM_PAYMENT_RECEIVABLE", "2010")]
+PAYMENT_SHARES = [0.7, 0.25, 0.05]
+
+# Tax Code Mapped -> (Tax Code, Tax Percentage)
+VAT = {"VH": ("VAT_STANDARD", 21), "VL": ("VAT_REDUCED", 9), "": ("", None)}
+
+NUMBER_FORMATS = ("tebi", "fixed", "thousands")
+
+
+def generate(rows=1000, days=30, accounts=20, vat_mix=(0.4, 0.5, 0.1), unmapped=0.0,
+             start="2025-01-01", seed=0):
+    """
+    Typed export rows (about `rows` of them) over `days` consecutive days, as a
+    DataFrame with Date, Account, Account Mapped, Amount_cents, Tax Code Mapped.
+
+    accounts is the number of distinct revenue accounts, vat_mix the share of them
+    with high / low / no VAT, unmapped the share of revenue accounts without a GL.
+    """
+    rng = np.random.default_rng(seed)
+    days = max(1, min(days, rows // 3))
+    per_day = max(1, rows // days - len(PAYMENT_ACCOUNTS))
+
+    names, gls = [], []
+    for i in range(accounts):
+        if i < len(REVENUE_ACCOUNTS):
+            name, gl = REVENUE_ACCOUNTS[i]
+        else:
+            name, gl = f"Productgroep {i + 1}", str(4000 + 10 * (i % 9))
+        names.append(name)
+        gls.append(gl)
+    gls = np.array(gls, dtype=object)
+    gls[rng.random(accounts) < unmapped] = ""
+    vat_of_account = rng.choice(np.array(["VH", "VL", ""], dtype=object), size=accounts,
+                                p=np.asarray(vat_mix) / np.sum(vat_mix))
+
+    # Revenue lines: day index and account per line, positive gross cents
+    n_rev = days * per_day
+    rev_day = np.repeat(np.arange(days), per_day)
+    rev_acc = rng.integers(0, accounts, n_rev)
+    rev_cents = np.maximum(50, rng.lognormal(mean=8.5, sigma=1.0, size=n_rev)).astype(np.int64)
+    rev_cents -= rev_cents % 10 * (rng.random(n_rev) < 0.7)  # mostly round prices
+
+    # Payment lines settle each day; some days are off by a few cents
+    day_total = np.bincount(rev_day, weights=rev_cents, minlength=days).astype(np.int64)
+    shares = np.round(day_total[:, None] * np.array(PAYMENT_SHARES[:-1])).astype(np.int64)
+    last = day_total - shares.sum(axis=1)
+    noise = rng.choice(np.array([0, 0, 0, 0, 1, -1, 3, -4]), size=days)
+    pay_cents = -np.column_stack([shares, last + noise])
+
+    n_pay = len(PAYMENT_ACCOUNTS)
+    day = np.concatenate([rev_day, np.repeat(np.arange(days), n_pay)])
+    order = np.argsort(day, kind="stable")
+    pay_names = np.array([a for a, _ in PAYMENT_ACCOUNTS], dtype=object)
+    pay_gls = np.array([g for _, g in PAYMENT_ACCOUNTS], dtype=object)
+
+    frame = pd.DataFrame({
+        "Date": (pd.Timestamp(start) + pd.to_timedelta(day, unit="D"))[order],
+        "Account": np.concatenate([np.array(names, dtype=object)[rev_acc], np.tile(pay_names, days)])[order],
+        "Account Mapped": np.concatenate([gls[rev_acc], np.tile(pay_gls, days)])[order],
+        "Amount_cents": np.concatenate([rev_cents, pay_cents.ravel()])[order],
+        "Tax Code Mapped": np.concatenate([vat_of_account[rev_acc], np.full(days * n_pay, "", dtype=object)])[order],
+    })
+    return frame
+
+
+def _fmt_scaled(values, scale, number_format):
+    """Integers in 1/10**scale units -> Dutch number strings ("-758,5", "1.234,56")."""
+    values = np.asarray(values, dtype=np.int64)
+    sign = np.where(values < 0, "-", "")
+    whole, frac = np.divmod(np.abs(values), 10 ** scale)
+    if number_format == "thousands":
+        whole = pd.Series([f"{w:,}".replace(",", ".") for w in whole.tolist()], dtype=object)
+    else:
+        whole = pd.Series(whole).astype(str)
+    frac = pd.Series(frac).astype(str).str.zfill(scale)
+    if number_format == "fixed" and scale == 2:
+        tail = "," + frac
+    else:
+        frac = frac.str.rstrip("0")
+        tail = np.where(frac == "", "", "," + frac)
+    return (sign + whole + tail).to_numpy(dtype=object)
+
+
+def to_tebi_frame(export, number_format="tebi"):
+    """generate() rows as the string columns of a Tebi BookkeepingDayExport."""
+    if number_format not in NUMBER_FORMATS:
+        raise ValueError(f"Unknown number_format {number_format!r}, expected one of {NUMBER_FORMATS}")
+    cents = export["Amount_cents"].to_numpy()
+    vat = export["Tax Code Mapped"].to_numpy()
+    rate = np.select([vat == "VH", vat == "VL"], [VAT["VH"][1], VAT["VL"][1]], 0)
+    # gross x rate / (100 + rate) in micro-euros, i.e. six decimals
+    tax_micro = np.rint(cents * 10_000 * rate / (100 + rate)).astype(np.int64)
+    dates = export["Date"].dt.strftime("%Y-%m-%d").to_numpy()
+    return pd.DataFrame({
+        "Grouped": dates,
+        "Currency": "EUR",
+        "Date": dates,
+        "Account": export["Account"].to_numpy(),
+        "Account Mapped": export["Account Mapped"].to_numpy(),
+        "Amount": _fmt_scaled(cents, 2, number_format),
+        "Tax Amount": _fmt_scaled(tax_micro, 6, number_format),
+        "Tax Code": np.select([vat == "VH", vat == "VL"], [VAT["VH"][0], VAT["VL"][0]], ""),
+        "Tax Code Mapped": vat,
+        "Tax Percentage": np.select([vat == "VH", vat == "VL"], [str(VAT["VH"][1]), str(VAT["VL"][1])], ""),
+    }, columns=TEBI_COLUMNS)
+
+
+def to_macro_frame(export):
+    """generate() rows in the layout of the XLS macro output."""
+    cents = export["Amount_cents"].to_numpy()
+    return pd.DataFrame({
+        "Datum": export["Date"].to_numpy(),
+        "Omschrijving": export["Account"].to_numpy(),
+        "Grtboekrek.": export["Account Mapped"].to_numpy(),
+        "Bedrag": np.abs(cents) / 100,
+        "Btwcode": export["Tax Code Mapped"].to_numpy(),
+        "DebitCredit": np.where(cents > 0, "Debit", "Credit"),
+    }, columns=MACRO_COLUMNS)
+
+
+def write_export(path, export, number_format="tebi"):
+    """Write generate() rows as a Tebi CSV (;-separated) or, for .xlsx, as macro output (pandas can't write .xls)."""
+    path = Path(path)
+    if path.suffix.lower() == ".xls":
+        raise ValueError(f"{path.name}: .xls can't be written, use .xlsx for macro output")
+    if path.suffix.lower() == ".xlsx":
+        to_macro_frame(export).to_excel(path, index=False)
+    else:
+        to_tebi_frame(export, number_format).to_csv(path, sep=";", index=False)
+    return path
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.synthetic",
+                                description="Write a synthetic Tebi export (CSV, or XLS-macro .xlsx).")
+    p.add_argument("out", help="Output file (.csv or .xlsx)")
+    p.add_argument("--rows", type=int, default=1000)
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--accounts", type=int, default=20, help="Distinct revenue accounts")
+    p.add_argument("--vat-mix", default="0.4,0.5,0.1", help="Share of accounts with high,low,no VAT")
+    p.add_argument("--unmapped", type=float, default=0.0, help="Share of revenue accounts without a GL")
+    p.add_argument("--number-format", choices=NUMBER_FORMATS, default="tebi")
+    p.add_argument("--start", default="2025-01-01")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    if Path(args.out).suffix.lower() == ".xls":
+        p.error("only .xlsx macro files can be written, not .xls")
+
+    export = generate(args.rows, days=args.days, accounts=args.accounts,
+                      vat_mix=[float(x) for x in args.vat_mix.split(",")], unmapped=args.unmapped,
+                      start=args.start, seed=args.seed)
+    write_export(args.out, export, number_format=args.number_format)
+    print(f"{len(export)} rows over {export['Date'].nunique()} days → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1 +1,17 @@
-from .io_reader import load_file
+"""
+Tebi exports -> Twinfield XML / Exact Online CSV or XML. Importing the package
+is cheap: load_file (and with it pandas) is imported on first use.
+"""
+import importlib
+
+_LAZY = {"load_file": "io_reader"}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,101 @@
+"""
+Dry run of a conversion: what the builders would do with a ledger, without
+building any output. One pass over the columns gives per day the debit, credit
+and VAT totals, the imbalance, the rounding line the builder adds (|imbalance|
+within round_tolerance) and what the day is still off by when it is booked, plus
+the rows the builders skip (no GL, zero amount, no date):
+
+    days, summary = balance_plan(ledger, "Twinfield")
+    summary["over_tolerance"]  # ["2025-01-03", ...]
+
+Twinfield lines carry net amounts and the builder balances those, while
+Twinfield books the VAT on top (autobalancevat), so a Twinfield day's remaining
+difference includes the VAT. Exact lines carry the gross amount. All amounts are
+cents.
+"""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from .utils import map_unique
+from .ledger import as_ledger
+from .money import vat_split, day_totals, needs_balancing, tolerance_cents, fmt_cents_array
+from .transform_twinfield import _gl, _vatcode
+from .instrument import span
+
+PLAN_COLUMNS = ["date", "lines", "debit", "credit", "vat", "imbalance", "rounding", "remaining", "over_tolerance"]
+MONEY_COLUMNS = ["debit", "credit", "vat", "imbalance", "rounding", "remaining"]
+
+
+def balance_plan(df, target="Twinfield", round_tolerance=Decimal("0.05")):
+    """
+    (days, summary) for a ledger (or any normalized frame). days has one row per
+    dated day (PLAN_COLUMNS): lines written, debit / credit / VAT totals,
+    imbalance = debit - credit, the rounding line's amount (0 = none), the
+    remaining difference of the booked day and over_tolerance (|remaining| over
+    round_tolerance: the day won't balance on import). summary has the totals,
+    the days over the tolerance, the unmapped source accounts with their row
+    counts and the skipped row counts.
+    """
+    ledger = as_ledger(df)
+    with span("plan", rows=len(ledger)):
+        codes, days = pd.factorize(ledger["Date"], sort=True)  # NaT -> -1
+        n = len(days)
+        gl = map_unique(ledger["Account Mapped"], _gl)
+        has_gl = map_unique(gl, lambda g: bool(g) and g.lower() != "nan").astype(bool)
+        amount = ledger["Amount_cents"].to_numpy(dtype="int64", na_value=0)
+        vatcode = map_unique(ledger["Tax Code Mapped"], _vatcode)
+        net, vat, _ = vat_split(amount, ledger["TaxAmount_micros"], ledger["Tax Percentage"], vatcode != "")
+
+        dated = codes >= 0
+        live = has_gl & (amount != 0) & dated
+        value = net if target == "Twinfield" else np.abs(amount)
+        credit = amount > 0  # revenue
+        c = codes[live]
+        debits = day_totals(c, np.where(credit, 0, value)[live], n)
+        credits = day_totals(c, np.where(credit, value, 0)[live], n)
+        imbalance = debits - credits
+        rounded = needs_balancing(imbalance, round_tolerance)
+        remaining = np.where(rounded, 0, imbalance)
+        if target == "Twinfield":
+            remaining = remaining + day_totals(c, np.where(credit, -vat, vat)[live], n)
+        over = np.abs(remaining) > tolerance_cents(round_tolerance)
+
+        plan = pd.DataFrame({
+            "date": pd.DatetimeIndex(days).strftime("%Y-%m-%d"),
+            "lines": np.bincount(c, minlength=n) + rounded,
+            "debit": debits,
+            "credit": credits,
+            "vat": day_totals(c, vat[live], n),
+            "imbalance": imbalance,
+            "rounding": np.where(rounded, np.abs(imbalance), 0),
+            "remaining": remaining,
+            "over_tolerance": over,
+        }, columns=PLAN_COLUMNS)
+
+        unmapped = ~has_gl & (amount != 0) & dated
+        accounts = pd.Series(ledger["Account"].to_numpy()[unmapped]).fillna("").astype(str).value_counts()
+        summary = {
+            "target": target,
+            "days": n,
+            "lines": int(plan["lines"].sum()),
+            "debit": int(debits.sum()),
+            "credit": int(credits.sum()),
+            "vat": int(plan["vat"].sum()),
+            "rounding_lines": int(rounded.sum()),
+            "rounding": int(plan["rounding"].sum()),
+            "over_tolerance": plan.loc[over, "date"].tolist(),
+            "unbalanced": int(np.abs(remaining[over]).sum()),
+            "unmapped_accounts": {str(a): int(k) for a, k in accounts.sort_index().items()},
+            "unmapped_rows": int(unmapped.sum()),
+            "zero_lines": int((has_gl & (amount == 0) & dated).sum()),
+            "undated_rows": int((~dated).sum()),
+        }
+    return plan, summary
+
+
+def plan_csv(days):
+    """The per-day plan as CSV bytes with the amounts in euros ("123.45"), the balance report of a bundle."""
+    out = days.assign(**{c: fmt_cents_array(days[c].to_numpy()) for c in MONEY_COLUMNS})
+    return out.to_csv(index=False).encode("utf-8")
@@ -0,0 +1,145 @@
+"""
+Parse cache for uploads: normalized frames keyed by a hash of the upload bytes,
+the file type and the parser version, so an identical export is parsed only once
+per process (all Streamlit sessions share it) and, with a spill directory, once
+across restarts too.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .io_reader import load_file, PARSER_VERSION
+from .ledger import is_ledger, freeze, memory_bytes
+from .instrument import span
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def upload_key(data, name):
+    """Cache key: sha256 of the bytes + file extension + parser version."""
+    ext = os.path.splitext(str(name).lower())[1]
+    h = hashlib.sha256(data).hexdigest()
+    return f"{h}-{ext.lstrip('.') or 'csv'}-v{PARSER_VERSION}"
+
+
+def _shared(df):
+    return df if is_ledger(df) else df.copy()
+
+
+class ParseCache:
+    """
+    Thread-safe LRU of load_file() results, capped at max_bytes of frame memory.
+    With spill_dir, every parsed frame is also pickled there and read back on a
+    memory miss; max_disk_bytes caps that directory (oldest files go first).
+    Ledgers are read-only, so every caller gets the same cached object; other
+    frames are handed out as a copy so sessions can't change each other's data.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spill_dir=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self._items = OrderedDict()  # key -> (df, missing, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def load(self, uploaded_file, loader=load_file):
+        """load_file(uploaded_file) through the cache -> (ledger, missing)."""
+        with span("parse_cache") as s:
+            with span("hash"):
+                key = upload_key(uploaded_file.getvalue(), uploaded_file.name)
+            with self._lock:
+                entry = self._items.get(key)
+                if entry is not None:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    s.set(result="memory", rows=len(entry[0]))
+                    return _shared(entry[0]), list(entry[1])
+
+            entry = self._read_spill(key)
+            if entry is not None:
+                self.disk_hits += 1
+                s.set(result="disk")
+            else:
+                self.misses += 1
+                s.set(result="miss")
+                entry = loader(uploaded_file)
+                self._write_spill(key, entry)
+            self._put(key, *entry)
+            s.set(rows=len(entry[0]))
+            return _shared(entry[0]), list(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def _put(self, key, df, missing):
+        size = memory_bytes(df)
+        with self._lock:
+            if key in self._items:
+                return
+            if size > self.max_bytes:
+                return  # bigger than the whole cache: don't keep it in memory
+            self._items[key] = (df, missing, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._items:
+                _, (_, _, old) = self._items.popitem(last=False)
+                self._bytes -= old
+
+    def _spill_path(self, key):
+        return self.spill_dir / f"{key}.pkl"
+
+    def _read_spill(self, key):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        try:
+            with open(path, "rb") as f:
+                df, missing = pickle.load(f)
+            os.utime(path)  # keep recently used files on prune
+            # Unpickled arrays are writable again
+            return (freeze(df) if is_ledger(df) else df), missing
+        except FileNotFoundError:
+            return None
+        except Exception:
+            path.unlink(missing_ok=True)  # unreadable / from another pandas version
+            return None
+
+    def _write_spill(self, key, entry):
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return
+        self._prune_spill()
+
+    def _prune_spill(self):
+        if not self.max_disk_bytes:
+            return
+        files = sorted(self.spill_dir.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        for p in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= p.stat().st_size
+            p.unlink(missing_ok=True)
@@ -0,0 +1,354 @@
+"""
+Headless batch conversion: many Tebi exports, one manifest, a process pool.
+
+    python -m tebi_books_transformers exports/ manifest.csv --out converted/ --workers 8
+
+The manifest (CSV or JSON list) has one row per file with the columns
+file, admin_code, journal_code, diff_ledger, target (Twinfield / Exact / Exact XML) and
+optionally kpl, currency, journal_type (KAS / MEMORIAAL).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import nullcontext
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from pathlib import Path
+
+# Only light modules here: pandas, the writers and the service clients are imported
+# where they are used, so --help and argument errors don't wait for them
+from .targets import EXACT_XML_TARGET, EXACT_BASE_URL, TWINFIELD_CONCURRENCY, COMPRESSIONS
+from .instrument import recording
+
+MANIFEST_COLUMNS = ["file", "admin_code", "journal_code", "diff_ledger", "target"]
+
+
+class LocalUpload(BytesIO):
+    """A file on disk that looks like a Streamlit upload (name + getvalue) to load_file."""
+    def __init__(self, path):
+        super().__init__(Path(path).read_bytes())
+        self.name = str(path)
+
+
+def _target(value):
+    v = str(value).strip().lower()
+    if v.startswith("twin"):
+        return "Twinfield"
+    if v.startswith("exact") and v.replace(" ", "").endswith("xml"):
+        return EXACT_XML_TARGET
+    if v.startswith("exact"):
+        return "Exact Online"
+    raise ValueError(f"Unknown target {value!r} (expected Twinfield, Exact or Exact XML)")
+
+
+def read_manifest(path):
+    """Manifest rows as a list of dicts (blank optional fields become None)."""
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        rows = json.loads(path.read_text(encoding="utf-8"))
+    else:
+        import pandas as pd
+        rows = pd.read_csv(path, sep=None, engine="python", dtype=str, keep_default_na=False).to_dict("records")
+    jobs = []
+    for i, r in enumerate(rows, start=1):
+        r = {str(k).strip(): (str(v).strip() if v is not None else "") for k, v in r.items()}
+        missing = [c for c in MANIFEST_COLUMNS if not r.get(c)]
+        if missing:
+            raise ValueError(f"Manifest row {i}: missing {', '.join(missing)}")
+        jobs.append({
+            "file": r["file"],
+            "admin_code": r["admin_code"],
+            "journal_code": r["journal_code"],
+            "diff_ledger": r["diff_ledger"],
+            "target": _target(r["target"]),
+            "kpl": r.get("kpl") or None,
+            "currency": r.get("currency") or "EUR",
+            "journal_type": (r.get("journal_type") or "KAS").upper(),
+        })
+    return jobs
+
+
+def convert_one(job, input_dir, out_dir, diagnostics=False, fragment_db=None, split=None, push=None,
+                validate=False, dry_run=False, compress=None):
+    """
+    Load + build one manifest entry. Never raises: failures are returned in the result.
+    With diagnostics, the per-stage spans are added to the result. With fragment_db,
+    unchanged days are reused from that FragmentStore and the result gets the
+    changed-day report under "days". With split (twinfield_parts.parse_split()),
+    Twinfield output is a ZIP of parts. With push ({"base_url", "access_token",
+    "log"}), Exact jobs are also pushed to Exact Online (exact_push, admin_code is
+    the division) and the push report is added under "pushed". With validate,
+    Exact XML output is checked against the eExact XSD while it is written. With
+    dry_run nothing is written: the balance_plan summary is added under "plan".
+    With compress ("gzip" / "zip", see bundle), the output is compressed as it is
+    written; a ZIP also holds the balance report (balance_plan.plan_csv).
+    """
+    result = {"file": job["file"], "admin_code": job["admin_code"], "target": job["target"],
+              "rows": None, "load_s": None, "build_s": None, "output": None, "error": None}
+    with (recording() if diagnostics else nullcontext()) as rec:
+        _convert(job, input_dir, out_dir, result, fragment_db, split, push, validate, dry_run, compress)
+    if rec is not None:
+        result["spans"] = rec.spans()
+    return result
+
+
+def _convert(job, input_dir, out_dir, result, fragment_db=None, split=None, push=None, validate=False,
+             dry_run=False, compress=None):
+    from .io_reader import load_file
+    from .ledger import output_filename
+    from .bundle import compressed, compressed_name, report_name
+    t0 = time.perf_counter()
+    try:
+        df, missing = load_file(LocalUpload(Path(input_dir) / job["file"]))
+        result["rows"] = len(df)
+        if "Date" in missing:
+            raise ValueError("File has no 'Date' column")
+        t1 = time.perf_counter()
+        result["load_s"] = round(t1 - t0, 4)
+        if dry_run:
+            from .balance_plan import balance_plan
+            result["plan"] = balance_plan(df, job["target"])[1]
+            result["build_s"] = round(time.perf_counter() - t1, 4)
+            return
+
+        split = split if job["target"] == "Twinfield" else None
+        file_name = output_filename(job["admin_code"], df, job["target"])
+        out_path = Path(out_dir) / compressed_name(file_name, "zip" if split else compress)
+        extra = []
+        if compress == "zip":
+            from .balance_plan import balance_plan, plan_csv
+            extra.append((report_name(file_name), plan_csv(balance_plan(df, job["target"])[0])))
+        args = (job["admin_code"], job["journal_code"], job["diff_ledger"])
+        options = {"currency": job["currency"], "destiny": "concept", "cost_center_code": job["kpl"]}
+        # Only the writer this target needs is imported
+        if fragment_db:
+            from .incremental import FragmentStore, incremental_fragments, iter_document
+            from .export_xml import write_xml_chunks
+        if split:
+            from .twinfield_parts import twinfield_fragments, iter_parts, write_zip
+        elif job["target"] == EXACT_XML_TARGET:
+            from .transform_exact_xml import write_exact_xml, validated
+        elif job["target"] == "Twinfield":
+            from .transform_twinfield import write_twinfield_xml
+        else:
+            from .transform_exact import write_exact_csv
+        try:
+            # A split output is a ZIP already: the balance report goes in with the parts
+            with open(out_path, "wb") as raw, compressed(raw, None if split else compress, file_name, extra) as out:
+                # workers=1: every file already has a process of its own
+                if split:
+                    if fragment_db:
+                        fragments, result["days"] = incremental_fragments(
+                            FragmentStore(fragment_db), df, job["target"], *args, workers=1, **options)
+                    else:
+                        fragments = twinfield_fragments(df, *args, workers=1, **options)
+                    parts = iter_parts(fragments, job["admin_code"], **split)
+                    result["parts"] = len(write_zip(out, chain(parts, extra))) - len(extra)
+                elif fragment_db:
+                    fragments, result["days"] = incremental_fragments(
+                        FragmentStore(fragment_db), df, job["target"], *args, journal_type=job["journal_type"],
+                        workers=1, **options)
+                    chunks = iter_document(job["target"], (frag for _, frag in fragments), job["journal_type"])
+                    if validate and job["target"] == EXACT_XML_TARGET:
+                        chunks = validated(chunks)
+                    write_xml_chunks(out, chunks)
+                elif job["target"] == "Twinfield":
+                    write_twinfield_xml(out, df, *args, **options)
+                elif job["target"] == EXACT_XML_TARGET:
+                    write_exact_xml(out, df, *args, validate=validate, currency=job["currency"],
+                                    cost_center_code=job["kpl"], journal_type=job["journal_type"])
+                else:
+                    write_exact_csv(out, df, *args, currency=job["currency"], cost_center_code=job["kpl"],
+                                    journal_type=job["journal_type"])
+        except Exception:
+            out_path.unlink(missing_ok=True)  # no half-written files
+            raise
+        result["build_s"] = round(time.perf_counter() - t1, 4)
+        result["output"] = str(out_path)
+        if push and job["target"].startswith("Exact Online"):
+            from .exact_push import PushLog, push_exact
+            result["pushed"] = push_exact(
+                df, job["admin_code"], job["journal_code"], job["diff_ledger"], base_url=push["base_url"],
+                access_token=push["access_token"], log=PushLog(push["log"]), currency=job["currency"],
+                cost_center_code=job["kpl"], journal_type=job["journal_type"])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+
+def run_batch(jobs, input_dir, out_dir, workers=None, diagnostics=False, fragment_db=None, split=None, push=None,
+              validate=False, dry_run=False, compress=None):
+    """Convert all jobs on a process pool; results in manifest order."""
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    results = [None] * len(jobs)
+    if workers == 1:
+        for i, job in enumerate(jobs):
+            results[i] = convert_one(job, input_dir, out_dir, diagnostics, fragment_db, split, push, validate,
+                                     dry_run, compress)
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_one, job, input_dir, out_dir, diagnostics, fragment_db, split, push,
+                               validate, dry_run, compress): i for i, job in enumerate(jobs)}
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    return results
+
+
+def submit_outputs(results, cluster_url, access_token, concurrency=TWINFIELD_CONCURRENCY):
+    """
+    Send every converted Twinfield file to Twinfield (twinfield_client) over one
+    connection pool; adds "submitted" = {"sent", "ok", "failed", "indeterminate", "errors"} to its result.
+    """
+    import asyncio
+    from .twinfield_client import TwinfieldClient, transactions_from_output
+    todo = [r for r in results if r["output"] and r["target"] == "Twinfield"]
+
+    async def run():
+        async with TwinfieldClient(cluster_url, access_token, concurrency=concurrency) as client:
+            return await asyncio.gather(*(
+                client.submit(r["admin_code"], transactions_from_output(Path(r["output"]).read_bytes()))
+                for r in todo))
+
+    for r, sent in zip(todo, asyncio.run(run()) if todo else []):
+        failed = [t for t in sent if not t["ok"]]
+        r["submitted"] = {"sent": len(sent), "ok": len(sent) - len(failed), "failed": len(failed),
+                          "indeterminate": sum(t.get("indeterminate", False) for t in failed),
+                          "errors": [f"{t['date']}: {'; '.join(t['messages'])}" for t in failed]}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m tebi_books_transformers",
+                                description="Convert a directory of Tebi exports to Twinfield XML / Exact CSV or XML.")
+    p.add_argument("input_dir", help="Directory with the Tebi exports")
+    p.add_argument("manifest", help="CSV or JSON manifest (file, admin_code, journal_code, diff_ledger, target, ...)")
+    p.add_argument("--out", default=None, help="Output directory (default: <input_dir>/converted)")
+    p.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (default: CPU count)")
+    p.add_argument("--report", default=None, help="Write per-file results as JSON to this path")
+    p.add_argument("--diagnostics", action="store_true",
+                   help="Log per-stage timings (JSON lines on stderr) and add them to the report")
+    p.add_argument("--incremental", metavar="DB", default=None,
+                   help="SQLite fragment store: rebuild only days that changed since the last run and report them")
+    p.add_argument("--split", default=None,
+                   help="Twinfield: ZIP of smaller files, e.g. month, 7d, 5mb or month,5mb (each file balances)")
+    p.add_argument("--submit", action="store_true",
+                   help="Send the Twinfield output to Twinfield (needs TWINFIELD_CLUSTER_URL and TWINFIELD_ACCESS_TOKEN)")
+    p.add_argument("--submit-concurrency", type=int, default=TWINFIELD_CONCURRENCY,
+                   help=f"Requests to Twinfield in flight (default {TWINFIELD_CONCURRENCY})")
+    p.add_argument("--push-exact", metavar="DB", default=None,
+                   help="Also push Exact jobs to Exact Online (division = admin_code; needs EXACT_ACCESS_TOKEN, "
+                        "optionally EXACT_BASE_URL); DB is the SQLite log of pushed days a rerun resumes from")
+    p.add_argument("--validate", action="store_true",
+                   help="Check Exact XML output against the eExact XSD while writing it (needs lxml)")
+    p.add_argument("--dry-run", action="store_true",
+                   help="Write nothing: report per file the days, rounding lines, days over the rounding tolerance "
+                        "and rows without GL (exits 1 if a day won't balance)")
+    p.add_argument("--compress", choices=COMPRESSIONS, default=None,
+                   help="Write every output compressed: gzip (.gz) or zip (.zip, with the balance report per day)")
+    p.add_argument("--bundle", metavar="NAME.zip", default=None,
+                   help="Also pack all outputs of this run into one ZIP in the output directory")
+    args = p.parse_args(argv)
+    if args.dry_run and (args.submit or args.push_exact or args.bundle):
+        p.error("--dry-run can't be combined with --submit, --push-exact or --bundle")
+    if args.compress == "gzip" and args.split:
+        p.error("--split output is a ZIP already; use --compress zip to add the balance report")
+    if args.submit and not (os.environ.get("TWINFIELD_CLUSTER_URL") and os.environ.get("TWINFIELD_ACCESS_TOKEN")):
+        p.error("--submit needs the TWINFIELD_CLUSTER_URL and TWINFIELD_ACCESS_TOKEN environment variables")
+    if args.push_exact and not os.environ.get("EXACT_ACCESS_TOKEN"):
+        p.error("--push-exact needs the EXACT_ACCESS_TOKEN environment variable")
+    push = {"base_url": os.environ.get("EXACT_BASE_URL") or EXACT_BASE_URL,
+            "access_token": os.environ.get("EXACT_ACCESS_TOKEN"), "log": args.push_exact} if args.push_exact else None
+    split = None
+    if args.split:
+        from .twinfield_parts import parse_split
+        try:
+            split = parse_split(args.split)
+        except ValueError as e:
+            p.error(str(e))
+    if args.diagnostics:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.incremental and not args.dry_run:
+        from .incremental import FragmentStore
+        FragmentStore(args.incremental).prune()  # fragments unused for 90 days
+
+    jobs = read_manifest(args.manifest)
+    out_dir = args.out or os.path.join(args.input_dir, "converted")
+    t0 = time.perf_counter()
+    results = run_batch(jobs, args.input_dir, out_dir, workers=args.workers, diagnostics=args.diagnostics,
+                        fragment_db=args.incremental, split=split, push=push, validate=args.validate,
+                        dry_run=args.dry_run, compress=args.compress)
+    if args.submit:
+        submit_outputs(results, os.environ["TWINFIELD_CLUSTER_URL"], os.environ["TWINFIELD_ACCESS_TOKEN"],
+                       concurrency=args.submit_concurrency)
+    bundled = None
+    if args.bundle:
+        from .bundle import bundle_files
+        bundled = Path(out_dir) / args.bundle
+        with open(bundled, "wb") as out:
+            entries = bundle_files(out, [r["output"] for r in results if r["output"]])
+    total = time.perf_counter() - t0
+
+    failed = [r for r in results if r["error"]]
+    log = logging.getLogger("tebi_books_transformers")
+    for r in results:
+        if "spans" in r:
+            log.info(json.dumps({"event": "timings", "file": r["file"], "admin_code": r["admin_code"],
+                                 "target": r["target"], "spans": r["spans"]}))
+    for r in results:
+        if r["error"]:
+            print(f"FAIL  {r['file']}  [{r['admin_code']} → {r['target']}]  {r['error']}")
+        elif "plan" in r:
+            pl = r["plan"]
+            print(f"PLAN  {r['file']}  [{r['admin_code']} → {r['target']}]  {r['rows']} rows  {pl['days']} days  "
+                  f"{pl['lines']} lines  {pl['rounding_lines']} rounding  {len(pl['over_tolerance'])} over tolerance  "
+                  f"{pl['unmapped_rows']} rows without GL")
+            if pl["over_tolerance"]:
+                print(f"      won't balance: {', '.join(pl['over_tolerance'])}")
+            if pl["unmapped_accounts"]:
+                print(f"      no GL: {', '.join(pl['unmapped_accounts'])}")
+        else:
+            parts = f" ({r['parts']} parts)" if "parts" in r else ""
+            print(f"OK    {r['file']}  [{r['admin_code']} → {r['target']}]  {r['rows']} rows  "
+                  f"load {r['load_s']:.2f}s  build {r['build_s']:.2f}s  → {r['output']}{parts}")
+            if "days" in r:
+                d = r["days"]
+                print(f"      days: {len(d['new'])} new, {len(d['changed'])} changed, {len(d['unchanged'])} unchanged"
+                      f"{' (' + ', '.join(d['changed']) + ')' if d['changed'] else ''}; {d['reused']} reused")
+            if "submitted" in r:
+                sub = r["submitted"]
+                print(f"      sent to Twinfield: {sub['ok']}/{sub['sent']} transactions accepted"
+                      f"{', ' + str(sub['indeterminate']) + ' outcome unknown (not resent)' if sub['indeterminate'] else ''}")
+                for error in sub["errors"][:10]:
+                    print(f"        {error}")
+            if "pushed" in r:
+                pr = r["pushed"]
+                print(f"      pushed to Exact: {len(pr['pushed'])} day(s), {len(pr['skipped'])} already there"
+                      f"{', ' + str(len(pr['not_sent'])) + ' not sent' if pr['not_sent'] else ''}")
+                for f in pr["failed"]:
+                    print(f"        {f['day']}: {f['error']}")
+                if pr["changed"]:
+                    print(f"        changed since they were pushed (not sent again): {', '.join(pr['changed'])}")
+                if pr["unknown"]:
+                    print(f"        outcome of an earlier push unknown (not sent again until checked in Exact "
+                          f"and forgotten in the log): {', '.join(pr['unknown'])}")
+    if bundled is not None:
+        size = sum(e["bytes"] for e in entries)
+        print(f"Bundled {len(entries)} file(s) → {bundled} ({bundled.stat().st_size / 2**20:.1f} MiB, "
+              f"{size / 2**20:.1f} MiB unpacked)")
+    done = "checked" if args.dry_run else "converted"
+    print(f"{len(results) - len(failed)}/{len(results)} {done} in {total:.2f}s ({args.workers} workers)")
+
+    if args.report:
+        Path(args.report).write_text(json.dumps({"seconds": round(total, 4), "results": results}, indent=2),
+                                     encoding="utf-8")
+    rejected = any(r.get("submitted", {}).get("failed") or r.get("pushed", {}).get("failed")
+                   or r.get("pushed", {}).get("unknown")
+                   or r.get("plan", {}).get("over_tolerance") for r in results)
+    return 1 if failed or rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Local stand-in for the Exact Online REST endpoints exact_push uses, for offline
+tests and benchmarks:
+
+    python -m tebi_books_transformers.exact_mock --port 8766 --per-minute 60 --fail-rate 0.05
+
+then push with base_url="http://127.0.0.1:8766" and access token "mock-token".
+GLAccounts lists the codes 1000-9999 (paged like Exact). CashEntries and
+GeneralJournalEntries answer 201 with an EntryID, or 400 with Exact's error body
+when a line has an unknown account or, for a general journal entry, the amounts
+don't add up to zero (a cash entry's difference goes to the cash account). With
+per_minute every division gets that many calls per minute (429 after that, with
+the X-RateLimit-Minutely-* headers); fail_rate answers that share of calls with 503.
+lost_rate books that share of the entries but answers 504, like a gateway timing
+out after Exact did the work. TransactionLines answers the lookups exact_push
+does before posting a day again (JournalCode, Date and Description filters).
+"""
+import argparse
+import asyncio
+import contextlib
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from .exact_push import ENDPOINTS, GL_ACCOUNTS_PATH, LINES_PATH
+
+MOCK_TOKEN = "mock-token"
+PAGE_SIZE = 1000
+_FILTER = re.compile(r"(\w+) eq (?:datetime)?'((?:[^']|'')*)'")
+
+
+def _error(status, message):
+    from aiohttp import web
+    return web.json_response({"error": {"code": "", "message": {"lang": "", "value": message}}}, status=status)
+
+
+class MockExact:
+    """Handler state: accounts, entries per division, calls in the current minute per division."""
+
+    def __init__(self, access_token=MOCK_TOKEN, gl_codes=None, per_minute=None, latency=0.0, fail_rate=0.0,
+                 lost_rate=0.0, seed=None):
+        self.access_token = access_token
+        codes = gl_codes if gl_codes is not None else (str(c) for c in range(1000, 10000))
+        self.gl_accounts = {str(uuid.uuid5(uuid.NAMESPACE_OID, f"gl-{c}")): str(c) for c in codes}
+        self.per_minute = per_minute
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.lost_rate = lost_rate
+        self.entries = defaultdict(list)  # division -> [entry payload with EntryID]
+        self.requests = self.failures = self.rate_limited = self.lost = 0
+        self._rng = random.Random(seed)
+        self._minute = {}  # division -> (window start, calls)
+
+    def _rate_headers(self, division):
+        """None if the call may go ahead, else the 429 headers."""
+        if not self.per_minute:
+            return None
+        now = time.time()
+        start, calls = self._minute.get(division, (now, 0))
+        if now - start >= 60:
+            start, calls = now, 0
+        calls += 1
+        self._minute[division] = (start, calls)
+        headers = {"X-RateLimit-Minutely-Limit": str(self.per_minute),
+                   "X-RateLimit-Minutely-Remaining": str(max(0, self.per_minute - calls)),
+                   "X-RateLimit-Minutely-Reset": str(int((start + 60) * 1000))}
+        return headers if calls > self.per_minute else None
+
+    async def _gate(self, request):
+        """An error response for this call (auth, rate limit, injected failure), or None."""
+        from aiohttp import web
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.headers.get("Authorization") != f"Bearer {self.access_token}":
+            return _error(401, "Unauthorized")
+        headers = self._rate_headers(request.match_info["division"])
+        if headers:
+            self.rate_limited += 1
+            return web.json_response({"error": {"message": {"value": "Too many requests"}}}, status=429,
+                                     headers=headers)
+        if self.fail_rate and self._rng.random() < self.fail_rate:
+            self.failures += 1
+            return web.Response(status=503, text="Service Unavailable")
+        return None
+
+    async def gl_list(self, request):
+        from aiohttp import web
+        if (refused := await self._gate(request)) is not None:
+            return refused
+        skip = int(request.query.get("$skip", 0))
+        items = list(self.gl_accounts.items())
+        page = [{"ID": i, "Code": c} for i, c in items[skip:skip + PAGE_SIZE]]
+        d = {"results": page}
+        if skip + PAGE_SIZE < len(items):
+            d["__next"] = str(request.url.with_query({"$select": "ID,Code", "$skip": str(skip + PAGE_SIZE)}))
+        return web.json_response({"d": d})
+
+    async def lines(self, request):
+        from aiohttp import web
+        if (refused := await self._gate(request)) is not None:
+            return refused
+        want = {k: v.replace("''", "'") for k, v in _FILTER.findall(request.query.get("$filter", ""))}
+        found = []
+        for entry in self.entries[request.match_info["division"]]:
+            lines = next(v for k, v in entry.items() if k.endswith("Lines"))
+            if want.get("JournalCode", entry.get("JournalCode")) != entry.get("JournalCode"):
+                continue
+            if any(all(str(line.get(k)) == v for k, v in want.items() if k != "JournalCode") for line in lines):
+                found.append({"EntryID": entry["EntryID"]})
+        return web.json_response({"d": {"results": found[:int(request.query.get("$top", PAGE_SIZE))]}})
+
+    def post_entry(self, lines_key, balanced):
+        async def handle(request):
+            from aiohttp import web
+            if (refused := await self._gate(request)) is not None:
+                return refused
+            entry = await request.json()
+            lines = entry.get(lines_key) or []
+            if not lines:
+                return _error(400, "An entry needs at least one line.")
+            if any(l.get("GLAccount") not in self.gl_accounts for l in lines):
+                return _error(400, "G/L account not found.")
+            if balanced and sum(Decimal(str(l.get("AmountFC") or 0)) for l in lines) != 0:
+                return _error(400, "The entry is not balanced.")
+            division = request.match_info["division"]
+            entry["EntryID"] = str(uuid.uuid4())
+            entry["EntryNumber"] = len(self.entries[division]) + 1
+            self.entries[division].append(entry)
+            if self.lost_rate and self._rng.random() < self.lost_rate:
+                self.lost += 1
+                return web.Response(status=504, text="Gateway Timeout")
+            return web.json_response({"d": entry}, status=201)
+        return handle
+
+
+def make_app(mock):
+    from aiohttp import web
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app.router.add_get(f"/api/v1/{{division}}/{GL_ACCOUNTS_PATH}", mock.gl_list)
+    app.router.add_get(f"/api/v1/{{division}}/{LINES_PATH}", mock.lines)
+    for journal_type, (path, lines_key) in ENDPOINTS.items():
+        app.router.add_post(f"/api/v1/{{division}}/{path}", mock.post_entry(lines_key, journal_type == "MEMORIAAL"))
+    return app
+
+
+@contextlib.asynccontextmanager
+async def mock_server(host="127.0.0.1", port=0, **options):
+    """Run a MockExact in the current event loop; yields (base_url, mock)."""
+    from aiohttp import web
+    mock = MockExact(**options)
+    runner = web.AppRunner(make_app(mock))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    try:
+        yield f"http://{host}:{runner.addresses[0][1]}", mock
+    finally:
+        await runner.cleanup()
+
+
+def main(argv=None):
+    from aiohttp import web
+    p = argparse.ArgumentParser(description="Local Exact Online REST stand-in (entries + GL accounts).")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8766)
+    p.add_argument("--token", default=MOCK_TOKEN, help="Bearer token to accept")
+    p.add_argument("--per-minute", type=int, default=None, help="Calls per minute per division before 429")
+    p.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before every answer")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Share of calls answered with HTTP 503")
+    p.add_argument("--lost-rate", type=float, default=0.0, help="Share of entries booked but answered with HTTP 504")
+    args = p.parse_args(argv)
+    mock = MockExact(access_token=args.token, per_minute=args.per_minute, latency=args.latency,
+                     fail_rate=args.fail_rate, lost_rate=args.lost_rate)
+    web.run_app(make_app(mock), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
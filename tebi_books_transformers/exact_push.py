@@ -0,0 +1,444 @@
+"""
+Push Exact Online entries straight to the REST API instead of importing the CSV
+through Financieel → Import. The rows build_exact_csv writes for one day become
+one entry: a CashEntry for KAS journals, a GeneralJournalEntry for MEMORIAAL,
+with the same GL accounts, amounts (and signs), VAT and cost center.
+
+    log = PushLog("data/exact_push.sqlite3")
+    report = push_exact(ledger, "123456", "10", "9899", base_url="https://start.exactonline.nl",
+                        access_token=token, log=log)
+
+Days go out in date order, `concurrency` at a time, over one pooled aiohttp
+session. Exact allows about 60 calls per minute per division: the client paces
+itself to calls_per_minute, follows the X-RateLimit-Minutely-* headers and waits
+out a 429. Every confirmed day is recorded in the PushLog; a run stops at the
+first window with a failed day, and the next run resumes after the days already
+confirmed, so no day is booked twice.
+
+Creating an entry is not idempotent, so a POST is only sent again when Exact
+provably didn't run it (429, 503, or no connection was made), and only after
+looking the entry up (find_entry: journal, date and first line's description).
+When the outcome is unknown (a 5xx, a timeout, a dropped connection) and the
+lookup doesn't find the entry, the day is logged as unknown: later runs skip it
+until it is checked in Exact and forgotten (PushLog.forget).
+
+Like twinfield_client, this needs aiohttp (pip install aiohttp).
+"""
+import asyncio
+import json
+import random
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import pandas as pd
+
+from .ledger import as_ledger
+from .incremental import day_digests
+from .transform_exact import iter_exact_day_frames
+from .instrument import span
+from .targets import EXACT_BASE_URL as DEFAULT_BASE_URL
+
+ENDPOINTS = {  # journal_type -> (entity path, lines property)
+    "KAS": ("financialtransaction/CashEntries", "CashEntryLines"),
+    "MEMORIAAL": ("generaljournalentry/GeneralJournalEntries", "GeneralJournalEntryLines"),
+}
+GL_ACCOUNTS_PATH = "financial/GLAccounts"
+LINES_PATH = "financialtransaction/TransactionLines"
+RETRY_STATUS = {429, 500, 502, 503, 504}  # reads
+POST_RETRY_STATUS = {429, 503}  # refused before anything was booked
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pushed_days (
+    division     TEXT NOT NULL,
+    journal_code TEXT NOT NULL,
+    day          TEXT NOT NULL,
+    digest       TEXT NOT NULL,
+    entry_id     TEXT NOT NULL,
+    pushed_at    TEXT NOT NULL,
+    PRIMARY KEY (division, journal_code, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS unknown_days (
+    division     TEXT NOT NULL,
+    journal_code TEXT NOT NULL,
+    day          TEXT NOT NULL,
+    digest       TEXT NOT NULL,
+    error        TEXT NOT NULL,
+    logged_at    TEXT NOT NULL,
+    PRIMARY KEY (division, journal_code, day)
+) WITHOUT ROWID
+"""
+
+
+class PushError(Exception):
+    """An entry (or lookup) Exact refused, or that could not be delivered after retries."""
+
+
+class PushUnknown(PushError):
+    """A POST whose outcome is unknown: Exact may have booked the entry, so it is not sent again."""
+
+
+class PushLog:
+    """Days confirmed by Exact per division and journal, with the row digest they were pushed with."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call: safe across Streamlit's threads.
+        # The inner with commits (or rolls back), closing() then closes the connection
+        with closing(sqlite3.connect(self.path, timeout=10)) as con, con:
+            yield con
+
+    def confirmed(self, division, journal_code):
+        """{"YYYY-MM-DD": digest} of the days already in Exact."""
+        with self._connect() as con:
+            rows = con.execute("SELECT day, digest FROM pushed_days WHERE division = ? AND journal_code = ?",
+                               (str(division), str(journal_code))).fetchall()
+        return dict(rows)
+
+    def confirm(self, division, journal_code, day, digest, entry_id):
+        key = (str(division), str(journal_code), day)
+        with self._connect() as con:
+            con.execute("INSERT OR REPLACE INTO pushed_days VALUES (?, ?, ?, ?, ?, ?)",
+                        (*key, digest, str(entry_id), datetime.now(timezone.utc).isoformat(timespec="seconds")))
+            con.execute("DELETE FROM unknown_days WHERE division = ? AND journal_code = ? AND day = ?", key)
+
+    def unknown(self, division, journal_code):
+        """{"YYYY-MM-DD": error} of the days whose push may or may not have been booked."""
+        with self._connect() as con:
+            rows = con.execute("SELECT day, error FROM unknown_days WHERE division = ? AND journal_code = ?",
+                               (str(division), str(journal_code))).fetchall()
+        return dict(rows)
+
+    def mark_unknown(self, division, journal_code, day, digest, error):
+        with self._connect() as con:
+            con.execute("INSERT OR REPLACE INTO unknown_days VALUES (?, ?, ?, ?, ?, ?)",
+                        (str(division), str(journal_code), day, digest, str(error),
+                         datetime.now(timezone.utc).isoformat(timespec="seconds")))
+
+    def forget(self, division, journal_code, day):
+        """Drop a day (confirmed or unknown) so the next run pushes it: after checking / reversing it in Exact."""
+        key = (str(division), str(journal_code), day)
+        with self._connect() as con:
+            for table in ("pushed_days", "unknown_days"):
+                con.execute(f"DELETE FROM {table} WHERE division = ? AND journal_code = ? AND day = ?", key)
+
+
+def _amount(text):
+    return float(Decimal(text)) if text else None
+
+
+def entry_payload(day, rows, journal_type, gl_ids):
+    """
+    One Exact entry (dict) from a day's output rows (iter_exact_day_frames);
+    gl_ids maps GL account codes to Exact's account IDs.
+    """
+    _, lines_key = ENDPOINTS[journal_type]
+    unknown = sorted(set(rows["Grootboekrekening"]) - set(gl_ids))
+    if unknown:
+        raise PushError(f"GL account(s) not in this division: {', '.join(unknown)}")
+    first = rows.iloc[0]
+    date = day.strftime("%Y-%m-%dT00:00:00")
+    lines = []
+    for gl, desc, ref, amount, vat_code, vat, kpl in zip(
+            rows["Grootboekrekening"], rows["Omschrijving"], rows["Onze ref."], rows["Bedrag"],
+            rows["BTW-code"], rows["BTW-bedrag"], rows["Kostenplaats: Code"]):
+        line = {"Date": date, "GLAccount": gl_ids[gl], "AmountFC": _amount(amount), "Description": desc,
+                "OurRef": int(ref)}
+        if vat_code:
+            line["VATCode"] = vat_code
+        if vat:
+            line["VATAmountFC"] = _amount(vat)
+        if kpl:
+            line["CostCenter"] = kpl
+        lines.append(line)
+    return {
+        "JournalCode": first["Dagboek: Code"],
+        "FinancialYear": int(first["Boekjaar"]),
+        "FinancialPeriod": int(first["Periode"]),
+        "Currency": first["Valuta"],
+        lines_key: lines,
+    }
+
+
+def _json(data):
+    try:
+        return json.loads(data) if data else None
+    except ValueError:
+        return None
+
+
+def _error_message(body, status):
+    try:
+        return body["error"]["message"]["value"]
+    except (TypeError, KeyError):
+        return f"HTTP {status}"
+
+
+def _describe(error):
+    return str(error) if isinstance(error, PushError) else f"{type(error).__name__}: {error}"
+
+
+class _Pacer:
+    """Spaces calls to calls_per_minute and pauses until the minute resets when Exact says it's used up."""
+
+    def __init__(self, calls_per_minute):
+        self.interval = 60.0 / calls_per_minute if calls_per_minute else 0.0
+        self._next = self._resume = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            start = max(now, self._next, self._resume)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def update(self, status, headers):
+        remaining = headers.get("X-RateLimit-Minutely-Remaining")
+        if status != 429 and remaining != "0":
+            return
+        reset = headers.get("X-RateLimit-Minutely-Reset")  # epoch milliseconds
+        wait = int(reset) / 1000 - time.time() if reset and reset.isdigit() else 60.0
+        self._resume = max(self._resume, asyncio.get_running_loop().time() + max(0.0, wait))
+
+
+class ExactClient:
+    """
+    Async Exact Online REST client on one pooled aiohttp session; use as
+    `async with ExactClient(base_url, token) as client: await client.post_entry(...)`.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, access_token=None, concurrency=4, calls_per_minute=60,
+                 max_retries=4, backoff=1.0, timeout=120):
+        self.base_url = str(base_url).rstrip("/")
+        self.access_token = access_token
+        self.concurrency = concurrency
+        self.calls_per_minute = calls_per_minute
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._session = None
+        self._pacers = {}
+        self._gl_ids = {}
+
+    async def __aenter__(self):
+        import aiohttp
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Authorization": f"Bearer {self.access_token}", "Accept": "application/json"},
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        return False
+
+    def _pacer(self, division):
+        # Exact's limits are per division
+        if division not in self._pacers:
+            self._pacers[division] = _Pacer(self.calls_per_minute)
+        return self._pacers[division]
+
+    async def request(self, method, division, url, payload=None, before_retry=None):
+        """
+        JSON body of one call (url relative to /api/v1/<division>/, or absolute);
+        retried, else PushError. A POST is only retried when it provably didn't
+        run, and PushUnknown is raised when it may have; before_retry (async, ->
+        body or None) is awaited before a POST is sent again and its body, if
+        any, is returned instead.
+        """
+        import aiohttp
+        if not url.startswith("http"):
+            url = f"{self.base_url}/api/v1/{division}/{url}"
+        idempotent = method == "GET"
+        pacer = self._pacer(division)
+        for attempt in range(1, self.max_retries + 2):
+            if attempt > 1 and not idempotent and before_retry is not None:
+                found = await before_retry()
+                if found is not None:
+                    return found
+            await pacer.wait()
+            rate_limited = False
+            try:
+                async with self._session.request(method, url, json=payload) as resp:
+                    pacer.update(resp.status, resp.headers)
+                    body = _json(await resp.read())
+                    if resp.status < 400:
+                        return body
+                    error = _error_message(body, resp.status)
+                    if resp.status not in (RETRY_STATUS if idempotent else POST_RETRY_STATUS):
+                        if not idempotent and resp.status >= 500:
+                            raise PushUnknown(f"Outcome unknown ({error})")
+                        raise PushError(error)
+                    rate_limited = resp.status == 429
+            except aiohttp.ClientConnectorError as e:
+                error = f"{type(e).__name__}: {e}"  # no connection was made: nothing was sent
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+                if not idempotent:
+                    raise PushUnknown(f"Outcome unknown ({error})") from None
+            if attempt > self.max_retries:
+                raise PushError(f"Gave up after {attempt} attempts ({error})")
+            if not rate_limited:  # a 429 already paused the pacer until the minute resets
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (0.5 + random.random()))
+
+    async def gl_accounts(self, division):
+        """{GL code: account ID} of a division (all pages; fetched once per client)."""
+        if division not in self._gl_ids:
+            ids, url = {}, f"{GL_ACCOUNTS_PATH}?$select=ID,Code"
+            while url:
+                d = (await self.request("GET", division, url))["d"]
+                ids.update({str(a["Code"]).strip(): a["ID"] for a in d["results"]})
+                url = d.get("__next")
+            self._gl_ids[division] = ids
+        return self._gl_ids[division]
+
+    async def find_entry(self, division, journal_type, payload):
+        """
+        EntryID of an entry already in Exact like payload (same journal, date and
+        first line description: the idempotency key of a day entry), or None.
+        """
+        _, lines_key = ENDPOINTS[journal_type]
+        first = payload[lines_key][0]
+        journal, description = (str(v).replace("'", "''") for v in (payload["JournalCode"], first["Description"]))
+        url = (f"{LINES_PATH}?$select=EntryID&$top=1&$filter=JournalCode eq '{journal}' "
+               f"and Date eq datetime'{first['Date']}' and Description eq '{description}'")
+        results = (await self.request("GET", division, url))["d"]["results"]
+        return results[0]["EntryID"] if results else None
+
+    async def post_entry(self, division, journal_type, payload):
+        """
+        Create one entry -> its EntryID. Exact is checked for the entry before a
+        retry and when the outcome is unknown; PushUnknown if it may have been
+        booked but isn't found.
+        """
+        path, _ = ENDPOINTS[journal_type]
+
+        async def existing():
+            entry_id = await self.find_entry(division, journal_type, payload)
+            return None if entry_id is None else {"d": {"EntryID": entry_id}}
+
+        async def lookup(problem):
+            try:
+                found = await existing()
+            except PushError:
+                found = None
+            if found is None:
+                raise PushUnknown(f"{problem}; not found in Exact, check the day there before pushing it again")
+            return found["d"]["EntryID"]
+
+        try:
+            body = await self.request("POST", division, path, payload, before_retry=existing)
+        except PushUnknown as e:
+            return await lookup(e)
+        try:
+            return body["d"]["EntryID"]
+        except (TypeError, KeyError):
+            return await lookup("Exact accepted the entry but its answer has no EntryID")
+
+
+async def push_days(client, log, division, journal_code, journal_type, days, stop_on_error=True):
+    """
+    Push [(day, digest, rows)] in date order, client.concurrency days at a time,
+    confirming each accepted day in log (a PushLog, or None) and logging the days
+    whose outcome is unknown (failed with "unknown": True). Returns (pushed, failed, not_sent).
+    """
+    labels = [d.strftime("%Y-%m-%d") for d, _, _ in days]
+    try:
+        gl_ids = await client.gl_accounts(division)
+    except Exception as e:
+        return [], [{"day": labels[0], "error": f"Reading the GL accounts failed: {_describe(e)}"}], labels[1:]
+
+    def unknown(label, digest, error):
+        if log is not None:
+            try:
+                log.mark_unknown(division, journal_code, label, digest, error)
+            except Exception as e:
+                error = f"{error} (not logged: {_describe(e)})"
+        return False, {"day": label, "error": error, "unknown": True}
+
+    async def one(day, digest, rows):
+        # Never raises: an exception here would cancel the window's other days after they were booked
+        label = day.strftime("%Y-%m-%d")
+        try:
+            payload = entry_payload(day, rows, journal_type, gl_ids)
+        except Exception as e:
+            return False, {"day": label, "error": _describe(e)}
+        try:
+            entry_id = await client.post_entry(division, journal_type, payload)
+        except PushUnknown as e:
+            return unknown(label, digest, str(e))
+        except PushError as e:
+            return False, {"day": label, "error": str(e)}
+        except Exception as e:  # after the POST went out: it may have been booked
+            return unknown(label, digest, f"Outcome unknown ({_describe(e)})")
+        if log is not None:
+            try:
+                log.confirm(division, journal_code, label, digest, entry_id)
+            except Exception as e:
+                return False, {"day": label, "entry_id": entry_id, "unknown": True,
+                               "error": f"Booked in Exact as {entry_id} but not logged ({_describe(e)}): "
+                                        f"don't push this day again"}
+        return True, {"day": label, "entry_id": entry_id}
+
+    pushed, failed = [], []
+    for start in range(0, len(days), client.concurrency):
+        window = days[start:start + client.concurrency]
+        for ok, item in await asyncio.gather(*(one(*d) for d in window)):
+            (pushed if ok else failed).append(item)
+        if failed and stop_on_error:
+            return pushed, failed, labels[start + len(window):]
+    return pushed, failed, []
+
+
+def push_exact(df, division, journal_code, differences_ledger, base_url=DEFAULT_BASE_URL, access_token=None,
+               log=None, currency="EUR", cost_center_code=None, journal_type="KAS",
+               round_tolerance=Decimal("0.05"), stop_on_error=True, **client_options):
+    """
+    Push every day of a ledger that log hasn't confirmed yet. Returns
+
+        {"pushed": [{"day", "entry_id"}], "failed": [{"day", "error"[, "unknown"]}],
+         "skipped": [days already in Exact], "changed": [of those, days whose rows differ now],
+         "unknown": [days an earlier push may have booked], "not_sent": [days after a failed window]}
+
+    Days in "changed" are not pushed again: correct them in Exact (or reverse the
+    entry and forget the day in the log) so nothing is booked twice. Days in
+    "unknown" are skipped until they are checked in Exact and forgotten.
+    """
+    ledger = as_ledger(df)
+    done = log.confirmed(division, journal_code) if log is not None else {}
+    unknown = log.unknown(division, journal_code) if log is not None else {}
+    digests = {day: digest for day, _, digest in day_digests(ledger)}
+    todo, skipped, changed = [], [], []
+    for day, rows in iter_exact_day_frames(ledger, journal_code, differences_ledger, currency, cost_center_code,
+                                           journal_type, round_tolerance):
+        label = day.strftime("%Y-%m-%d")
+        if label in done:
+            skipped.append(label)
+            if done[label] != digests[day]:
+                changed.append(label)
+        elif len(rows) and label not in unknown:
+            todo.append((pd.Timestamp(day), digests[day], rows))
+
+    async def run():
+        async with ExactClient(base_url, access_token, **client_options) as client:
+            return await push_days(client, log, str(division), journal_code, journal_type, todo,
+                                   stop_on_error=stop_on_error)
+
+    with span("push", rows=sum(len(r) for _, _, r in todo)):
+        pushed, failed, not_sent = asyncio.run(run()) if todo else ([], [], [])
+    return {"pushed": pushed, "failed": failed, "skipped": skipped, "changed": changed,
+            "unknown": sorted(unknown), "not_sent": not_sent}
@@ -1,8 +1,47 @@
-from xml.etree.ElementTree import ElementTree
+from xml.etree.ElementTree import ElementTree, tostring
 from io import BytesIO
+from .instrument import span
+
+XML_DECLARATION = b"<?xml version='1.0' encoding='utf-8'?>\n"
 
 def xml_to_bytes(root_el):
-    mem = BytesIO()
-    ElementTree(root_el).write(mem, encoding='utf-8', xml_declaration=True)
-    mem.seek(0)
-    return mem.getvalue()
+    with span("xml_to_bytes", rows=len(root_el)):
+        mem = BytesIO()
+        ElementTree(root_el).write(mem, encoding='utf-8', xml_declaration=True)
+        mem.seek(0)
+        return mem.getvalue()
+
+def iter_xml_chunks(root_tag, elements):
+    """
+    Serialize <root_tag> with the given child elements incrementally: yields the
+    declaration + opening tag, then one chunk per child, then the closing tag.
+    Joined, the chunks equal xml_to_bytes() of the same tree.
+    """
+    return iter_xml_fragments(root_tag, _serialized(elements))
+
+def _serialized(elements):
+    for el in elements:
+        with span("serialize", rows=1):
+            chunk = tostring(el, encoding="utf-8")
+        yield chunk
+
+def iter_xml_fragments(root_tag, fragments):
+    """Like iter_xml_chunks, for children that are already serialized (utf-8 bytes)."""
+    started = False
+    for chunk in fragments:
+        if not started:
+            yield XML_DECLARATION + f"<{root_tag}>".encode("utf-8")
+            started = True
+        yield chunk
+    if started:
+        yield f"</{root_tag}>".encode("utf-8")
+    else:
+        yield XML_DECLARATION + f"<{root_tag} />".encode("utf-8")
+
+def write_xml_chunks(out, chunks):
+    """Write byte chunks to a binary file-like object; returns the number of bytes written."""
+    n = 0
+    for chunk in chunks:
+        out.write(chunk)
+        n += len(chunk)
+    return n
@@ -0,0 +1,154 @@
+"""
+Opt-in instrumentation: wall time, row counts and peak allocation per conversion
+stage (read, parse amounts/dates, ledger, group by day, lines, XML/CSV output).
+
+    with recording(memory=True) as rec:
+        df, _ = load_file(upload)
+        build_twinfield_xml(df, ...)
+    rec.log(admin_code="1001")   # one structured (JSON) log line
+    rec.spans()                  # list of dicts, e.g. for st.dataframe
+
+Outside recording(), span() hands out a shared no-op, so instrumented code pays a
+thread-local lookup and nothing else. Recording is per thread (every Streamlit
+session runs in its own thread). tracemalloc is process-wide though, so with
+memory=True, peaks can include other sessions working at the same time.
+
+Spans with the same name under the same parent are merged (e.g. one "serialize"
+span per day becomes one row with calls=365).
+"""
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("tebi_books_transformers")
+_local = threading.local()
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("rec", "name", "fields", "t0", "mem0")
+
+    def __init__(self, rec, name, fields):
+        self.rec = rec
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        rec = self.rec
+        rec._stack.append(self.name)
+        rec._open(tuple(rec._stack))
+        if rec.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # reset_peak() below forgets the parent's peak so far: keep it here
+            rec._peaks[-1] = max(rec._peaks[-1], peak)
+            tracemalloc.reset_peak()
+            rec._peaks.append(0)
+            self.mem0 = current
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.t0
+        rec = self.rec
+        peak = None
+        if rec.memory:
+            top = max(tracemalloc.get_traced_memory()[1], rec._peaks.pop())
+            rec._peaks[-1] = max(rec._peaks[-1], top)
+            peak = top - self.mem0
+        path = tuple(rec._stack)
+        rec._stack.pop()
+        rec._add(path, seconds, peak, self.fields)
+        return False
+
+
+def span(name, **fields):
+    """
+    Context manager timing one stage; fields (rows=..., file=...) are recorded
+    with it and can be added later with .set(). A no-op unless recording.
+    """
+    rec = getattr(_local, "recorder", None)
+    if rec is None:
+        return _NO_SPAN
+    return _Span(rec, name, fields)
+
+
+def enabled():
+    """True inside recording() on this thread."""
+    return getattr(_local, "recorder", None) is not None
+
+
+class Recorder:
+    """Aggregated spans of one recording() block."""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self._stack = []
+        self._peaks = [0]
+        self._spans = {}  # path -> entry, in first-seen order
+
+    def _open(self, path):
+        if path not in self._spans:
+            self._spans[path] = {"stage": "/".join(path), "depth": len(path) - 1,
+                                 "calls": 0, "seconds": 0.0, "rows": None, "peak_bytes": None}
+
+    def _add(self, path, seconds, peak, fields):
+        entry = self._spans[path]
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        rows = fields.get("rows")
+        if rows is not None:
+            entry["rows"] = (entry["rows"] or 0) + int(rows)
+        if peak is not None:
+            entry["peak_bytes"] = max(entry["peak_bytes"] or 0, peak)
+        for k, v in fields.items():
+            if k != "rows":
+                entry[k] = v
+
+    def spans(self):
+        """Recorded spans in start order (parents before their children)."""
+        out = [dict(e) for e in self._spans.values() if e["calls"]]
+        for e in out:
+            e["seconds"] = round(e["seconds"], 6)
+        return out
+
+    def log(self, level=logging.INFO, **context):
+        """Write all spans as one JSON log line on the "tebi_books_transformers" logger."""
+        logger.log(level, json.dumps({"event": "timings", **context, "spans": self.spans()}, default=str))
+
+
+@contextmanager
+def recording(memory=False):
+    """Record span() calls made on this thread inside the block into a Recorder."""
+    rec = Recorder(memory=memory)
+    previous = getattr(_local, "recorder", None)
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _local.recorder = rec
+    try:
+        yield rec
+    finally:
+        _local.recorder = previous
+        if started:
+            tracemalloc.stop()
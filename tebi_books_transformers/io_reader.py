@@ -1,11 +1,18 @@
 import pandas as pd
-from .utils import to_float
+from .utils import parse_amounts
+from .ledger import to_ledger, memory_bytes
+from .instrument import span, enabled
 
 REQUIRED_TEBI_COLS = [
     "Date", "Account", "Account Mapped", "Amount",
     "Tax Amount", "Tax Code Mapped", "Tax Percentage"
 ]
 
+# Only these are read from a CSV: Grouped, Currency, Tax Code etc. are never used
+CSV_COLUMNS = set(REQUIRED_TEBI_COLS)
+# Text columns that repeat on every row: read straight into categoricals
+CATEGORY_COLUMNS = {c: "category" for c in ("Account", "Account Mapped", "Tax Code Mapped")}
+
 XLS_MAP = {
     "Datum": "Date",
     "Omschrijving": "Account",
@@ -15,57 +22,245 @@ XLS_MAP = {
 }
 DC_COL = "DebitCredit"  # debit/credit from macro
 
+# Excel columns worth reading: the macro's own names, already-mapped names and the sign
+EXCEL_COLUMNS = set(XLS_MAP) | set(XLS_MAP.values()) | {DC_COL, "Tax Percentage", "Tax Amount"}
+
 VAT_CODE_TO_PERC = {"VH": 21.0, "VL": 9.0}
 
-def _read_csv_autodelim_str(text):
+# Bump whenever parsing/normalization output changes (invalidates cache.ParseCache entries)
+PARSER_VERSION = 4
+
+CSV_SEPARATORS = [';', ',', '|', '\t']
+SNIFF_BYTES = 64 * 1024
+
+def _sniff_csv(data):
+    """
+    Pick (sep, encoding) from the header line and the first few KB, the same way the
+    old try-every-separator loop did: first separator giving >= 4 columns on a
+    consistent sample wins. sep is None when no candidate fits.
+    """
+    import csv
+    head = data[:SNIFF_BYTES]
+    if head.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+        head = head[3:]
+    else:
+        encoding = "utf-8"
+    text = head.decode("utf-8", errors="ignore")
+    lines = text.splitlines()
+    if len(data) > SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # last line is probably cut off
+    lines = [ln for ln in lines if ln.strip()]
+    if not lines:
+        return None, encoding
+
+    for sep in CSV_SEPARATORS:
+        try:
+            rows = list(csv.reader(lines, delimiter=sep))
+        except csv.Error:
+            continue
+        width = len(rows[0])
+        if width >= 4 and all(len(r) <= width for r in rows[1:]):
+            return sep, encoding
+    return None, encoding
+
+def _csv_options(prune):
+    """read_csv arguments that skip unused columns and read text columns as categoricals."""
+    if not prune:
+        return {}
+    return {"usecols": lambda c: str(c).strip() in CSV_COLUMNS, "dtype": CATEGORY_COLUMNS}
+
+def _read_csv_autodelim(data, prune=True):
+    """Sniff the delimiter, then parse once with the C engine straight from the bytes."""
+    from io import BytesIO
+    sep, encoding = _sniff_csv(data)
+    if sep is not None:
+        try:
+            return pd.read_csv(BytesIO(data), sep=sep, encoding=encoding, encoding_errors="ignore",
+                               **_csv_options(prune))
+        except Exception:
+            pass
+    # Sniffing failed or the sample was not representative: old behaviour
+    return _read_csv_autodelim_str(data.decode("utf-8", errors="ignore"), prune=prune)
+
+def _read_csv_autodelim_str(text, prune=True):
     from io import StringIO
-    for sep in [';', ',', '|', '\t']:
+    for sep in CSV_SEPARATORS:
         try:
-            df = pd.read_csv(StringIO(text), sep=sep, engine='python')
-            if df.shape[1] >= 4:
-                return df
+            # Width is judged on all columns, so a wrong separator can't pass with one used column
+            if pd.read_csv(StringIO(text), sep=sep, engine='python', nrows=50).shape[1] >= 4:
+                return pd.read_csv(StringIO(text), sep=sep, engine='python', **_csv_options(prune))
         except Exception:
             continue
     return pd.read_csv(StringIO(text), engine='python')
 
 def _normalize_tebi_csv(df):
     df = df.rename(columns=lambda c: str(c).strip())
-    for col in ["Amount", "Tax Amount", "Tax Percentage"]:
-        if col in df.columns:
-            df[col + "_num"] = df[col].apply(to_float)
+    unparsed = {}
+    with span("parse_amounts", rows=len(df)):
+        for col in ["Amount", "Tax Amount", "Tax Percentage"]:
+            if col in df.columns:
+                df[col + "_num"], bad = parse_amounts(df[col])
+                if len(bad):
+                    unparsed[col] = list(bad)
+    df.attrs["unparsed_amounts"] = unparsed
     if "Date" in df.columns:
-        # Use 'mixed' format to handle both ISO (YYYY-MM-DD) and European (DD/MM/YYYY) dates
-        df["Date"] = pd.to_datetime(df["Date"], format='mixed', errors="coerce").dt.date
+        with span("parse_dates", rows=len(df)):
+            # Use 'mixed' format to handle both ISO (YYYY-MM-DD) and European (DD/MM/YYYY) dates
+            df["Date"] = pd.to_datetime(df["Date"], format='mixed', errors="coerce").dt.normalize()
     missing = [c for c in REQUIRED_TEBI_COLS if c not in df.columns]
     return df, missing
 
 def _normalize_xls_macro(df):
     df = df.rename(columns={k:v for k,v in XLS_MAP.items() if k in df.columns})
+    with span("parse_amounts", rows=len(df)):
+        _macro_amounts(df)
+    if "Date" in df.columns:
+        with span("parse_dates", rows=len(df)):
+            # Use 'mixed' format to handle both ISO (YYYY-MM-DD) and European (DD/MM/YYYY) dates
+            df["Date"] = pd.to_datetime(df["Date"], format='mixed', errors="coerce").dt.normalize()
+    return df, []
+
+def _macro_amounts(df):
+    """Signed amount (Debit keeps its sign, anything else is -abs) and VAT from the VAT code."""
+    amount = pd.Series(float("nan"), index=df.index)
     if "Amount" in df.columns:
-        df["Amount_num"] = df["Amount"].apply(to_float)
+        amount, bad = parse_amounts(df["Amount"])
+        df.attrs["unparsed_amounts"] = {"Amount": list(bad)} if len(bad) else {}
         if DC_COL in df.columns:
-            df["Amount_num"] = df.apply(lambda r: r["Amount_num"] if str(r.get(DC_COL, '')).lower()=='debit' else -abs(r["Amount_num"]), axis=1)
+            debit = df[DC_COL].astype(str).str.lower() == "debit"
+            amount = amount.where(debit, -amount.abs())
+        df["Amount_num"] = amount
     if "Tax Percentage" not in df.columns:
-        df["Tax Percentage"] = df.get("Tax Code Mapped", "").map(VAT_CODE_TO_PERC)
+        codes = df["Tax Code Mapped"] if "Tax Code Mapped" in df.columns else pd.Series(None, index=df.index, dtype=object)
+        df["Tax Percentage"] = codes.map(VAT_CODE_TO_PERC)
     df["TaxPerc_num"] = df["Tax Percentage"]
     if "Tax Amount" not in df.columns:
         df["Tax Amount"] = None
-    df["TaxAmount_num"] = df.apply(lambda r: (r["Amount_num"] * (float(r["TaxPerc_num"]) / 100.0)) if pd.notna(r.get("TaxPerc_num")) and pd.notna(r.get("Amount_num")) else None, axis=1)
-    if "Date" in df.columns:
-        # Use 'mixed' format to handle both ISO (YYYY-MM-DD) and European (DD/MM/YYYY) dates  
-        df["Date"] = pd.to_datetime(df["Date"], format='mixed', errors="coerce").dt.date
-    return df, []
+    rate = pd.to_numeric(df["TaxPerc_num"], errors="coerce")
+    df["TaxAmount_num"] = amount * (rate / 100.0)
+
+def _read_excel(uploaded_file):
+    """
+    The first sheet, only the columns in EXCEL_COLUMNS. .xlsx is streamed row by
+    row by openpyxl in read-only mode, without building the workbook object model;
+    .xls (xlrd) has no streaming mode and is read with usecols.
+    """
+    if not uploaded_file.name.lower().endswith(".xlsx"):
+        return pd.read_excel(uploaded_file, usecols=lambda c: str(c).strip() in EXCEL_COLUMNS)
+    from openpyxl import load_workbook
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        keep = {}
+        for i, h in enumerate(header):
+            name = str(h).strip() if h is not None else ""
+            if name in EXCEL_COLUMNS and name not in keep:
+                keep[name] = i
+        names, idx = list(keep), list(keep.values())
+        cols = [[] for _ in names]
+        width = max(idx) + 1 if idx else 0
+        for row in rows:
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            vals = [row[i] for i in idx]
+            if all(v is None for v in vals):
+                continue  # blank row
+            for col, v in zip(cols, vals):
+                col.append(v)
+    finally:
+        wb.close()
+    return pd.DataFrame(dict(zip(names, cols)), columns=names)
+
+DEFAULT_CHUNKSIZE = 100_000
+
+def _read_csv_chunks(fh, chunksize):
+    """Yield raw CSV chunks from an open binary file, delimiter sniffed from the head."""
+    fh.seek(0)
+    head = fh.read(SNIFF_BYTES)
+    fh.seek(0)
+    sep, encoding = _sniff_csv(head)
+    if sep is None:
+        # No usable sample: parse it the old way and hand it out in slices
+        df = _read_csv_autodelim(fh.read())
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+        return
+    yield from pd.read_csv(fh, sep=sep, encoding=encoding, encoding_errors="ignore", chunksize=chunksize,
+                           **_csv_options(True))
 
-def load_file(uploaded_file):
+def _iter_normalized(uploaded_file, chunksize):
     name = uploaded_file.name.lower()
-    if name.endswith(".csv"):
-        text = uploaded_file.getvalue().decode("utf-8", errors="ignore")
-        df = _read_csv_autodelim_str(text)
-        return _normalize_tebi_csv(df)
-    elif name.endswith(".xlsx") or name.endswith(".xls"):
-        df = pd.read_excel(uploaded_file)
-        return _normalize_xls_macro(df)
-    else:
-        text = uploaded_file.getvalue().decode("utf-8", errors="ignore")
-        df = _read_csv_autodelim_str(text)
-        return _normalize_tebi_csv(df)
+    if name.endswith(".xlsx") or name.endswith(".xls"):
+        df, _ = _normalize_xls_macro(_read_excel(uploaded_file))
+        yield df
+        return
+    for chunk in _read_csv_chunks(uploaded_file, chunksize):
+        df, _ = _normalize_tebi_csv(chunk)
+        yield df
+
+def iter_days(uploaded_file, chunksize=DEFAULT_CHUNKSIZE, assume_sorted=True):
+    """
+    Streaming counterpart of load_file: reads the export in chunks and yields
+    (date, ledger) per day in date order. Rows without a valid date are dropped,
+    like the builders do.
+
+    Tebi exports are ordered by date, so with assume_sorted=True a day is handed out
+    as soon as a later day shows up and only about one day is kept in memory.
+    Rows for a day that was already yielded raise ValueError. With
+    assume_sorted=False all days are buffered first (any order, no memory benefit).
+    """
+    pending = {}
+    done_until = None
+    for df in _iter_normalized(uploaded_file, chunksize):
+        if "Date" not in df.columns:
+            raise ValueError("File has no 'Date' column")
+        df = df[df["Date"].notna()]
+        if df.empty:
+            continue
+        days = df["Date"]
+        if assume_sorted and done_until is not None and days.min() <= done_until:
+            raise ValueError(f"Rows for {days.min()} appear after that day was already processed; "
+                             "the export is not sorted by date (use assume_sorted=False)")
+        for day, g in df.groupby("Date", sort=False):
+            pending.setdefault(day, []).append(g)
+        if assume_sorted:
+            last = days.iloc[-1]
+            for day in sorted(d for d in pending if d < last):
+                yield day, to_ledger(pd.concat(pending.pop(day)))
+                done_until = day
+    for day in sorted(pending):
+        yield day, to_ledger(pd.concat(pending.pop(day)))
+
+def load_file(uploaded_file, stream=False, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Read a Tebi CSV/XLSX export -> (ledger, missing required columns); see
+    ledger.py for the columns. With stream=True returns the iter_days() generator
+    of (date, ledger) instead.
+    """
+    if stream:
+        return iter_days(uploaded_file, chunksize=chunksize)
+    name = uploaded_file.name.lower()
+    with span("load_file", file=uploaded_file.name) as s:
+        if name.endswith(".xlsx") or name.endswith(".xls"):
+            with span("read_excel") as r:
+                df = _read_excel(uploaded_file)
+                r.set(rows=len(df))
+            read_bytes = memory_bytes(df) if enabled() else None
+            df, missing = _normalize_xls_macro(df)
+        else:
+            with span("read_csv") as r:
+                df = _read_csv_autodelim(uploaded_file.getvalue())
+                r.set(rows=len(df))
+            read_bytes = memory_bytes(df) if enabled() else None
+            df, missing = _normalize_tebi_csv(df)
+        with span("to_ledger", rows=len(df)):
+            ledger = to_ledger(df)
+        s.set(rows=len(ledger))
+        if read_bytes is not None:
+            # Frame as read (used columns only) vs. the ledger that is kept
+            s.set(read_bytes=read_bytes, ledger_bytes=memory_bytes(ledger))
+    return ledger, missing
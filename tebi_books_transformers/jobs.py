@@ -0,0 +1,156 @@
+"""
+Conversions as background jobs, with their results cached. Streamlit runs the
+whole script on every interaction; with the build submitted here under a key of
+its inputs, a rerun with the same inputs finds the running or finished job
+instead of building again, and a long build doesn't hold up the session:
+
+    jobs = JobQueue(max_bytes=256 * 2**20, sizeof=lambda r: len(r["data"]))
+    job = jobs.submit(("1001", ledger_digest(ledger), "Twinfield"), build, ledger)
+    job.status, job.progress  # "running", 0.4
+    job.result                # once job.done
+
+The job function gets the Job as its first argument, to report progress. Only
+finished jobs count towards max_bytes / max_jobs; the least recently used go
+first, the one that just finished is always kept.
+"""
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .ledger import as_ledger
+from .instrument import span
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_JOBS = 32
+
+_digests = {}  # id(ledger) -> digest, removed when that ledger is collected
+_digests_lock = threading.Lock()
+
+
+def ledger_digest(df):
+    """sha256 hex of every ledger column and row, computed once per (read-only) ledger object."""
+    key = id(df)
+    with _digests_lock:
+        if key in _digests:
+            return _digests[key]
+    with span("ledger_digest", rows=len(df)):
+        rows = pd.util.hash_pandas_object(as_ledger(df), index=False).to_numpy()
+        digest = hashlib.sha256(rows.tobytes()).hexdigest()
+    with _digests_lock:
+        if key not in _digests:
+            weakref.finalize(df, _digests.pop, key, None)
+            _digests[key] = digest
+    return digest
+
+
+class Job:
+    """One submitted function call: status, progress (0..1), result or error."""
+
+    def __init__(self, key):
+        self.key = key
+        self.status = "queued"  # queued / running / done / failed
+        self.progress = 0.0
+        self.stage = ""
+        self.result = None
+        self.error = None
+        self.size = 0
+        self.started = self.finished = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    @property
+    def seconds(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def update(self, progress=None, stage=None):
+        """Report progress from inside the job function."""
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if stage is not None:
+            self.stage = stage
+
+
+class JobQueue:
+    """
+    Thread pool of jobs keyed by their inputs. submit() returns the existing job
+    for a key that is queued, running or cached; finished results are kept in an
+    LRU capped at max_bytes (sizeof(result)) and max_jobs. Thread-safe.
+    """
+
+    def __init__(self, workers=2, max_bytes=DEFAULT_MAX_BYTES, max_jobs=DEFAULT_MAX_JOBS, sizeof=None):
+        self.max_bytes = max_bytes
+        self.max_jobs = max_jobs
+        self.sizeof = sizeof or (lambda result: 0)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tebi-job")
+        self._jobs = OrderedDict()  # key -> Job, finished ones in LRU order
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._jobs)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def get(self, key):
+        """The job for key, or None."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def submit(self, key, fn, *args, **kwargs):
+        """The job for key; fn(job, *args, **kwargs) is started only if there is none."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+                self.hits += 1
+                return job
+            self.misses += 1
+            job = self._jobs[key] = Job(key)
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status, job.started = "running", time.perf_counter()
+        try:
+            result = fn(job, *args, **kwargs)
+            size = self.sizeof(result)
+        except Exception as e:
+            job.error, job.status = f"{type(e).__name__}: {e}", "failed"
+        else:
+            job.result, job.size, job.progress, job.status = result, size, 1.0, "done"
+        finally:
+            job.finished = time.perf_counter()
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                self._jobs.move_to_end(job.key)
+                self._bytes += job.size
+                self._evict()
+
+    def _evict(self):
+        finished = [k for k, j in self._jobs.items() if j.done][:-1]  # the newest stays
+        while finished and (self._bytes > self.max_bytes or len(finished) >= self.max_jobs):
+            job = self._jobs.pop(finished.pop(0))
+            self._bytes -= job.size
+
+    def discard(self, key):
+        """Forget a finished job (e.g. to build again); a running job is left alone."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.done:
+                del self._jobs[key]
+                self._bytes -= job.size
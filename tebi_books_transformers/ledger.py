@@ -0,0 +1,198 @@
+"""
+Canonical ledger frame: what load_file returns and every builder consumes.
+
+Fixed columns and dtypes, computed once at load time:
+
+    Date             datetime64[ns]  (NaT = unparseable date)
+    Account          category        source account / description
+    Account Mapped   category        GL as given in the export (NA = needs mapping)
+    Amount_cents     Int64           signed amount in cents (NA = unparseable)
+    TaxAmount_micros Int64           explicit VAT in millionths of a euro (NA = none given)
+    Tax Code Mapped  category        VAT code
+    Tax Percentage   float64         VAT rate (NaN = none given)
+
+The arrays are read-only, so builders can share one ledger without copying it and
+nothing can change it in place; use with_column() to derive a changed ledger.
+Amounts with fractions of a cent are rounded ROUND_HALF_UP when the ledger is built;
+the VAT amount keeps its six decimals, so the net (gross - VAT) is rounded once.
+"""
+import numpy as np
+import pandas as pd
+
+from .utils import parse_amounts, map_unique
+from .money import to_cents, to_micros
+
+LEDGER_DTYPES = {
+    "Date": "datetime64[ns]",
+    "Account": "category",
+    "Account Mapped": "category",
+    "Amount_cents": "Int64",
+    "TaxAmount_micros": "Int64",
+    "Tax Code Mapped": "category",
+    "Tax Percentage": "float64",
+}
+LEDGER_COLUMNS = list(LEDGER_DTYPES)
+_FLAG = "tebi_ledger"
+
+
+def _readonly(arr):
+    arr = np.array(arr, copy=True)
+    arr.flags.writeable = False
+    return arr
+
+
+def _frozen_array(values, dtype):
+    if isinstance(values, pd.Series):
+        values = values.array
+    if dtype == "category":
+        cat = values if isinstance(values, pd.Categorical) else pd.Categorical(values)
+        return pd.Categorical.from_codes(_readonly(cat.codes), categories=cat.categories)
+    if dtype == "Int64":
+        arr = pd.array(values, dtype="Int64")
+        return pd.arrays.IntegerArray(_readonly(arr.to_numpy(dtype="int64", na_value=0)), _readonly(arr.isna()))
+    return _readonly(np.asarray(values, dtype=dtype))
+
+
+def freeze(columns, index=None, attrs=None):
+    """
+    Ledger DataFrame from a {column: values} mapping (or a frame with the ledger
+    columns, e.g. after concat or unpickling) with read-only arrays and the schema dtypes.
+    """
+    if isinstance(columns, pd.DataFrame):
+        index = columns.index if index is None else index
+        attrs = dict(columns.attrs) if attrs is None else attrs
+    data = {name: _frozen_array(columns[name], dtype) for name, dtype in LEDGER_DTYPES.items()}
+    df = pd.DataFrame(data, index=index, copy=False)
+    df.attrs.update(attrs or {})
+    df.attrs[_FLAG] = True
+    return df
+
+
+def is_ledger(df):
+    return isinstance(df, pd.DataFrame) and bool(df.attrs.get(_FLAG)) and list(df.columns) == LEDGER_COLUMNS
+
+
+def _as_text(values):
+    """Raw cell values -> strings (NA stays NA), e.g. 1800 -> "1800", 4040.0 -> "4040.0"."""
+    return map_unique(values, lambda v: None if pd.isna(v) else str(v))
+
+
+def _cents_column(values, convert=to_cents):
+    cents, bad = convert(pd.to_numeric(values, errors="coerce"))
+    return pd.arrays.IntegerArray(cents, bad)
+
+
+def to_ledger(df):
+    """
+    Normalized export frame (io_reader._normalize_*) -> canonical ledger. Columns
+    the export doesn't have are all-NA, so the schema never changes.
+    """
+    def first(*names, parse=None):
+        for name in names:
+            if name in df.columns:
+                return df[name]
+        if parse in df.columns:
+            return parse_amounts(df[parse])[0]
+        return pd.Series(np.nan, index=df.index)
+
+    dates = first("Date")
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format='mixed', errors="coerce")
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+
+    return freeze({
+        "Date": dates.dt.normalize().to_numpy(dtype="datetime64[ns]"),
+        "Account": _as_text(first("Account")),
+        "Account Mapped": _as_text(first("Account Mapped")),
+        "Amount_cents": _cents_column(first("Amount_num", parse="Amount")),
+        "TaxAmount_micros": _cents_column(first("TaxAmount_num", parse="Tax Amount"), to_micros),
+        "Tax Code Mapped": _as_text(first("Tax Code Mapped")),
+        "Tax Percentage": pd.to_numeric(first("Tax Percentage_num", "TaxPerc_num", parse="Tax Percentage"),
+                                        errors="coerce").to_numpy(dtype="float64"),
+    }, index=df.index, attrs={"unparsed_amounts": df.attrs.get("unparsed_amounts", {})})
+
+
+def as_ledger(df):
+    """df itself if it is a ledger, else to_ledger(df)."""
+    return df if is_ledger(df) else to_ledger(df)
+
+
+def with_column(ledger, name, values):
+    """New ledger with one column replaced (other columns are shared, not copied)."""
+    cols = {c: ledger[c].array for c in LEDGER_COLUMNS}
+    cols[name] = values
+    return freeze(cols, index=ledger.index, attrs=dict(ledger.attrs))
+
+
+def amounts_view(ledger):
+    """
+    Ledger with Amount_num / TaxAmount_num float columns (cents / 100, micros / 1e6), the
+    shape the builders' line engines work on. A new frame; the ledger is untouched.
+    """
+    amount = ledger["Amount_cents"].astype("Float64").to_numpy(dtype="float64", na_value=np.nan) / 100
+    tax = ledger["TaxAmount_micros"].astype("Float64").to_numpy(dtype="float64", na_value=np.nan) / 1e6
+    return pd.DataFrame({
+        "Date": ledger["Date"],
+        "Account": ledger["Account"],
+        "Account Mapped": ledger["Account Mapped"],
+        "Amount_num": amount,
+        "TaxAmount_num": tax,
+        "Tax Code Mapped": ledger["Tax Code Mapped"],
+        "Tax Percentage": ledger["Tax Percentage"],
+    }, index=ledger.index, copy=False)
+
+
+def legacy_frame(ledger):
+    """Writable object-dtype frame in the pre-ledger layout (for the row-by-row engines)."""
+    view = amounts_view(ledger)
+    return pd.DataFrame({c: view[c].astype(object) if isinstance(view[c].dtype, pd.CategoricalDtype)
+                         else view[c].copy() for c in view.columns}, index=ledger.index)
+
+
+def memory_bytes(df):
+    """Memory of a frame including its strings (deep), in bytes; 0 if it can't be measured."""
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+def date_range(df):
+    """(first, last) valid date of a ledger or normalized frame, or (None, None)."""
+    if "Date" not in df.columns:
+        return None, None
+    dates = df["Date"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format='mixed', errors="coerce")
+    dates = dates.dropna()
+    if dates.empty:
+        return None, None
+    return dates.min(), dates.max()
+
+
+def output_filename(admin_code, df, target="Twinfield"):
+    """Tebi import [ADMIN] [YYYY-MM-DD] - [YYYY-MM-DD].xml (or .csv for the Exact CSV)."""
+    return period_filename(admin_code, *date_range(df), target=target)
+
+
+def period_filename(admin_code, start, end, target="Twinfield"):
+    """output_filename for an explicit first and last day (None = "unknown")."""
+    start = start.strftime("%Y-%m-%d") if start is not None else "unknown"
+    end = end.strftime("%Y-%m-%d") if end is not None else "unknown"
+    ext = ".csv" if target == "Exact Online" else ".xml"
+    return f"Tebi import {admin_code} {start} - {end}{ext}"
+
+
+def preview(ledger, n=50):
+    """First n rows for display, amounts in euros."""
+    head = ledger.head(n)
+    return pd.DataFrame({
+        "Date": head["Date"].dt.date,
+        "Account": head["Account"],
+        "Account Mapped": head["Account Mapped"],
+        "Amount": head["Amount_cents"].astype("Float64") / 100,
+        "Tax Amount": head["TaxAmount_micros"].astype("Float64") / 1e6,
+        "Tax Code Mapped": head["Tax Code Mapped"],
+        "Tax Percentage": head["Tax Percentage"],
+    })
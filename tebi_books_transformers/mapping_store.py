@@ -0,0 +1,112 @@
+"""
+Persistent GL mappings per administration (SQLite, keyed by admin code + source
+account), plus vectorized helpers to find and fill missing "Account Mapped" values.
+"""
+import sqlite3
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from .ledger import is_ledger, with_column
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gl_mappings (
+    admin_code TEXT NOT NULL,
+    account    TEXT NOT NULL,
+    gl         TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (admin_code, account)
+) WITHOUT ROWID
+"""
+
+
+class MappingStore:
+    """Source account -> GL mappings remembered per administration."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call: safe across Streamlit's threads.
+        # The inner with commits (or rolls back), closing() then closes the connection
+        with closing(sqlite3.connect(self.path, timeout=10)) as con, con:
+            yield con
+
+    def get(self, admin_code):
+        """{source account: GL} for one administration."""
+        with self._connect() as con:
+            rows = con.execute("SELECT account, gl FROM gl_mappings WHERE admin_code = ?",
+                               (str(admin_code),)).fetchall()
+        return dict(rows)
+
+    def save(self, admin_code, mapping):
+        """Insert or update mappings; blank accounts or GLs are ignored. Returns rows written."""
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        rows = [(str(admin_code), str(acc).strip(), str(gl).strip(), now)
+                for acc, gl in mapping.items() if str(acc).strip() and str(gl).strip()]
+        with self._connect() as con:
+            con.executemany(
+                "INSERT INTO gl_mappings (admin_code, account, gl, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (admin_code, account) DO UPDATE SET gl = excluded.gl, updated_at = excluded.updated_at",
+                rows,
+            )
+        return len(rows)
+
+    def delete(self, admin_code, accounts=None):
+        """Forget all mappings of an administration, or only the given accounts."""
+        with self._connect() as con:
+            if accounts is None:
+                con.execute("DELETE FROM gl_mappings WHERE admin_code = ?", (str(admin_code),))
+            else:
+                con.executemany("DELETE FROM gl_mappings WHERE admin_code = ? AND account = ?",
+                                [(str(admin_code), str(a)) for a in accounts])
+
+
+def needs_mapping(df):
+    """Boolean mask of rows without a GL in "Account Mapped"."""
+    if "Account Mapped" not in df.columns:
+        return pd.Series(True, index=df.index)
+    col = df["Account Mapped"]
+    return col.isna() | (col.astype(str).str.strip() == "")
+
+
+def missing_accounts(df):
+    """Sorted source accounts that still have rows without a GL."""
+    need = needs_mapping(df)
+    if "Account" not in df.columns or not need.any():
+        return []
+    return sorted(set(df.loc[need, "Account"].astype(str)))
+
+
+def apply_mappings(df, mapping):
+    """
+    Fill missing "Account Mapped" values from {source account: GL} in one
+    vectorized map. Existing GLs are never overwritten. Returns (df, rows filled);
+    df is a new frame only when something was filled (a new ledger for ledger input).
+    """
+    if not mapping or "Account" not in df.columns:
+        return df, 0
+    need = needs_mapping(df)
+    if not need.any():
+        return df, 0
+    fill = df.loc[need, "Account"].astype(str).map(mapping).dropna()
+    if fill.empty:
+        return df, 0
+    if is_ledger(df):
+        gl = df["Account Mapped"].astype(object)
+        gl.loc[fill.index] = fill
+        return with_column(df, "Account Mapped", gl), len(fill)
+    df = df.copy()
+    if "Account Mapped" not in df.columns:
+        df["Account Mapped"] = ""
+    elif df["Account Mapped"].dtype != object:
+        df["Account Mapped"] = df["Account Mapped"].astype(object)
+    df.loc[fill.index, "Account Mapped"] = fill
+    return df, len(fill)
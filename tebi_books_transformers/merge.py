@@ -0,0 +1,135 @@
+"""
+Several exports in one go: parse them concurrently and merge them into one ledger.
+
+Outlets send weekly (or otherwise overlapping) exports. Days that appear in more
+than one file are compared by their Date / Account / Amount rows: identical
+copies are kept once, days whose rows differ are conflicts. For a conflict the
+day is taken from the newest export (by the "generated_at" stamp in Tebi's file
+names, otherwise the later file in the upload) and the conflict is reported with
+each file's row count and total.
+
+    ledger, missing, report = load_merged(uploads)
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .io_reader import load_file
+from .ledger import freeze, LEDGER_COLUMNS
+from .money import fmt_cents
+from .instrument import span
+
+DEDUP_COLUMNS = ["Date", "Account", "Amount_cents"]
+
+# BookkeepingDayExport_2025-10-01_2025-10-31__generated_at_2025-11-17_14.29.csv
+_GENERATED_AT = re.compile(r"generated_at_(\d{4}-\d{2}-\d{2})_(\d{2})\.(\d{2})")
+
+
+def generated_at(name):
+    """Timestamp from a Tebi export file name, or None."""
+    m = _GENERATED_AT.search(str(name))
+    if not m:
+        return None
+    return pd.Timestamp(f"{m.group(1)} {m.group(2)}:{m.group(3)}")
+
+
+def load_many(uploads, loader=load_file, workers=None):
+    """
+    [(ledger, missing)] for every upload, in upload order, parsed on a thread pool.
+    Reading CSV text and the numpy conversions release the GIL, and a caching
+    loader (ParseCache.load) answers repeated files without parsing at all.
+    """
+    uploads = list(uploads)
+    if len(uploads) <= 1 or workers == 1:
+        return [loader(u) for u in uploads]
+    with ThreadPoolExecutor(max_workers=workers or min(8, len(uploads))) as pool:
+        return list(pool.map(loader, uploads))
+
+
+def _file_order(names):
+    """Positions of the files from oldest to newest export (upload order breaks ties)."""
+    stamps = [generated_at(n) for n in names]
+    return sorted(range(len(names)), key=lambda i: (stamps[i] or pd.Timestamp.min, i))
+
+
+def merge_ledgers(named):
+    """
+    One ledger from [(name, ledger)], plus a report:
+
+        {"files": [{"name", "rows", "first", "last"}],
+         "duplicate_days": ["YYYY-MM-DD", ...],   # identical in several files, kept once
+         "conflicts": [{"day", "kept", "files": [{"name", "rows", "total"}]}],
+         "rows_dropped": int}
+
+    Rows are in date order (file order within a day); rows without a valid date
+    are kept from every file.
+    """
+    named = list(named)
+    names = [n for n, _ in named]
+    report = {"files": [], "duplicate_days": [], "conflicts": [], "rows_dropped": 0}
+    for name, ledger in named:
+        dates = ledger["Date"].dropna()
+        report["files"].append({
+            "name": name, "rows": len(ledger),
+            "first": dates.min().strftime("%Y-%m-%d") if len(dates) else None,
+            "last": dates.max().strftime("%Y-%m-%d") if len(dates) else None,
+        })
+    if len(named) == 1:
+        return named[0][1], report
+
+    order = _file_order(names)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    with span("merge", rows=sum(len(l) for _, l in named)):
+        frames = [ledger[LEDGER_COLUMNS] for _, ledger in named]
+        file_no = np.repeat(np.arange(len(frames)), [len(f) for f in frames])
+        all_rows = pd.concat(frames, ignore_index=True)
+        dates = all_rows["Date"].to_numpy()
+        cents = all_rows["Amount_cents"].to_numpy(dtype="int64", na_value=0)
+
+        # Per file and day: row count, total and an order-independent hash of the rows
+        row_hash = pd.util.hash_pandas_object(all_rows[DEDUP_COLUMNS], index=False).to_numpy()
+        dated = ~np.isnat(dates)
+        per_day = pd.DataFrame({"day": dates[dated], "file": file_no[dated], "rows": 1,
+                                "total": cents[dated], "hash": row_hash[dated]})
+        per_day = per_day.groupby(["day", "file"], sort=True).sum().reset_index()  # uint64 hash sum wraps
+        per_day["rank"] = rank[per_day["file"].to_numpy()]
+
+        # The newest file's copy of every day wins; identical copies are duplicates, others conflicts
+        keep_file = per_day.sort_values(["day", "rank"]).groupby("day")["file"].last()
+        overlap = per_day[per_day["day"].duplicated(keep=False)]
+        for day, g in overlap.groupby("day", sort=True):
+            label = pd.Timestamp(day).strftime("%Y-%m-%d")
+            if g["hash"].nunique() == 1 and g["rows"].nunique() == 1:
+                report["duplicate_days"].append(label)
+                continue
+            g = g.sort_values("rank")
+            report["conflicts"].append({
+                "day": label,
+                "kept": names[int(keep_file[day])],
+                "files": [{"name": names[int(f)], "rows": int(r), "total": fmt_cents(t)}
+                          for f, r, t in zip(g["file"], g["rows"], g["total"])],
+            })
+
+        keep = ~dated
+        keep[dated] = keep_file.reindex(dates[dated]).to_numpy() == file_no[dated]
+        report["rows_dropped"] = int((~keep).sum())
+        kept = np.flatnonzero(keep)
+        kept = kept[np.lexsort((rank[file_no[kept]], dates[kept]))]  # date, then oldest file first
+        attrs = {"unparsed_amounts": {f"{name}: {col}": rows for name, ledger in named
+                                      for col, rows in ledger.attrs.get("unparsed_amounts", {}).items()}}
+        merged = freeze(all_rows.iloc[kept].reset_index(drop=True), attrs=attrs)
+    return merged, report
+
+
+def load_merged(uploads, loader=load_file, workers=None):
+    """load_many + merge_ledgers -> (ledger, missing columns of any file, report)."""
+    uploads = list(uploads)
+    with span("load_many", files=len(uploads)):
+        loaded = load_many(uploads, loader=loader, workers=workers)
+    missing = sorted({c for _, m in loaded for c in m})
+    ledger, report = merge_ledgers([(u.name, df) for u, (df, _) in zip(uploads, loaded)])
+    return ledger, missing, report
@@ -0,0 +1,146 @@
+"""
+Money as int64 cents, shared by the Twinfield and Exact builders.
+
+Amounts are converted to cents once (when the ledger is built); everything after
+that - VAT split, day totals, balance checks - is integer array arithmetic. There
+is one rounding policy, ROUND_HALF_UP (half a cent rounds away from zero).
+An explicit VAT amount keeps Tebi's six decimals (micros, millionths of a euro)
+until the net is computed, so gross - VAT is rounded once.
+"""
+from decimal import Decimal, ROUND_HALF_UP, ROUND_FLOOR
+
+import numpy as np
+import pandas as pd
+
+from .utils import to_float
+
+ROUNDING = ROUND_HALF_UP
+CENT = Decimal("0.01")
+MICROS_PER_CENT = 10_000
+
+# |amount| * rate in basis points must stay well inside int64
+_MAX_EXACT_PRODUCT = 2 ** 61
+
+
+def q2(x) -> Decimal:
+    """Decimal rounded to cents with the money rounding policy."""
+    return Decimal(x).quantize(CENT, rounding=ROUNDING)
+
+
+def to_dec(x) -> Decimal:
+    """Cell value -> Decimal (Dutch/plain strings and floats, like to_float); 0.00 if it can't be read."""
+    v = to_float(x)
+    if v is None:
+        return Decimal("0.00")
+    try:
+        return Decimal(str(v))
+    except Exception:
+        return Decimal("0.00")
+
+
+def to_cents(values):
+    """
+    Float amounts -> int64 cents (ROUND_HALF_UP of the decimal value, away from zero)
+    and a mask of values that could not be converted (NaN/inf). Whole-cent amounts
+    are exact; values within float noise of a half cent are rounded with Decimal.
+    """
+    a = np.asarray(values, dtype="float64")
+    bad = ~np.isfinite(a) | (np.abs(a) >= 1e16)
+    safe = np.where(bad, 0.0, a)
+    approx = np.abs(safe) * 100
+    cents = np.floor(approx + 0.5)
+    risky = np.abs(approx - np.floor(approx) - 0.5) <= 16 * np.spacing(np.maximum(approx, 1.0))
+    for i in np.flatnonzero(risky & ~bad):
+        cents[i] = int(q2(abs(Decimal(str(float(a[i]))))) * 100)
+    return (np.sign(safe) * cents).astype(np.int64), bad
+
+
+def to_micros(values):
+    """
+    Float amounts -> int64 micros (ROUND_HALF_UP to six decimals, Tebi's precision
+    for Tax Amount) and a mask of values that could not be converted (NaN/inf).
+    """
+    a = np.asarray(values, dtype="float64")
+    bad = ~np.isfinite(a) | (np.abs(a) >= 1e12)
+    safe = np.where(bad, 0.0, a)
+    return (np.sign(safe) * np.floor(np.abs(safe) * 1e6 + 0.5)).astype(np.int64), bad
+
+
+def micros_to_cents(values):
+    """int64 micros -> int64 cents, ROUND_HALF_UP (away from zero)."""
+    m = np.asarray(values, dtype=np.int64)
+    return np.sign(m) * ((np.abs(m) + MICROS_PER_CENT // 2) // MICROS_PER_CENT)
+
+def tolerance_cents(tolerance) -> int:
+    """Largest whole number of cents that is <= the Decimal/str/float tolerance in euros."""
+    return int((Decimal(str(tolerance)) * 100).to_integral_value(rounding=ROUND_FLOOR))
+
+
+def fmt_cents(c) -> str:
+    """12345 -> "123.45", -5 -> "-0.05"."""
+    c = int(c)
+    sign = "-" if c < 0 else ""
+    c = abs(c)
+    return f"{sign}{c // 100}.{c % 100:02d}"
+
+
+def fmt_cents_array(values):
+    """fmt_cents for a whole int64 array -> object ndarray."""
+    return np.array([fmt_cents(c) for c in np.asarray(values, dtype=np.int64).tolist()], dtype=object)
+
+
+def _int_array(values):
+    """Int64/nullable cents or micros -> (int64 array with NA as 0, known mask)."""
+    arr = pd.array(values, dtype="Int64")
+    known = ~np.asarray(arr.isna())
+    return arr.to_numpy(dtype="int64", na_value=0), known
+
+
+def vat_split(amount, tax, rate, vat_coded):
+    """
+    Net and VAT cents per line, all rows at once.
+
+    amount is cents, tax is micros (nullable), rate is the VAT percentage
+    (NaN = none) and vat_coded marks lines with a VAT code. With a VAT code and an
+    explicit VAT amount, the amount is gross: net = |amount| - |tax| (not below 0)
+    and VAT = |tax|, each rounded half up to cents from the unrounded tax. With a
+    VAT code and only a rate, the amount is net and VAT = |amount| * rate / 100,
+    rounded half up. Otherwise there is no VAT.
+
+    Returns (net, vat, has_vat) as int64, int64, bool arrays; vat is 0 without VAT.
+    """
+    amount = np.abs(np.asarray(amount, dtype=np.int64))
+    tax, tax_known = _int_array(tax)
+    tax = np.abs(tax)
+    rate = np.asarray(rate, dtype="float64")
+    vat_coded = np.asarray(vat_coded, dtype=bool)
+
+    gross = vat_coded & tax_known
+    by_rate = vat_coded & ~tax_known & ~np.isnan(rate)
+
+    net = np.where(gross, micros_to_cents(np.maximum(amount * MICROS_PER_CENT - tax, 0)), amount)
+    vat = np.where(gross, micros_to_cents(tax), 0)
+
+    # Rates with at most two decimals (21, 9, 5.5) in exact integer math; the rest via Decimal
+    with np.errstate(invalid="ignore"):
+        bp = np.rint(rate * 100)
+        exact = by_rate & (bp / 100 == rate) & (bp >= 0) & (amount * np.nan_to_num(bp) < _MAX_EXACT_PRODUCT)
+    num = amount * np.where(exact, bp, 0).astype(np.int64)
+    vat = np.where(exact, (2 * num + 10000) // 20000, vat)
+    for i in np.flatnonzero(by_rate & ~exact):
+        d = q2(Decimal(int(amount[i])) / 100 * Decimal(str(float(rate[i]))) / Decimal("100"))
+        vat[i] = int(d * 100)
+    return net, vat, gross | by_rate
+
+
+def day_totals(codes, cents, n_days):
+    """Exact int64 sum of cents per day index (codes in 0..n_days-1)."""
+    totals = np.zeros(n_days, dtype=np.int64)
+    np.add.at(totals, np.asarray(codes, dtype=np.intp), np.asarray(cents, dtype=np.int64))
+    return totals
+
+
+def needs_balancing(totals, tolerance):
+    """Days whose imbalance is not zero but within the auto-balance tolerance (euros)."""
+    totals = np.asarray(totals, dtype=np.int64)
+    return (totals != 0) & (np.abs(totals) <= tolerance_cents(tolerance))
@@ -0,0 +1,15 @@
+"""
+Output target names and the defaults of the services they go to. Kept free of
+heavy imports so the app can draw its first screen (and the CLI parse its
+arguments) before pandas, aiohttp and the transformers are loaded.
+"""
+TWINFIELD_TARGET = "Twinfield"
+EXACT_CSV_TARGET = "Exact Online"
+EXACT_XML_TARGET = "Exact Online XML"
+
+TARGETS = (TWINFIELD_TARGET, EXACT_CSV_TARGET, EXACT_XML_TARGET)
+
+EXACT_BASE_URL = "https://start.exactonline.nl"
+TWINFIELD_CONCURRENCY = 8  # requests to Twinfield in flight
+
+COMPRESSIONS = ("gzip", "zip")  # see bundle.compressed
@@ -0,0 +1,190 @@
+"""
+Exact Online XML (eExact GLTransactions) output, for the XML import of Exact
+Online. Each day's rows of the Exact CSV become one <GLTransaction> with the
+same GL accounts, amounts, VAT codes, cost center and document number. The line
+markup is composed column-wise (every distinct value is escaped once) and the
+document is written as a stream, one transaction at a time:
+
+    with open("out.xml", "wb") as out:
+        write_exact_xml(out, ledger, "1001", "10", "9899", validate=True)
+
+With validate, every chunk is checked against the bundled eExact XSD while it is
+written (an lxml pull parser keeps only the current transaction), so even a
+large file is never held in memory as a tree. The XSD is compiled once per
+process (exact_schema). The XML format has no VAT amount per line: Exact
+calculates it from the VAT code.
+
+Validation needs lxml (pip install lxml); writing does not.
+"""
+import functools
+import os
+from decimal import Decimal
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from .utils import map_unique
+from .ledger import as_ledger
+from .export_xml import XML_DECLARATION, write_xml_chunks
+from .transform_exact import _day_codes, _exact_frame
+from .instrument import span
+
+DEFAULT_XSD = Path(__file__).resolve().parent.parent / "attached_assets" / "eExact-XML_1761825910168.xsd"
+LINE_TYPES = {"KAS": "40", "MEMORIAAL": "90"}  # GLTransactionLine type: cash flow / other
+_OPEN = b'<eExact xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" ' \
+        b'xsi:noNamespaceSchemaLocation="eExact-XML.xsd"><GLTransactions>'
+_CLOSE = b"</GLTransactions></eExact>"
+
+
+class ExactXmlError(ValueError):
+    """Output that doesn't validate against the eExact XSD."""
+
+
+def _text(v):
+    return escape(str(v))
+
+
+def _attr(v):
+    return escape(str(v), {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"})
+
+
+def _iso(ddmmyyyy):
+    return f"{ddmmyyyy[6:]}-{ddmmyyyy[3:5]}-{ddmmyyyy[:2]}"
+
+
+def _wrap(values, fmt, skip_empty=True):
+    """fmt applied once per distinct value (map_unique), "" for empty values when skip_empty."""
+    return map_unique(values, lambda v: "" if skip_empty and not v else fmt(v))
+
+
+def _lines_xml(frame, journal_type):
+    """<GLTransactionLine> text of every output row (object array), composed column by column."""
+    date_col = "Datum" if journal_type == "KAS" else "Boekdatum"
+    day_codes = frame.index.to_numpy()
+    first = np.searchsorted(day_codes, day_codes)  # position of the day's first row
+    number = (np.arange(len(frame)) - first + 1).astype(str).astype(object)
+    return (
+        f'<GLTransactionLine type="{LINE_TYPES[journal_type]}" line="' + number + '">'
+        + _wrap(frame[date_col], lambda d: f"<Date>{_iso(d)}</Date>")
+        + _wrap(frame["Boekjaar"], lambda y: f'<FinYear number="{_attr(y)}" />')
+        + _wrap(frame["Periode"], lambda p: f'<FinPeriod number="{_attr(p)}" />')
+        + _wrap(frame["Grootboekrekening"], lambda g: f'<GLAccount code="{_attr(g)}" />', skip_empty=False)
+        + _wrap(frame["Omschrijving"], lambda d: f"<Description>{_text(d)}</Description>")
+        + _wrap(frame["Kostenplaats: Code"], lambda k: f'<Costcenter code="{_attr(k)}" />')
+        + _wrap(frame["Valuta"], lambda c: f'<Amount><Currency code="{_attr(c)}" />', skip_empty=False)
+        + _wrap(frame["Bedrag"], lambda a: f"<Value>{a}</Value>", skip_empty=False)
+        + _wrap(frame["BTW-code"], lambda v: f'<VAT code="{_attr(v)}" />')
+        + "</Amount></GLTransactionLine>"
+    )
+
+
+def iter_exact_xml_transactions(df, journal_code, differences_ledger, currency="EUR", cost_center_code=None,
+                                journal_type="KAS", round_tolerance=Decimal("0.05")):
+    """(day, serialized <GLTransaction>) for every dated day, in date order (b"" for a day without lines)."""
+    ledger = as_ledger(df)
+    codes, days = _day_codes(ledger)
+    with span("lines", rows=len(ledger)):
+        frame = _exact_frame(ledger, codes, days, journal_code, differences_ledger, currency, cost_center_code,
+                             journal_type, round_tolerance)
+    with span("serialize", rows=len(frame)):
+        lines = _lines_xml(frame, journal_type)
+    bounds = np.searchsorted(frame.index.to_numpy(), np.arange(len(days) + 1))
+    docs, journal = frame["Boekstuknummer"].to_numpy(), _attr(journal_code)
+    for i, day in enumerate(days):
+        a, b = bounds[i], bounds[i + 1]
+        if a == b:
+            yield day, b""
+            continue
+        head = (f'<GLTransaction entry="{_attr(docs[a])}"><Journal code="{journal}" />'
+                f"<Date>{pd.Timestamp(day).strftime('%Y-%m-%d')}</Date>")
+        yield day, (head + "".join(lines[a:b]) + "</GLTransaction>").encode("utf-8")
+
+
+def exact_xml_document(fragments):
+    """The eExact document around serialized <GLTransaction> fragments, as byte chunks."""
+    yield XML_DECLARATION + _OPEN
+    yield from fragments
+    yield _CLOSE
+
+
+def iter_exact_xml(df, admin_code, journal_code, differences_ledger, validate=False, **kwargs):
+    """
+    eExact XML as a generator of byte chunks (kwargs as for iter_exact_xml_transactions);
+    with validate, checked against the XSD on the way (ExactXmlError on the first problem).
+    """
+    txs = iter_exact_xml_transactions(df, journal_code, differences_ledger, **kwargs)
+    chunks = exact_xml_document(chunk for _, chunk in txs)
+    return validated(chunks) if validate else chunks
+
+
+def write_exact_xml(out, df, admin_code, journal_code, differences_ledger, **kwargs):
+    """Stream eExact XML into the binary file-like out; returns bytes written."""
+    return write_xml_chunks(out, iter_exact_xml(df, admin_code, journal_code, differences_ledger, **kwargs))
+
+
+# ---------- Validation ----------
+
+def _xsd_path(path=None):
+    return str(path or os.environ.get("TEBI_EXACT_XSD") or DEFAULT_XSD)
+
+
+@functools.lru_cache(maxsize=4)
+def _compiled(path, mtime):
+    from lxml import etree
+    with span("compile_xsd"):
+        return etree.XMLSchema(etree.parse(path))
+
+
+def exact_schema(path=None):
+    """The compiled eExact XSD (lxml XMLSchema), compiled once per process and file version."""
+    path = _xsd_path(path)
+    return _compiled(path, os.path.getmtime(path))
+
+
+def _problem(schema, error):
+    last = schema.error_log.last_error
+    return f"line {last.line}: {last.message}" if last is not None else str(error)
+
+
+def validated(chunks, schema=None):
+    """
+    Pass byte chunks through unchanged while validating them as one document
+    against the schema (default exact_schema()). Finished transactions are
+    dropped from the parser as it goes; raises ExactXmlError with the first
+    problem after the last chunk (libxml2 reports schema errors on close).
+    """
+    from lxml import etree
+    schema = schema or exact_schema()
+    parser = etree.XMLPullParser(events=("end",), tag="GLTransaction", schema=schema)
+    try:
+        for chunk in chunks:
+            with span("validate", rows=1):
+                parser.feed(chunk)
+                for _, el in parser.read_events():
+                    el.clear()
+                    while el.getprevious() is not None:
+                        del el.getparent()[0]
+            yield chunk
+        with span("validate"):
+            parser.close()
+    except etree.XMLSyntaxError as e:
+        raise ExactXmlError(f"Not valid eExact XML: {_problem(schema, e)}") from None
+
+
+def validate_exact_xml(source, schema=None):
+    """
+    Check an eExact XML file (path or binary file-like) against the schema by
+    streaming through it -> None if valid, else the first problem as text.
+    """
+    from lxml import etree
+    schema = schema or exact_schema()
+    try:
+        for _, el in etree.iterparse(source, events=("end",), tag="GLTransaction", schema=schema):
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        return _problem(schema, e)
+    return None
@@ -1,7 +1,12 @@
 from xml.etree.ElementTree import Element, SubElement
+import numpy as np
 import pandas as pd
-from decimal import Decimal, ROUND_HALF_UP
-from .utils import to_float
+from decimal import Decimal
+from .utils import to_float, map_unique
+from .money import q2, to_dec, fmt_cents, vat_split, day_totals, needs_balancing
+from .export_xml import iter_xml_chunks, write_xml_chunks
+from .ledger import as_ledger, legacy_frame
+from .instrument import span
 
 def _gl(code: str) -> str:
     s = str(code).strip()
@@ -10,19 +15,18 @@ def _gl(code: str) -> str:
     except Exception:
         return s  # fallback
 
-def _q2(x) -> Decimal:
-    return Decimal(x).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+ENGINES = ("columnar", "rows")
 
-def _to_dec(x) -> Decimal:
-    v = to_float(x)
-    if v is None:
-        return Decimal("0.00")
-    try:
-        return Decimal(str(v))
-    except Exception:
-        return Decimal("0.00")
+def _iter_day_groups(df):
+    """(day, group) pairs from a full frame or from an iterable of per-day batches."""
+    if isinstance(df, pd.DataFrame):
+        yield from legacy_frame(as_ledger(df)).groupby("Date")
+        return
+    # Batches from io_reader.iter_days(): already normalized and date ordered
+    for day, g in df:
+        yield day, legacy_frame(as_ledger(g))
 
-def build_twinfield_xml(
+def iter_twinfield_transactions(
     df,
     admin_code,
     journal_code,
@@ -31,114 +35,260 @@ def build_twinfield_xml(
     destiny='concept',
     cost_center_code=None,
     round_tolerance=Decimal("0.05"),  # auto-balance only if |diff| ≤ €0.05
+    engine="columnar",
 ):
-    # Ensure numerics available
-    if "Amount_num" not in df.columns and "Amount" in df.columns:
-        df["Amount_num"] = df["Amount"].apply(to_float)
-    if "TaxAmount_num" not in df.columns:
-        if "Tax Amount" in df.columns:
-            df["TaxAmount_num"] = df["Tax Amount"].apply(to_float)
-        else:
-            df["TaxAmount_num"] = None
+    """
+    Yield one <transaction> Element per day, as soon as that day is computed.
 
-    # Parse dates - try ISO format first, then European format
-    # Don't use dayfirst=True for ISO dates as it causes incorrect parsing!
-    df["Date"] = pd.to_datetime(df["Date"], format='mixed', errors="coerce").dt.date
-    txs = Element("transactions")
+    df is either the ledger from load_file (or any normalized DataFrame), or the (date, ledger)
+    batches from load_file(..., stream=True) so only one day is held at a time.
+
+    engine="columnar" computes all lines in integer cents at once (see money.py);
+    engine="rows" is the original row-by-row Decimal loop. Both produce the same XML.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+
+    if engine == "columnar":
+        for day, lines, debits, credits in _iter_day_lines(df):
+            with span("elements", rows=len(lines)):
+                t = _day_transaction_from_lines(day, lines, debits, credits, admin_code, journal_code, diff_ledger,
+                                                currency, destiny, cost_center_code, round_tolerance)
+            yield t
+        return
 
     # Group per day
-    for day, g in df.groupby("Date"):
+    for day, g in _iter_day_groups(df):
         if pd.isna(day):
             continue
+        yield _day_transaction(day, g, admin_code, journal_code, diff_ledger,
+                               currency, destiny, cost_center_code, round_tolerance)
+
+def build_twinfield_xml(
+    df,
+    admin_code,
+    journal_code,
+    diff_ledger,
+    currency='EUR',
+    destiny='concept',
+    cost_center_code=None,
+    round_tolerance=Decimal("0.05"),
+    engine="columnar",
+):
+    """
+    Complete <transactions> tree (see iter_twinfield_transactions for the arguments).
+    For large periods prefer iter_twinfield_xml / write_twinfield_xml, which never
+    hold the whole tree.
+    """
+    txs = Element("transactions")
+    with span("build_twinfield_xml", engine=engine) as s:
+        txs.extend(iter_twinfield_transactions(
+            df, admin_code, journal_code, diff_ledger, currency=currency, destiny=destiny,
+            cost_center_code=cost_center_code, round_tolerance=round_tolerance, engine=engine,
+        ))
+        s.set(rows=len(txs))
+    return txs
+
+def iter_twinfield_xml(df, admin_code, journal_code, diff_ledger, **kwargs):
+    """Twinfield XML as a generator of byte chunks, one <transaction> per chunk."""
+    txs = iter_twinfield_transactions(df, admin_code, journal_code, diff_ledger, **kwargs)
+    return iter_xml_chunks("transactions", txs)
+
+def write_twinfield_xml(out, df, admin_code, journal_code, diff_ledger, **kwargs):
+    """Stream Twinfield XML into the binary file-like out; returns bytes written."""
+    return write_xml_chunks(out, iter_twinfield_xml(df, admin_code, journal_code, diff_ledger, **kwargs))
+
+def _day_transaction(day, g, admin_code, journal_code, diff_ledger,
+                     currency, destiny, cost_center_code, round_tolerance):
+    t = Element(
+        "transaction",
+        destiny=str(destiny),
+        autobalancevat="true",
+        raisewarning="false",
+    )
+    header = SubElement(t, "header")
+    SubElement(header, "office").text   = str(admin_code)
+    SubElement(header, "code").text     = str(journal_code)
+    SubElement(header, "date").text     = day.strftime("%Y%m%d")
+    SubElement(header, "currency").text = currency
+
+    lines = SubElement(t, "lines")
+    total_debits  = Decimal("0.00")
+    total_credits = Decimal("0.00")
+
+    for _, row in g.iterrows():
+        gl = _gl(row.get("Account Mapped", ""))
+        if not gl or str(gl).lower() == "nan":
+            continue
+
+        amount_dec   = to_dec(row.get("Amount_num", 0.0))
+        tax_amt_dec  = None
+        if "TaxAmount_num" in row and row["TaxAmount_num"] is not None and not pd.isna(row["TaxAmount_num"]):
+            tax_amt_dec = to_dec(row["TaxAmount_num"])
+
+        # SAFE vatcode extract (no .strip() on floats/NaNs)
+        raw_vc = row.get("Tax Code Mapped", "")
+        vatcode = "" if (raw_vc is None or pd.isna(raw_vc)) else str(raw_vc).strip()
+
+        desc_val = row.get("Account", "")
+        desc = "" if pd.isna(desc_val) else str(desc_val)
+        desc = desc[:40]
+
+        if amount_dec.is_nan() or amount_dec == 0:
+            continue
 
-        t = SubElement(
-            txs, "transaction",
-            destiny=str(destiny),
-            autobalancevat="true",
-            raisewarning="false",
-        )
-        header = SubElement(t, "header")
-        SubElement(header, "office").text   = str(admin_code)
-        SubElement(header, "code").text     = str(journal_code)
-        SubElement(header, "date").text     = day.strftime("%Y%m%d")
-        SubElement(header, "currency").text = currency
-
-        lines = SubElement(t, "lines")
-        total_debits  = Decimal("0.00")
-        total_credits = Decimal("0.00")
-
-        for _, row in g.iterrows():
-            gl = _gl(row.get("Account Mapped", ""))
-            if not gl or str(gl).lower() == "nan":
-                continue
-
-            amount_dec   = _to_dec(row.get("Amount_num", 0.0))
-            tax_amt_dec  = None
-            if "TaxAmount_num" in row and row["TaxAmount_num"] is not None and not pd.isna(row["TaxAmount_num"]):
-                tax_amt_dec = _to_dec(row["TaxAmount_num"])
-
-            # SAFE vatcode extract (no .strip() on floats/NaNs)
-            raw_vc = row.get("Tax Code Mapped", "")
-            vatcode = "" if (raw_vc is None or pd.isna(raw_vc)) else str(raw_vc).strip()
-
-            desc_val = row.get("Account", "")
-            desc = "" if pd.isna(desc_val) else str(desc_val)
-            desc = desc[:40]
-
-            if amount_dec == 0:
-                continue
-
-            is_credit   = amount_dec > 0    # revenue
-            debitcredit = "credit" if is_credit else "debit"
-
-            # Compute NET and VAT per line
-            if vatcode and (tax_amt_dec is not None):
-                # Amount is GROSS, explicit VAT provided -> NET = Amount - VAT
-                net = _q2(abs(amount_dec) - abs(tax_amt_dec))
-                vat = _q2(abs(tax_amt_dec))
-                if net < 0:
-                    net = Decimal("0.00")
-            elif vatcode:
-                # No explicit VAT amount; try percentage -> treat Amount as NET
-                rate = row.get("Tax Percentage", None)
-                rate_f = to_float(rate) if (rate is not None and not pd.isna(rate)) else None
-                if rate_f is not None:
-                    net = _q2(abs(amount_dec))
-                    vat = _q2(abs(amount_dec) * Decimal(str(rate_f)) / Decimal("100"))
-                else:
-                    net = _q2(abs(amount_dec))
-                    vat = None
+        is_credit   = amount_dec > 0    # revenue
+        debitcredit = "credit" if is_credit else "debit"
+
+        # Compute NET and VAT per line
+        if vatcode and (tax_amt_dec is not None):
+            # Amount is GROSS, explicit VAT provided -> NET = Amount - VAT
+            net = q2(abs(amount_dec) - abs(tax_amt_dec))
+            vat = q2(abs(tax_amt_dec))
+            if net < 0:
+                net = Decimal("0.00")
+        elif vatcode:
+            # No explicit VAT amount; try percentage -> treat Amount as NET
+            rate = row.get("Tax Percentage", None)
+            rate_f = to_float(rate) if (rate is not None and not pd.isna(rate)) else None
+            if rate_f is not None:
+                net = q2(abs(amount_dec))
+                vat = q2(abs(amount_dec) * Decimal(str(rate_f)) / Decimal("100"))
             else:
-                # No VAT on this line
-                net = _q2(abs(amount_dec))
+                net = q2(abs(amount_dec))
                 vat = None
+        else:
+            # No VAT on this line
+            net = q2(abs(amount_dec))
+            vat = None
 
-            line = SubElement(lines, "line", type="detail")
-            SubElement(line, "dim1").text = gl
-            if cost_center_code:
-                SubElement(line, "dim2").text = str(cost_center_code).strip()
-            SubElement(line, "debitcredit").text = debitcredit
-            SubElement(line, "value").text = f"{net:.2f}"
-            if vatcode:
-                SubElement(line, "vatcode").text = vatcode
-                if vat is not None and vat > 0:
-                    SubElement(line, "vatvalue").text = f"{vat:.2f}"
-            SubElement(line, "description").text = desc
-
-            if debitcredit == "debit":
-                total_debits += net
-            else:
-                total_credits += net
-
-        # Round-only day-level fix
-        imbalance = total_debits - total_credits  # >0 -> need more credits; <0 -> need more debits
-        if abs(imbalance) > 0 and abs(imbalance) <= round_tolerance:
-            bal = SubElement(lines, "line", type="detail")
-            SubElement(bal, "dim1").text = _gl(diff_ledger)
-            if cost_center_code:
-                SubElement(bal, "dim2").text = str(cost_center_code).strip()
-            SubElement(bal, "debitcredit").text = "credit" if imbalance > 0 else "debit"
-            SubElement(bal, "value").text = f"{abs(imbalance):.2f}"
-            SubElement(bal, "description").text = "Rondingsverschillen TEBI"
+        line = SubElement(lines, "line", type="detail")
+        SubElement(line, "dim1").text = gl
+        if cost_center_code:
+            SubElement(line, "dim2").text = str(cost_center_code).strip()
+        SubElement(line, "debitcredit").text = debitcredit
+        SubElement(line, "value").text = f"{net:.2f}"
+        if vatcode:
+            SubElement(line, "vatcode").text = vatcode
+            if vat is not None and vat > 0:
+                SubElement(line, "vatvalue").text = f"{vat:.2f}"
+        SubElement(line, "description").text = desc
 
-    return txs
+        if debitcredit == "debit":
+            total_debits += net
+        else:
+            total_credits += net
+
+    # Round-only day-level fix
+    imbalance = total_debits - total_credits  # >0 -> need more credits; <0 -> need more debits
+    if abs(imbalance) > 0 and abs(imbalance) <= round_tolerance:
+        bal = SubElement(lines, "line", type="detail")
+        SubElement(bal, "dim1").text = _gl(diff_ledger)
+        if cost_center_code:
+            SubElement(bal, "dim2").text = str(cost_center_code).strip()
+        SubElement(bal, "debitcredit").text = "credit" if imbalance > 0 else "debit"
+        SubElement(bal, "value").text = f"{abs(imbalance):.2f}"
+        SubElement(bal, "description").text = "Rondingsverschillen TEBI"
+
+    return t
+
+
+# ---------- Columnar engine ----------
+
+def _vatcode(v):
+    return "" if (v is None or pd.isna(v)) else str(v).strip()
+
+def _desc(v):
+    return "" if (v is None or pd.isna(v)) else str(v)[:40]
+
+def _line_columns(ledger):
+    """
+    Every line field for all ledger rows at once: gl, credit, net/vat in cents and
+    the per-row debit/credit contribution to the day totals. Rows that produce no
+    line (no GL, zero or missing amount) have live=False.
+    """
+    gl = map_unique(ledger["Account Mapped"], _gl)
+    has_gl = map_unique(gl, lambda g: bool(g) and g.lower() != "nan").astype(bool)
+    amount = ledger["Amount_cents"].to_numpy(dtype="int64", na_value=0)
+    vatcode = map_unique(ledger["Tax Code Mapped"], _vatcode)
+    net, vat, _ = vat_split(amount, ledger["TaxAmount_micros"], ledger["Tax Percentage"], vatcode != "")
+
+    live = has_gl & (amount != 0)
+    credit = amount > 0  # revenue
+    return pd.DataFrame({
+        "live": live,
+        "gl": gl,
+        "credit": credit,
+        "net": net,
+        "vatcode": vatcode,
+        "vat": vat,
+        "desc": map_unique(ledger["Account"], _desc),
+        "debit_total": np.where(live & ~credit, net, 0),
+        "credit_total": np.where(live & credit, net, 0),
+    }, index=ledger.index)
+
+def _iter_day_lines(df):
+    """(day, live lines, total debits, total credits) per day, in date order."""
+    if isinstance(df, pd.DataFrame):
+        ledger = as_ledger(df)
+        with span("lines", rows=len(ledger)):
+            lines = _line_columns(ledger)
+        with span("group_days", rows=len(ledger)):
+            by_day = lines.groupby(ledger["Date"])
+            codes = by_day.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+            dated = codes >= 0
+            debits = day_totals(codes[dated], lines["debit_total"].to_numpy()[dated], by_day.ngroups)
+            credits = day_totals(codes[dated], lines["credit_total"].to_numpy()[dated], by_day.ngroups)
+        for i, (day, part) in enumerate(by_day):
+            yield day, part[part["live"]], int(debits[i]), int(credits[i])
+        return
+    # Batches from io_reader.iter_days(): already normalized and date ordered
+    for day, g in df:
+        with span("lines", rows=len(g)):
+            lines = _line_columns(as_ledger(g))
+        yield day, lines[lines["live"]], int(lines["debit_total"].sum()), int(lines["credit_total"].sum())
+
+def _day_transaction_from_lines(day, lines, total_debits, total_credits, admin_code, journal_code, diff_ledger,
+                                currency, destiny, cost_center_code, round_tolerance):
+    t = Element(
+        "transaction",
+        destiny=str(destiny),
+        autobalancevat="true",
+        raisewarning="false",
+    )
+    header = SubElement(t, "header")
+    SubElement(header, "office").text   = str(admin_code)
+    SubElement(header, "code").text     = str(journal_code)
+    SubElement(header, "date").text     = day.strftime("%Y%m%d")
+    SubElement(header, "currency").text = currency
+
+    lines_el = SubElement(t, "lines")
+    dim2 = str(cost_center_code).strip() if cost_center_code else None
+    for gl, credit, net, vatcode, vat, desc in zip(
+        lines["gl"], lines["credit"], lines["net"],
+        lines["vatcode"], lines["vat"], lines["desc"],
+    ):
+        line = SubElement(lines_el, "line", type="detail")
+        SubElement(line, "dim1").text = gl
+        if dim2 is not None:
+            SubElement(line, "dim2").text = dim2
+        SubElement(line, "debitcredit").text = "credit" if credit else "debit"
+        SubElement(line, "value").text = fmt_cents(net)
+        if vatcode:
+            SubElement(line, "vatcode").text = vatcode
+            if vat > 0:
+                SubElement(line, "vatvalue").text = fmt_cents(vat)
+        SubElement(line, "description").text = desc
+
+    # Round-only day-level fix
+    imbalance = total_debits - total_credits  # >0 -> need more credits; <0 -> need more debits
+    if needs_balancing(imbalance, round_tolerance):
+        bal = SubElement(lines_el, "line", type="detail")
+        SubElement(bal, "dim1").text = _gl(diff_ledger)
+        if dim2 is not None:
+            SubElement(bal, "dim2").text = dim2
+        SubElement(bal, "debitcredit").text = "credit" if imbalance > 0 else "debit"
+        SubElement(bal, "value").text = fmt_cents(abs(imbalance))
+        SubElement(bal, "description").text = "Rondingsverschillen TEBI"
+
+    return t
@@ -0,0 +1,243 @@
+"""
+Submit Twinfield transactions straight to the XML web service (ProcessXmlString on
+<cluster>/webservices/processxml.asmx) instead of uploading files by hand.
+
+    results = submit_offices({"1001": fragments_1001, "1002": fragments_1002},
+                             cluster_url="https://accounting.twinfield.com", access_token=token)
+
+All offices share one aiohttp session: a pool of keep-alive connections with at
+most `concurrency` requests in flight. Every office's transactions go out in
+batches of batch_size <transaction> elements. Posting a batch is not idempotent,
+so it is only sent again, with exponential backoff and jitter, when Twinfield
+provably didn't process it: HTTP 429 / 503, or no connection was made. Any other
+failure after the batch went out (another 5xx, a timeout, an unreadable answer)
+makes it indeterminate: its transactions are reported with "indeterminate" and
+not resent, check them in Twinfield first. Every transaction gets a result:
+
+    {"office", "date", "ok", "number", "messages", "attempts"[, "indeterminate"]}
+
+Only this module (and twinfield_mock) need aiohttp (pip install aiohttp).
+"""
+import asyncio
+import gzip
+import io
+import random
+import zipfile
+from xml.etree.ElementTree import fromstring, tostring
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+from .export_xml import iter_xml_fragments
+from .instrument import span
+from .targets import TWINFIELD_CONCURRENCY as DEFAULT_CONCURRENCY
+
+PROCESSXML_PATH = "/webservices/processxml.asmx"
+SOAP_ACTION = "http://www.twinfield.com/ProcessXmlString"
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+TWINFIELD_NS = "http://www.twinfield.com/"
+RETRY_STATUS = {429, 503}  # refused before the batch was processed
+
+DEFAULT_BATCH_SIZE = 25
+
+
+class SubmitError(Exception):
+    """A batch Twinfield answered with a SOAP fault or an unusable response."""
+
+
+class SubmitIndeterminate(SubmitError):
+    """A batch Twinfield may or may not have processed: it is not sent again."""
+
+
+def soap_envelope(xml, access_token, office):
+    """ProcessXmlString request for one office, xml being the (bytes) document to process."""
+    if isinstance(xml, bytes):
+        xml = xml.decode("utf-8")
+    if xml.startswith("<?xml"):
+        xml = xml.split("?>", 1)[1].lstrip()
+    return (
+        f'<?xml version="1.0" encoding="utf-8"?>'
+        f'<soap:Envelope xmlns:soap="{SOAP_NS}"><soap:Header>'
+        f'<Header xmlns="{TWINFIELD_NS}"><AccessToken>{escape(str(access_token))}</AccessToken>'
+        f'<CompanyCode>{escape(str(office))}</CompanyCode></Header>'
+        f'</soap:Header><soap:Body><ProcessXmlString xmlns="{TWINFIELD_NS}">'
+        f'<xmlRequest>{escape(xml)}</xmlRequest>'
+        f'</ProcessXmlString></soap:Body></soap:Envelope>'
+    ).encode("utf-8")
+
+
+def parse_response(body):
+    """
+    The processed document (Element) from a ProcessXmlString response; SubmitError
+    on a fault, SubmitIndeterminate when the answer can't be read.
+    """
+    try:
+        root = fromstring(body)
+    except Exception as e:
+        raise SubmitIndeterminate(f"Unreadable response: {e}") from None
+    fault = root.find(f".//{{{SOAP_NS}}}Fault")
+    if fault is not None:
+        raise SubmitError(fault.findtext("faultstring") or "SOAP fault")
+    result = root.find(f".//{{{TWINFIELD_NS}}}ProcessXmlStringResult")
+    if result is None or not (result.text or "").strip():
+        raise SubmitIndeterminate("Response has no ProcessXmlStringResult")
+    try:
+        return fromstring(result.text)
+    except Exception as e:
+        raise SubmitIndeterminate(f"Unreadable ProcessXmlStringResult: {e}") from None
+
+
+def transaction_results(processed):
+    """[{"date", "ok", "number", "messages"}] per <transaction> of a processed document."""
+    txs = [processed] if processed.tag == "transaction" else processed.findall("transaction")
+    out = []
+    for t in txs:
+        out.append({
+            "date": t.findtext("header/date"),
+            "ok": t.get("result") == "1",
+            "number": t.findtext("header/number"),
+            "messages": [f"{e.get('msgtype') or 'message'}: {e.get('msg')}" for e in t.iter() if e.get("msg")],
+        })
+    return out
+
+
+def transactions_from_output(data):
+    """
+    [(day, <transaction> bytes)] from Twinfield output as built for download: one
+    XML document, gzipped or not, or a ZIP of them (twinfield_parts, bundle; other
+    entries such as the balance report are skipped).
+    """
+    if data[:2] == b"PK":
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            return [tx for name in zf.namelist() if name.lower().endswith(".xml")
+                    for tx in transactions_from_output(zf.read(name))]
+    if data[:2] == b"\x1f\x8b":
+        return transactions_from_output(gzip.decompress(data))
+    return [(pd.Timestamp(t.findtext("header/date")), tostring(t, encoding="utf-8"))
+            for t in fromstring(data).findall("transaction")]
+
+
+def _failed(batch, message, indeterminate=False):
+    """A failed result per transaction of a batch."""
+    extra = {"indeterminate": True} if indeterminate else {}
+    return [{"date": None, "ok": False, "number": None, **extra, "messages": [message]} for _ in batch]
+
+
+class TwinfieldClient:
+    """
+    Async ProcessXmlString client on one pooled aiohttp session; use as
+    `async with TwinfieldClient(url, token) as client: await client.submit(...)`.
+    """
+
+    def __init__(self, cluster_url, access_token, concurrency=DEFAULT_CONCURRENCY, max_retries=4,
+                 backoff=0.5, timeout=300):
+        self.url = str(cluster_url).rstrip("/") + PROCESSXML_PATH
+        self.access_token = access_token
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._session = None
+        self._slots = None
+
+    async def __aenter__(self):
+        import aiohttp
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        return False
+
+    async def process(self, office, xml):
+        """
+        POST one document for one office -> (processed Element, attempts).
+        Retried only while Twinfield provably didn't process it; SubmitIndeterminate
+        when it may have.
+        """
+        import aiohttp
+        body = soap_envelope(xml, self.access_token, office)
+        headers = {"Content-Type": "text/xml; charset=utf-8", "SOAPAction": f'"{SOAP_ACTION}"'}
+        for attempt in range(1, self.max_retries + 2):
+            retry_after = None
+            try:
+                async with self._slots:  # no slot is held while backing off
+                    async with self._session.post(self.url, data=body, headers=headers) as resp:
+                        text = await resp.read()
+                        if resp.status not in RETRY_STATUS:
+                            if resp.status >= 500 and b"Fault" not in text:
+                                raise SubmitIndeterminate(f"HTTP {resp.status}")
+                            if resp.status >= 400 and b"Fault" not in text:
+                                raise SubmitError(f"HTTP {resp.status}")
+                            return parse_response(text), attempt
+                        retry_after = resp.headers.get("Retry-After")
+                        error = f"HTTP {resp.status}"
+            except aiohttp.ClientConnectorError as e:
+                error = f"{type(e).__name__}: {e}"  # no connection was made: nothing was sent
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise SubmitIndeterminate(f"{type(e).__name__}: {e}") from None
+            if attempt > self.max_retries:
+                raise SubmitError(f"Gave up after {attempt} attempts ({error})")
+            delay = self.backoff * 2 ** (attempt - 1) * (0.5 + random.random())
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay)
+
+    async def _batch(self, office, batch):
+        # Never raises: gather() would drop the results of the batches that finished
+        days = [day for day, _ in batch]
+        try:
+            doc = b"".join(iter_xml_fragments("transactions", (frag for _, frag in batch)))
+            processed, attempts = await self.process(office, doc)
+            results = transaction_results(processed)
+            if len(results) != len(batch):
+                raise SubmitIndeterminate(f"Sent {len(batch)} transactions, got {len(results)} results")
+        except SubmitIndeterminate as e:
+            results, attempts = _failed(batch, f"unknown: {e}; check Twinfield before sending this day again",
+                                        indeterminate=True), None
+        except SubmitError as e:
+            results, attempts = _failed(batch, f"error: {e}"), None
+        except Exception as e:  # the batch may have gone out
+            results, attempts = _failed(batch, f"unknown: {type(e).__name__}: {e}; check Twinfield before "
+                                               f"sending this day again", indeterminate=True), None
+        for day, r in zip(days, results):
+            r.update(office=str(office), date=pd.Timestamp(day).strftime("%Y-%m-%d"), attempts=attempts)
+        return results
+
+    async def submit(self, office, fragments, batch_size=DEFAULT_BATCH_SIZE):
+        """Result per (day, <transaction> bytes) fragment, in order; never raises for one bad batch."""
+        fragments = list(fragments)
+        batches = [fragments[i:i + batch_size] for i in range(0, len(fragments), batch_size)]
+        done = await asyncio.gather(*(self._batch(office, b) for b in batches))
+        return [r for results in done for r in results]
+
+    async def submit_many(self, jobs, batch_size=DEFAULT_BATCH_SIZE):
+        """{office: results} for {office: fragments}; all offices' batches share the pool."""
+        offices = list(jobs)
+        done = await asyncio.gather(*(self.submit(o, jobs[o], batch_size=batch_size) for o in offices))
+        return dict(zip(offices, done))
+
+
+def submit_offices(jobs, cluster_url, access_token, batch_size=DEFAULT_BATCH_SIZE, **client_options):
+    """
+    Blocking wrapper: submit {office: [(day, <transaction> bytes)]} and return
+    {office: [result, ...]}. client_options go to TwinfieldClient.
+    """
+    async def run():
+        async with TwinfieldClient(cluster_url, access_token, **client_options) as client:
+            return await client.submit_many(jobs, batch_size=batch_size)
+
+    with span("submit", rows=sum(len(f) for f in jobs.values())):
+        return asyncio.run(run())
+
+
+def summarize(results):
+    """{"sent", "ok", "failed", "indeterminate"} over the result lists of submit_offices()."""
+    flat = [r for rs in results.values() for r in rs]
+    ok = sum(r["ok"] for r in flat)
+    return {"sent": len(flat), "ok": ok, "failed": len(flat) - ok,
+            "indeterminate": sum(r.get("indeterminate", False) for r in flat)}
@@ -0,0 +1,143 @@
+"""
+Local stand-in for Twinfield's ProcessXmlString endpoint, for offline tests and
+benchmarks of twinfield_client:
+
+    python -m tebi_books_transformers.twinfield_mock --port 8765 --latency 0.05 --fail-rate 0.1
+
+then submit against cluster_url="http://127.0.0.1:8765" with access token "mock-token".
+It answers like Twinfield does for <transactions>: every transaction gets
+result="1" and a number, or result="0" with a msg when it doesn't balance (debit
+= credit, VAT included). A wrong token is a SOAP fault; fail_rate answers that
+share of requests with HTTP 503 so the client's retries can be exercised.
+"""
+import argparse
+import asyncio
+import contextlib
+import random
+from collections import defaultdict
+from decimal import Decimal
+from xml.etree.ElementTree import fromstring, tostring
+from xml.sax.saxutils import escape
+
+from .twinfield_client import PROCESSXML_PATH, SOAP_NS, TWINFIELD_NS
+
+MOCK_TOKEN = "mock-token"
+
+
+def _envelope(body):
+    return (f'<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="{SOAP_NS}">'
+            f'<soap:Body>{body}</soap:Body></soap:Envelope>').encode("utf-8")
+
+
+def _fault(message):
+    return _envelope(f"<soap:Fault><faultcode>soap:Server</faultcode>"
+                     f"<faultstring>{escape(message)}</faultstring></soap:Fault>")
+
+
+def _balanced(transaction):
+    """Debit = credit, VAT included; with autobalancevat a cent per VAT line may be off (VAT is recalculated)."""
+    totals = defaultdict(Decimal)
+    vat_lines = 0
+    for line in transaction.iter("line"):
+        side = line.findtext("debitcredit")
+        totals[side] += Decimal(line.findtext("value") or "0") + Decimal(line.findtext("vatvalue") or "0")
+        vat_lines += line.find("vatcode") is not None
+    tolerance = Decimal("0.01") * vat_lines if transaction.get("autobalancevat") == "true" else 0
+    return abs(totals["debit"] - totals["credit"]) <= tolerance
+
+
+class MockTwinfield:
+    """Request handler state: next transaction number per office and journal, request counts."""
+
+    def __init__(self, access_token=MOCK_TOKEN, latency=0.0, fail_rate=0.0, seed=None):
+        self.access_token = access_token
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.requests = self.failures = 0
+        self._rng = random.Random(seed)
+        self._numbers = defaultdict(int)
+
+    def process(self, office, doc):
+        """Processed copy of a <transactions> (or single <transaction>) document."""
+        txs = [doc] if doc.tag == "transaction" else doc.findall("transaction")
+        all_ok = True
+        for t in txs:
+            if _balanced(t):
+                journal = t.findtext("header/code")
+                self._numbers[office, journal] += 1
+                number = t.find("header").makeelement("number", {})
+                number.text = f"{2025_00000 + self._numbers[office, journal]}"
+                t.find("header").append(number)
+                t.set("result", "1")
+            else:
+                t.set("result", "0")
+                t.set("msgtype", "error")
+                t.set("msg", "The transaction is not balanced.")
+                all_ok = False
+        doc.set("result", "1" if all_ok else "0")
+        return doc
+
+    async def handle(self, request):
+        from aiohttp import web
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_rate and self._rng.random() < self.fail_rate:
+            self.failures += 1
+            return web.Response(status=503, text="Service Unavailable")
+
+        envelope = fromstring(await request.read())
+        header = envelope.find(f".//{{{TWINFIELD_NS}}}Header")
+        token = header.findtext(f"{{{TWINFIELD_NS}}}AccessToken") if header is not None else None
+        if token != self.access_token:
+            return web.Response(status=500, body=_fault("Access denied."), content_type="text/xml")
+        office = header.findtext(f"{{{TWINFIELD_NS}}}CompanyCode")
+        xml = envelope.findtext(f".//{{{TWINFIELD_NS}}}xmlRequest")
+        try:
+            processed = self.process(office, fromstring(xml))
+        except Exception as e:
+            return web.Response(status=500, body=_fault(f"Invalid xml: {e}"), content_type="text/xml")
+        result = escape(tostring(processed, encoding="unicode"))
+        body = (f'<ProcessXmlStringResponse xmlns="{TWINFIELD_NS}">'
+                f'<ProcessXmlStringResult>{result}</ProcessXmlStringResult></ProcessXmlStringResponse>')
+        return web.Response(body=_envelope(body), content_type="text/xml")
+
+
+def make_app(mock):
+    from aiohttp import web
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app.router.add_post(PROCESSXML_PATH, mock.handle)
+    return app
+
+
+@contextlib.asynccontextmanager
+async def mock_server(host="127.0.0.1", port=0, **options):
+    """Run a MockTwinfield in the current event loop; yields (cluster_url, mock)."""
+    from aiohttp import web
+    mock = MockTwinfield(**options)
+    runner = web.AppRunner(make_app(mock))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    try:
+        port = runner.addresses[0][1]
+        yield f"http://{host}:{port}", mock
+    finally:
+        await runner.cleanup()
+
+
+def main(argv=None):
+    from aiohttp import web
+    p = argparse.ArgumentParser(description="Local Twinfield ProcessXmlString stand-in.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--token", default=MOCK_TOKEN, help="Access token to accept")
+    p.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before every answer")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with HTTP 503")
+    args = p.parse_args(argv)
+    mock = MockTwinfield(access_token=args.token, latency=args.latency, fail_rate=args.fail_rate)
+    web.run_app(make_app(mock), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
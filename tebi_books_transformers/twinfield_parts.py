@@ -0,0 +1,134 @@
+"""
+Twinfield output in several smaller files, packed in one ZIP.
+
+One <transactions> document for a whole year is slow to upload and a single bad
+day makes Twinfield reject all of it. Here the day transactions are cut into
+parts by month, by a number of days and/or by a maximum size per file:
+
+    with open("out.zip", "wb") as out:
+        write_twinfield_zip(out, ledger, "1001", "TEBI", "9899", by_month=True, max_bytes=5_000_000)
+
+A part always holds whole days, and every day carries its own rounding line, so
+each file balances on its own. The day transactions are built in parallel on a
+process pool (for large ledgers) and each part is written into the ZIP as soon as
+it is complete.
+"""
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import tostring
+
+import numpy as np
+import pandas as pd
+
+from .ledger import as_ledger, freeze, period_filename
+from .export_xml import iter_xml_fragments, XML_DECLARATION
+from .bundle import write_bundle
+from .transform_twinfield import iter_twinfield_transactions
+from .instrument import span
+
+PARALLEL_MIN_ROWS = 50_000  # below this, starting worker processes costs more than it saves
+_ENVELOPE = len(XML_DECLARATION) + len(b"<transactions></transactions>")
+
+
+def _fragments(ledger, admin_code, journal_code, diff_ledger, kwargs):
+    """[(day, serialized <transaction>)] of one ledger, in date order."""
+    ledger = freeze(ledger)  # unpickled arrays are writable, and the ledger flag must be set again
+    days = pd.DatetimeIndex(ledger["Date"].dropna().unique()).sort_values()
+    els = iter_twinfield_transactions(ledger, admin_code, journal_code, diff_ledger, **kwargs)
+    return [(day, tostring(el, encoding="utf-8")) for day, el in zip(days, els)]
+
+
+def twinfield_fragments(df, admin_code, journal_code, diff_ledger, workers=None, **kwargs):
+    """
+    [(day, <transaction> bytes)] for every dated day, in date order (kwargs as for
+    iter_twinfield_transactions). Ledgers of PARALLEL_MIN_ROWS rows or more are
+    cut into runs of whole days and built on `workers` processes (default: CPU count).
+    """
+    ledger = as_ledger(df)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(ledger) < PARALLEL_MIN_ROWS:
+        with span("fragments", rows=len(ledger)):
+            return _fragments(ledger, admin_code, journal_code, diff_ledger, kwargs)
+
+    dates = ledger["Date"].to_numpy()
+    dated = np.flatnonzero(~np.isnat(dates))
+    order = dated[np.argsort(dates[dated], kind="stable")]
+    _, starts = np.unique(dates[order], return_index=True)
+    # About four runs per worker so a slow run doesn't leave the others idle
+    n_runs = min(len(starts), workers * 4)
+    cuts = starts[np.linspace(0, len(starts), n_runs, endpoint=False).astype(int)][1:]
+    with span("fragments", rows=len(ledger), workers=workers):
+        # spawn, not fork: the app calls this from one of Streamlit's threads
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_fragments, ledger.iloc[np.sort(pos)], admin_code, journal_code, diff_ledger,
+                                   kwargs)
+                       for pos in np.split(order, cuts)]
+            return [frag for fut in futures for frag in fut.result()]
+
+
+def split_parts(fragments, by_month=False, days=None, max_bytes=None):
+    """
+    Group consecutive (day, bytes) fragments into parts: a new part starts with a
+    new month (by_month), after `days` days, or when the next day would make the
+    file larger than max_bytes. A single day bigger than max_bytes gets a part of
+    its own. Returns a list of lists of fragments.
+    """
+    parts, current, size = [], [], _ENVELOPE
+    for day, frag in fragments:
+        if current and (
+            (by_month and (day.year, day.month) != (current[-1][0].year, current[-1][0].month))
+            or (days and len(current) >= days)
+            or (max_bytes and size + len(frag) > max_bytes)
+        ):
+            parts.append(current)
+            current, size = [], _ENVELOPE
+        current.append((day, frag))
+        size += len(frag)
+    if current:
+        parts.append(current)
+    return parts
+
+
+def iter_parts(fragments, admin_code, **split):
+    """(file name, XML bytes) per part; split is by_month / days / max_bytes (see split_parts)."""
+    for part in split_parts(fragments, **split):
+        name = period_filename(admin_code, part[0][0], part[-1][0], target="Twinfield")
+        yield name, b"".join(iter_xml_fragments("transactions", (frag for _, frag in part)))
+
+
+def write_zip(out, files):
+    """
+    Write (name, bytes) pairs into a ZIP on the binary file-like out, one entry
+    at a time (out may be a pipe or an HTTP response: it is never seeked).
+    Returns the names written.
+    """
+    return [entry["name"] for entry in write_bundle(out, files)]
+
+
+def write_twinfield_zip(out, df, admin_code, journal_code, diff_ledger, by_month=False, days=None,
+                        max_bytes=None, workers=None, **kwargs):
+    """Twinfield XML split into parts (see split_parts) as a ZIP written to out; returns the part names."""
+    frags = twinfield_fragments(df, admin_code, journal_code, diff_ledger, workers=workers, **kwargs)
+    return write_zip(out, iter_parts(frags, admin_code, by_month=by_month, days=days, max_bytes=max_bytes))
+
+
+def parse_split(text):
+    """
+    "month", "7d", "5mb", "500kb" or combinations like "month,5mb" ->
+    {"by_month", "days", "max_bytes"} keyword arguments for split_parts.
+    """
+    split = {"by_month": False, "days": None, "max_bytes": None}
+    for item in str(text).lower().replace(" ", "").split(","):
+        if not item:
+            continue
+        if item in ("month", "monthly"):
+            split["by_month"] = True
+        elif m := re.fullmatch(r"(\d+)d(ays?)?", item):
+            split["days"] = int(m.group(1))
+        elif m := re.fullmatch(r"(\d+(?:\.\d+)?)(kb|mb)", item):
+            split["max_bytes"] = int(float(m.group(1)) * (1024 if m.group(2) == "kb" else 1024 ** 2))
+        else:
+            raise ValueError(f"Unknown split {item!r} (use month, <N>d or <N>mb)")
+    return split
@@ -14,3 +14,57 @@ def to_float(x):
             return float(str(x))
         except Exception:
             return np.nan
+
+def _str_to_float(txt):
+    """Dutch/plain number strings -> float64 (NaN where it doesn't parse)."""
+    cleaned = txt.str.strip().str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    try:
+        return cleaned.astype("float64")
+    except (TypeError, ValueError):
+        return pd.to_numeric(cleaned, errors="coerce").astype("float64")
+
+def parse_amounts(values):
+    """
+    Column-level to_float: parses Dutch ("1.234,56", "-758,5") and plain ("150")
+    amounts for a whole Series at once, with the same results as .apply(to_float).
+
+    Returns (float64 Series, index labels of non-empty cells that could not be parsed).
+    """
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s.astype("float64"), s.index[:0]
+
+    kind = pd.api.types.infer_dtype(s, skipna=True)
+    if kind in ("integer", "floating", "mixed-integer-float", "boolean", "empty"):
+        return s.astype("float64"), s.index[:0]
+
+    notna = s.notna().to_numpy()
+    if kind == "string":
+        is_str = notna
+    else:
+        is_str = s.map(type).eq(str).to_numpy()
+
+    out = pd.Series(np.nan, index=s.index, dtype="float64")
+    if is_str.all():
+        out = _str_to_float(s)
+    elif is_str.any():
+        out[is_str] = _str_to_float(s[is_str])
+
+    # Anything the fast path could not handle (already-parsed numbers in a mixed
+    # column, "1_000", Decimal, ...) goes through to_float itself.
+    rest = notna & out.isna().to_numpy()
+    if is_str.any():
+        blank = np.zeros(len(s), dtype=bool)
+        blank[is_str] = s[is_str].str.strip().isin(["", "nan", "NaN"]).to_numpy()
+        rest &= ~blank
+    if rest.any():
+        out[rest] = s[rest].map(to_float).astype("float64")
+
+    bad = s.index[rest & out.isna().to_numpy()]
+    return out, bad
+
+def map_unique(values, fn):
+    """fn applied to every value, but called once per distinct value -> object ndarray."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    mapped = np.array([fn(u) for u in uniques], dtype=object)
+    return mapped[codes]
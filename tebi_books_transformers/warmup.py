@@ -0,0 +1,143 @@
+"""
+Cold start. The app runs on autoscale, so an instance often starts on a user's
+first request: the first screen is drawn before pandas and the transformers are
+imported, and warm_up() loads them on a background thread meanwhile, then runs a
+tiny conversion through every target so the first real one doesn't pay for the
+first-call setup (pandas' parsers, numpy ufunc loops, compiled regexes):
+
+    thread = warm_up()                    # returns at once
+    thread.join(); thread.timings         # {"import pandas": 0.31, ..., "convert": 0.05}
+
+import_times() measures the import of every module in a fresh interpreter, so
+the numbers are cold-start numbers including what a module pulls in
+(benchmarks/startup.py tracks them over time).
+"""
+import importlib
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger("tebi_books_transformers")
+
+# In the order the app needs them
+HOT_MODULES = (
+    "pandas",
+    "tebi_books_transformers.io_reader",
+    "tebi_books_transformers.cache",
+    "tebi_books_transformers.merge",
+    "tebi_books_transformers.mapping_store",
+    "tebi_books_transformers.balance_plan",
+    "tebi_books_transformers.jobs",
+    "tebi_books_transformers.incremental",
+    "tebi_books_transformers.twinfield_parts",
+    "tebi_books_transformers.transform_twinfield",
+    "tebi_books_transformers.transform_exact",
+    "tebi_books_transformers.transform_exact_xml",
+)
+# Only needed for Excel uploads / sending; imported last
+COLD_MODULES = ("openpyxl", "xlrd", "tebi_books_transformers.twinfield_client")
+
+_SAMPLE = (
+    "Date;Account;Account Mapped;Amount;Tax Amount;Tax Code Mapped;Tax Percentage\n"
+    "2025-01-01;Omzet hoog;8000;121,00;21,00;VH;21\n"
+    "2025-01-01;Omzet laag;8010;109,00;9,00;VL;9\n"
+    "2025-01-01;Pin;1100;-230,01;;;\n"
+    "02/01/2025;Omzet hoog;8000;1.210,00;210,00;VH;21\n"
+    "02/01/2025;Contant;1000;-1210,00;;;\n"
+).encode("utf-8")
+
+
+class _Sample:
+    """The upload interface load_file reads (like Streamlit's UploadedFile)."""
+    name = "warmup.csv"
+
+    def getvalue(self):
+        return _SAMPLE
+
+
+def _convert_sample():
+    """A tiny export through parsing, the balance plan and every target's builder."""
+    from .io_reader import load_file
+    from .balance_plan import balance_plan
+    from .incremental import day_digests
+    from .twinfield_parts import twinfield_fragments
+    from .transform_exact import iter_exact_day_csv
+    from .transform_exact_xml import iter_exact_xml_transactions
+    from .targets import TARGETS
+
+    df, _ = load_file(_Sample())
+    day_digests(df)
+    for target in TARGETS:
+        balance_plan(df, target)
+    twinfield_fragments(df, "WARMUP", "TEBI", "9899", workers=1)
+    for build in (iter_exact_day_csv, iter_exact_xml_transactions):
+        for _ in build(df, "10", "9899"):
+            pass
+
+
+def _warm(timings, modules, convert):
+    for name in modules:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue  # optional dependency not installed
+        timings[f"import {name}"] = round(time.perf_counter() - t0, 4)
+    if convert:
+        t0 = time.perf_counter()
+        try:
+            _convert_sample()
+        except Exception:
+            logger.exception("warm-up conversion failed")
+        timings["convert"] = round(time.perf_counter() - t0, 4)
+
+
+def warm_up(background=True, convert=True, modules=HOT_MODULES + COLD_MODULES):
+    """
+    Import the modules and (with convert) run a tiny conversion. With background,
+    on a daemon thread that is returned at once; its .timings dict ({step: seconds})
+    fills in as it goes and is logged when done. Safe to call from several threads:
+    imports are serialized by Python's import lock.
+    """
+    timings = {}
+
+    def run():
+        t0 = time.perf_counter()
+        _warm(timings, modules, convert)
+        timings["total"] = round(time.perf_counter() - t0, 4)
+        logger.info(json.dumps({"event": "warm_up", "timings": timings}))
+
+    if not background:
+        run()
+        return timings
+    thread = threading.Thread(target=run, name="tebi-warm-up", daemon=True)
+    thread.timings = timings
+    thread.start()
+    return thread
+
+
+def import_times(modules=HOT_MODULES + COLD_MODULES, repeat=1, python=sys.executable):
+    """
+    {module: {"seconds": cumulative import time, "self": own time}}, the best of
+    repeat fresh interpreters per module (python -X importtime); modules that
+    can't be imported are left out.
+    """
+    out = {}
+    for name in modules:
+        for _ in range(repeat):
+            proc = subprocess.run([python, "-X", "importtime", "-c", f"import {name}"],
+                                  capture_output=True, text=True, cwd=Path(__file__).resolve().parent.parent)
+            if proc.returncode != 0:
+                break
+            for line in proc.stderr.splitlines():
+                parts = [p.strip() for p in line.split("|")]
+                if len(parts) == 3 and parts[2] == name:
+                    self_us, cumulative_us = int(parts[0].split()[-1]), int(parts[1])
+                    if name not in out or cumulative_us / 1e6 < out[name]["seconds"]:
+                        out[name] = {"seconds": round(cumulative_us / 1e6, 4), "self": round(self_us / 1e6, 4)}
+    return out
+
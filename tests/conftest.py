@@ -0,0 +1,67 @@
+"""
+Shared fixtures: small exports from benchmarks.synthetic (or written by hand)
+loaded like uploads, and the bundled service mocks on an event loop of their own.
+"""
+import asyncio
+import contextlib
+import io
+import threading
+
+import pytest
+
+from benchmarks.synthetic import generate, write_export
+from tebi_books_transformers.io_reader import load_file
+
+HEADER = "Grouped;Currency;Date;Account;Account Mapped;Amount;Tax Amount;Tax Code;Tax Code Mapped;Tax Percentage"
+
+
+class Upload(io.BytesIO):
+    """In-memory upload (name + getvalue), like Streamlit's."""
+    def __init__(self, name, data):
+        super().__init__(data.encode("utf-8") if isinstance(data, str) else data)
+        self.name = name
+
+
+def tebi_csv(rows):
+    """A Tebi CSV from (date "YYYY-MM-DD", account, GL, amount, tax amount, VAT code) tuples (Dutch numbers)."""
+    lines = [HEADER]
+    for date, account, gl, amount, tax, vat_code in rows:
+        perc = {"VH": "21", "VL": "9"}.get(vat_code, "")
+        lines.append(f"{date};EUR;{date};{account};{gl};{amount};{tax};{'X' if vat_code else ''};{vat_code};{perc}")
+    return "\n".join(lines) + "\n"
+
+
+def load_text(name, text):
+    """Ledger of a CSV text, loaded like an upload."""
+    df, missing = load_file(Upload(name, text))
+    assert not missing
+    return df
+
+
+@pytest.fixture(scope="session")
+def synthetic(tmp_path_factory):
+    """A balanced synthetic export of 6 days as a ledger."""
+    path = write_export(tmp_path_factory.mktemp("exports") / "synthetic.csv", generate(300, days=6, seed=1))
+    return load_file(Upload(path.name, path.read_bytes()))[0]
+
+
+@contextlib.contextmanager
+def serve(mock_server, **options):
+    """
+    Run an exact_mock / twinfield_mock mock_server on a thread of its own, so the
+    blocking entry points (push_exact, submit_offices) can call it; yields (url, mock).
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = mock_server(**options)
+    try:
+        running = asyncio.run_coroutine_threadsafe(server.__aenter__(), loop).result(10)
+        try:
+            yield running
+        finally:
+            asyncio.run_coroutine_threadsafe(server.__aexit__(None, None, None), loop).result(10)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(10)
+        loop.close()
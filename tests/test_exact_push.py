@@ -0,0 +1,127 @@
+import asyncio
+import socket
+
+import pytest
+
+from tebi_books_transformers import exact_mock
+from tebi_books_transformers.exact_mock import MOCK_TOKEN
+from tebi_books_transformers.exact_push import ExactClient, PushError, PushLog, PushUnknown, push_exact
+from conftest import serve, tebi_csv, load_text
+
+FAST = {"calls_per_minute": None, "backoff": 0.01}
+
+
+@pytest.fixture
+def log(tmp_path):
+    return PushLog(tmp_path / "push.sqlite3")
+
+
+def push(url, df, log, **options):
+    return push_exact(df, "1", "10", "9899", base_url=url, access_token=MOCK_TOKEN, log=log, **{**FAST, **options})
+
+
+def posted_days(mock):
+    return sorted(entry["CashEntryLines"][0]["Date"][:10] for entry in mock.entries["1"])
+
+
+def answer_500_without_booking(monkeypatch):
+    """
+    Make every entry POST fail with a 500 that books nothing (the outcome is
+    unknown to the client); returns the list the POSTed entries are added to.
+    """
+    posts = []
+
+    def post_entry(self, lines_key, balanced):
+        async def handle(request):
+            from aiohttp import web
+            self.requests += 1
+            posts.append(await request.json())
+            return web.Response(status=500, text="Internal Server Error")
+        return handle
+    monkeypatch.setattr(exact_mock.MockExact, "post_entry", post_entry)
+    return posts
+
+
+def test_push_then_resume(synthetic, log):
+    with serve(exact_mock.mock_server) as (url, mock):
+        first = push(url, synthetic, log)
+        assert len(first["pushed"]) == 6 and first["failed"] == []
+        assert log.confirmed("1", "10").keys() == {p["day"] for p in first["pushed"]}
+
+        requests = mock.requests
+        again = push(url, synthetic, log)
+        assert len(again["skipped"]) == 6 and again["pushed"] == [] and again["changed"] == []
+        assert mock.requests == requests  # nothing was sent
+    assert len(posted_days(mock)) == 6
+
+
+def test_503_is_retried_and_every_day_booked_once(synthetic, log):
+    with serve(exact_mock.mock_server, fail_rate=0.3, seed=2) as (url, mock):
+        result = push(url, synthetic, log, max_retries=8)
+    assert mock.failures > 0
+    assert len(result["pushed"]) == 6
+    assert posted_days(mock) == sorted(set(posted_days(mock)))
+
+
+def test_lost_answers_are_looked_up_not_posted_again(log):
+    # a description with a quote: the lookup's OData filter has to escape it
+    df = load_text("kids.csv", tebi_csv([
+        ("2025-01-01", "Kid's menu", "4000", "-12,10", "-2,10", "VH"),
+        ("2025-01-01", "Pin", "1800", "12,10", "0", ""),
+        ("2025-01-02", "Kid's menu", "4000", "-24,20", "-4,20", "VH"),
+        ("2025-01-02", "Pin", "1800", "24,20", "0", ""),
+    ]))
+    with serve(exact_mock.mock_server, lost_rate=1.0) as (url, mock):
+        result = push(url, df, log)
+    assert mock.lost == 2
+    assert posted_days(mock) == ["2025-01-01", "2025-01-02"]
+    assert sorted(p["entry_id"] for p in result["pushed"]) == sorted(e["EntryID"] for e in mock.entries["1"])
+
+
+def test_unknown_outcome_is_logged_and_never_reposted(synthetic, log, monkeypatch):
+    with monkeypatch.context() as m:
+        posts = answer_500_without_booking(m)
+        with serve(exact_mock.mock_server) as (url, mock):
+            result = push(url, synthetic, log, stop_on_error=False)
+    assert len(result["failed"]) == 6
+    assert all(f["unknown"] for f in result["failed"])
+    assert len(posts) == 6  # one POST per day: a 500 is not retried
+
+    unknown = log.unknown("1", "10")
+    assert len(unknown) == 6
+    with serve(exact_mock.mock_server) as (url, mock):
+        again = push(url, synthetic, log)
+        assert again["unknown"] == sorted(unknown) and again["pushed"] == []
+        assert mock.requests == 0
+
+        # checked in Exact: forgetting the day lets the next run push it
+        day = min(unknown)
+        log.forget("1", "10", day)
+        last = push(url, synthetic, log)
+    assert [p["day"] for p in last["pushed"]] == [day]
+    assert posted_days(mock) == [day]
+    assert day not in log.unknown("1", "10")
+
+
+def test_a_refused_connection_is_retried_and_not_unknown():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # nothing listens here once the socket is closed
+
+    async def run():
+        async with ExactClient(f"http://127.0.0.1:{port}", MOCK_TOKEN, max_retries=2, **FAST) as client:
+            await client.request("POST", "1", "financialtransaction/CashEntries", {})
+
+    with pytest.raises(PushError, match="Gave up after 3 attempts") as e:
+        asyncio.run(run())
+    assert not isinstance(e.value, PushUnknown)
+
+
+def test_a_timed_out_post_is_unknown():
+    async def run():
+        async with exact_mock.mock_server(latency=1.0) as (url, _):
+            async with ExactClient(url, MOCK_TOKEN, timeout=0.2, **FAST) as client:
+                await client.request("POST", "1", "financialtransaction/CashEntries", {})
+
+    with pytest.raises(PushUnknown):
+        asyncio.run(run())
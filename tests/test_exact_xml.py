@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+from tebi_books_transformers.transform_exact_xml import (ExactXmlError, exact_schema, iter_exact_xml, validated,
+                                                         validate_exact_xml)
+
+
+def exact_xml(df, **kwargs):
+    return list(iter_exact_xml(df, "A1", "TEBI", "9899", **kwargs))
+
+
+def broken(chunks):
+    """The chunks with the second transaction's <Date> renamed, which the XSD doesn't allow."""
+    return [c.replace(b"<Date>", b"<Datum>").replace(b"</Date>", b"</Datum>") if i == 2 else c
+            for i, c in enumerate(chunks)]
+
+
+def test_valid_output_passes_through_unchanged(synthetic):
+    chunks = exact_xml(synthetic)
+    assert exact_xml(synthetic, validate=True) == chunks
+    assert validate_exact_xml(io.BytesIO(b"".join(chunks))) is None
+
+
+def test_the_schema_is_compiled_once():
+    assert exact_schema() is exact_schema()
+
+
+def test_an_invalid_transaction_fails_the_stream(synthetic):
+    chunks = broken(exact_xml(synthetic))
+    passed = []
+    with pytest.raises(ExactXmlError, match="Datum"):
+        for chunk in validated(chunks):
+            passed.append(chunk)
+    assert passed == chunks  # the error comes when the document is closed
+
+
+def test_validate_exact_xml_names_the_first_problem(synthetic, tmp_path):
+    path = tmp_path / "bad.xml"
+    path.write_bytes(b"".join(broken(exact_xml(synthetic))))
+    assert "Datum" in validate_exact_xml(str(path))
+    assert validate_exact_xml(io.BytesIO(b"<eExact><GLTransactions>")) is not None
@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from tebi_books_transformers import incremental
+from tebi_books_transformers.incremental import FragmentStore, build_incremental, changed_days, day_digests
+from tebi_books_transformers.ledger import with_column
+from tebi_books_transformers.targets import TWINFIELD_TARGET, EXACT_CSV_TARGET, EXACT_XML_TARGET
+from tebi_books_transformers.transform_twinfield import iter_twinfield_xml
+from tebi_books_transformers.transform_exact import iter_exact_csv
+from tebi_books_transformers.transform_exact_xml import iter_exact_xml
+
+FULL = {
+    TWINFIELD_TARGET: lambda df, **kw: b"".join(iter_twinfield_xml(df, "A1", "TEBI", "9899", **kw)),
+    EXACT_CSV_TARGET: lambda df, **kw: b"".join(iter_exact_csv(df, "A1", "TEBI", "9899", **kw)),
+    EXACT_XML_TARGET: lambda df, **kw: b"".join(iter_exact_xml(df, "A1", "TEBI", "9899", **kw)),
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FragmentStore(tmp_path / "fragments.sqlite3")
+
+
+def build(store, df, target, **kwargs):
+    return build_incremental(store, df, target, "A1", "TEBI", "9899", **kwargs)
+
+
+def bump_first_row_of(df, day):
+    """The ledger with one row of day (YYYY-MM-DD) a cent more."""
+    cents = df["Amount_cents"].array.copy()
+    cents[int((df["Date"] == day).to_numpy().nonzero()[0][0])] += 1
+    return with_column(df, "Amount_cents", cents)
+
+
+@pytest.mark.parametrize("target", list(FULL))
+def test_output_matches_a_full_build_cold_and_warm(store, synthetic, target):
+    cold, report = build(store, synthetic, target)
+    assert cold == FULL[target](synthetic)
+    assert (report["rebuilt"], report["reused"], len(report["new"])) == (6, 0, 6)
+
+    warm, report = build(store, synthetic, target)
+    assert warm == cold
+    assert (report["rebuilt"], report["reused"], len(report["unchanged"])) == (0, 6, 6)
+
+
+def test_only_the_changed_day_is_rebuilt(store, synthetic):
+    build(store, synthetic, TWINFIELD_TARGET)
+    changed = bump_first_row_of(synthetic, "2025-01-03")
+    out, report = build(store, changed, TWINFIELD_TARGET)
+    assert out == FULL[TWINFIELD_TARGET](changed)
+    assert report["changed"] == ["2025-01-03"]
+    assert (report["rebuilt"], report["reused"]) == (1, 5)
+
+
+def test_other_settings_do_not_reuse_fragments(store, synthetic):
+    build(store, synthetic, TWINFIELD_TARGET)
+    out, report = build(store, synthetic, TWINFIELD_TARGET, cost_center_code="KPL1")
+    assert out == FULL[TWINFIELD_TARGET](synthetic, cost_center_code="KPL1")
+    assert report["rebuilt"] == 6
+    # but the days themselves didn't change since the last conversion
+    assert len(report["unchanged"]) == 6
+
+
+def test_a_new_fragment_version_rebuilds_everything(store, synthetic, monkeypatch):
+    build(store, synthetic, EXACT_CSV_TARGET)
+    monkeypatch.setattr(incremental, "FRAGMENT_VERSION", incremental.FRAGMENT_VERSION + 1)
+    _, report = build(store, synthetic, EXACT_CSV_TARGET)
+    assert report["rebuilt"] == 6
+
+
+def test_day_digests_cover_every_row_of_the_day(synthetic):
+    before = {d.strftime("%Y-%m-%d"): g for d, _, g in day_digests(synthetic)}
+    after = {d.strftime("%Y-%m-%d"): g for d, _, g in day_digests(bump_first_row_of(synthetic, "2025-01-05"))}
+    assert [d for d in before if before[d] != after[d]] == ["2025-01-05"]
+
+
+def test_changed_days():
+    assert changed_days({"2025-01-01": "a", "2025-01-02": "b", "2024-12-31": "z"},
+                        {"2025-01-01": "a", "2025-01-02": "c", "2025-01-03": "d"}) == {
+        "new": ["2025-01-03"], "changed": ["2025-01-02"], "unchanged": ["2025-01-01"]}
+
+
+def test_prune_drops_only_fragments_unused_for_long(store):
+    store.put("p", {"old": b"<old/>", "recent": b"<recent/>"})
+    with sqlite3.connect(store.path) as con:
+        con.execute("UPDATE day_fragments SET used_at = '2020-01-01T00:00:00+00:00' WHERE digest = 'old'")
+    con.close()
+    assert store.prune(older_than_days=90) == 1
+    assert store.get("p", ["old", "recent"]) == {"recent": b"<recent/>"}
+
+
+def test_reading_a_fragment_keeps_it(store):
+    store.put("p", {"d": b"<d/>"})
+    with sqlite3.connect(store.path) as con:
+        con.execute("UPDATE day_fragments SET used_at = '2020-01-01T00:00:00+00:00'")
+    con.close()
+    assert store.get("p", ["d"]) == {"d": b"<d/>"}
+    assert store.prune(older_than_days=90) == 0
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from tebi_books_transformers.ledger import is_ledger
+from tebi_books_transformers.merge import generated_at, merge_ledgers, load_merged
+from conftest import Upload, tebi_csv, load_text
+
+OLD = "BookkeepingDayExport_2025-01-01_2025-01-02__generated_at_2025-01-03_09.00.csv"
+NEW = "BookkeepingDayExport_2025-01-02_2025-01-03__generated_at_2025-01-04_09.00.csv"
+
+
+def day(date, lunch="-121,00", pin="121,00"):
+    return [(date, "Lunch", "4000", lunch, "-21,00", "VH"), (date, "Pin", "1800", pin, "0", "")]
+
+
+def test_generated_at():
+    assert generated_at(OLD) == pd.Timestamp("2025-01-03 09:00")
+    assert generated_at("export.csv") is None
+
+
+def test_identical_overlap_is_kept_once():
+    old = load_text(OLD, tebi_csv(day("2025-01-01") + day("2025-01-02")))
+    new = load_text(NEW, tebi_csv(day("2025-01-02") + day("2025-01-03")))
+    merged, report = merge_ledgers([(NEW, new), (OLD, old)])
+    assert is_ledger(merged)
+    assert report["duplicate_days"] == ["2025-01-02"]
+    assert report["conflicts"] == []
+    assert report["rows_dropped"] == 2
+    assert merged["Date"].dt.strftime("%Y-%m-%d").tolist() == ["2025-01-01"] * 2 + ["2025-01-02"] * 2 + ["2025-01-03"] * 2
+
+
+def test_conflicting_day_comes_from_the_newest_export():
+    old = load_text(OLD, tebi_csv(day("2025-01-01") + day("2025-01-02")))
+    new = load_text(NEW, tebi_csv(day("2025-01-02", "-131,00", "131,00") + day("2025-01-03")))
+    # upload order doesn't matter: the generated_at stamp decides
+    merged, report = merge_ledgers([(NEW, new), (OLD, old)])
+    assert report["duplicate_days"] == []
+    [conflict] = report["conflicts"]
+    assert conflict["day"] == "2025-01-02"
+    assert conflict["kept"] == NEW
+    assert [(f["name"], f["rows"], f["total"]) for f in conflict["files"]] == [(OLD, 2, "0.00"), (NEW, 2, "0.00")]
+    jan2 = merged[merged["Date"] == "2025-01-02"]
+    assert sorted(jan2["Amount_cents"].tolist()) == [-13100, 13100]
+
+
+def test_without_stamps_the_later_upload_wins():
+    first = load_text("a.csv", tebi_csv(day("2025-01-01")))
+    second = load_text("b.csv", tebi_csv(day("2025-01-01", "-100,00", "100,00")))
+    merged, report = merge_ledgers([("a.csv", first), ("b.csv", second)])
+    assert report["conflicts"][0]["kept"] == "b.csv"
+    assert sorted(merged["Amount_cents"].tolist()) == [-10000, 10000]
+
+
+def test_single_file_is_returned_as_is():
+    only = load_text("a.csv", tebi_csv(day("2025-01-01")))
+    merged, report = merge_ledgers([("a.csv", only)])
+    assert merged is only
+    assert report["files"] == [{"name": "a.csv", "rows": 2, "first": "2025-01-01", "last": "2025-01-01"}]
+
+
+def test_load_merged_parses_every_upload():
+    uploads = [Upload(OLD, tebi_csv(day("2025-01-01") + day("2025-01-02"))),
+               Upload(NEW, tebi_csv(day("2025-01-02") + day("2025-01-03")))]
+    merged, missing, report = load_merged(uploads, workers=2)
+    assert missing == []
+    assert len(merged) == 6
+    assert [f["rows"] for f in report["files"]] == [4, 4]
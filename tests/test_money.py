@@ -0,0 +1,96 @@
+import csv
+import io
+import re
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tebi_books_transformers.money import (to_cents, to_micros, micros_to_cents, vat_split, needs_balancing,
+                                           tolerance_cents, fmt_cents, fmt_cents_array, day_totals)
+from tebi_books_transformers.transform_twinfield import build_twinfield_xml
+from tebi_books_transformers.transform_exact import build_exact_csv
+from tebi_books_transformers.export_xml import xml_to_bytes
+from conftest import tebi_csv, load_text
+
+
+def test_to_cents_rounds_half_up_away_from_zero():
+    cents, bad = to_cents([1.005, 0.125, -0.125, 2.675, -0.005, 12.34, 0.0])
+    assert cents.tolist() == [101, 13, -13, 268, -1, 1234, 0]
+    assert not bad.any()
+
+
+def test_to_cents_masks_what_it_cannot_convert():
+    cents, bad = to_cents([np.nan, np.inf, 1e17, 1.0])
+    assert bad.tolist() == [True, True, True, False]
+    assert cents.tolist() == [0, 0, 0, 100]
+
+
+def test_micros_keep_six_decimals_and_round_half_up_to_cents():
+    micros, bad = to_micros([0.125, -0.125, 1.234565, 0.004999, np.nan])
+    assert micros[:4].tolist() == [125000, -125000, 1234565, 4999]
+    assert bad.tolist() == [False, False, False, False, True]
+    assert micros_to_cents(micros[:4]).tolist() == [13, -13, 123, 0]
+    assert micros_to_cents([5000, -5000, 4999]).tolist() == [1, -1, 0]
+
+
+def test_vat_split_gross_amount_rounds_once_from_the_unrounded_tax():
+    # 10.00 gross with 0.125 VAT: net 9.875 -> 9.88, VAT 0.125 -> 0.13
+    net, vat, has_vat = vat_split(np.array([-1000]), pd.array([-125000], dtype="Int64"),
+                                  np.array([21.0]), np.array([True]))
+    assert (net.tolist(), vat.tolist(), has_vat.tolist()) == ([988], [13], [True])
+
+
+def test_vat_split_net_amount_with_rate_only():
+    amount = np.array([1000, 1050, 333, 1000])
+    tax = pd.array([None, None, None, None], dtype="Int64")
+    rate = np.array([21.0, 9.0, 5.125, np.nan])
+    net, vat, has_vat = vat_split(amount, tax, rate, np.array([True, True, True, True]))
+    assert net.tolist() == [1000, 1050, 333, 1000]
+    # 10.50 * 9% = 0.945 -> 0.95; 3.33 * 5.125% = 0.1706... -> 0.17 (Decimal path)
+    assert vat.tolist() == [210, 95, 17, 0]
+    assert has_vat.tolist() == [True, True, True, False]
+
+
+def test_vat_split_without_vat_code_has_no_vat():
+    net, vat, has_vat = vat_split(np.array([-1210]), pd.array([-210000], dtype="Int64"),
+                                  np.array([21.0]), np.array([False]))
+    assert (net.tolist(), vat.tolist(), has_vat.tolist()) == ([1210], [0], [False])
+
+
+def test_vat_split_net_is_never_negative():
+    net, vat, _ = vat_split(np.array([100]), pd.array([2_000_000], dtype="Int64"), np.array([21.0]),
+                            np.array([True]))
+    assert (net.tolist(), vat.tolist()) == ([0], [200])
+
+
+@pytest.mark.parametrize("tolerance, cents", [(Decimal("0.05"), 5), ("0.05", 5), (0.05, 5), ("0.019", 1), (0, 0)])
+def test_tolerance_cents_rounds_down(tolerance, cents):
+    assert tolerance_cents(tolerance) == cents
+
+
+def test_needs_balancing_only_within_the_tolerance():
+    totals = np.array([0, 1, -5, 6, -6])
+    assert needs_balancing(totals, Decimal("0.05")).tolist() == [False, True, True, False, False]
+
+
+def test_day_totals_and_formatting():
+    totals = day_totals([0, 1, 0, 1], [105, -5, -100, 2], 3)
+    assert totals.tolist() == [5, -3, 0]
+    assert [fmt_cents(c) for c in (12345, -5, 0, -100)] == ["123.45", "-0.05", "0.00", "-1.00"]
+    assert fmt_cents_array([1, -101]).tolist() == ["0.01", "-1.01"]
+
+
+def test_twinfield_and_exact_round_a_half_cent_vat_the_same_way():
+    ledger = load_text("ties.csv", tebi_csv([
+        ("2025-01-01", "Lunch", "4000", "-10,00", "-0,125", "VH"),
+        ("2025-01-01", "Drinks", "4010", "-20,00", "-2,105", "VL"),
+        ("2025-01-01", "Pin", "1800", "30,00", "0", ""),
+    ]))
+    xml = xml_to_bytes(build_twinfield_xml(ledger, "1", "TEBI", "9899")).decode("utf-8")
+    assert re.findall(r"<vatvalue>([^<]*)</vatvalue>", xml) == ["0.13", "2.11"]
+    assert re.findall(r"<value>([^<]*)</value>", xml)[:2] == ["9.88", "17.90"]
+
+    rows = list(csv.DictReader(io.StringIO(build_exact_csv(ledger, "1", "10", "9899").decode("utf-8-sig"))))
+    assert [r["BTW-bedrag"] for r in rows if r["BTW-code"]] == ["0.13", "2.11"]
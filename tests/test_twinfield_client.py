@@ -0,0 +1,135 @@
+import asyncio
+import gzip
+import io
+import socket
+import zipfile
+
+import pytest
+
+from tebi_books_transformers import twinfield_client, twinfield_mock
+from tebi_books_transformers.twinfield_client import (TwinfieldClient, submit_offices, summarize,
+                                                      transactions_from_output)
+from tebi_books_transformers.twinfield_mock import MOCK_TOKEN
+from tebi_books_transformers.twinfield_parts import twinfield_fragments
+from tebi_books_transformers.transform_twinfield import iter_twinfield_xml
+from conftest import serve
+
+FAST = {"backoff": 0.01}
+
+
+@pytest.fixture(scope="module")
+def fragments(synthetic):
+    return twinfield_fragments(synthetic, "1", "TEBI", "9899", workers=1)
+
+
+def submit(url, fragments, token=MOCK_TOKEN, **options):
+    return submit_offices({"1": fragments}, url, token, batch_size=2, **{**FAST, **options})
+
+
+def answer(monkeypatch, status=200, body=b"", processed=None):
+    """
+    Make the mock answer every request with status and body, or (processed)
+    with its own answer to a processed document changed by processed(doc).
+    Returns the list of request bodies it got.
+    """
+    seen = []
+    handle = twinfield_mock.MockTwinfield.handle
+    process = twinfield_mock.MockTwinfield.process
+
+    async def fixed(self, request):
+        from aiohttp import web
+        seen.append(await request.read())
+        if processed is not None:
+            return await handle(self, request)
+        return web.Response(status=status, body=body, content_type="text/xml")
+    monkeypatch.setattr(twinfield_mock.MockTwinfield, "handle", fixed)
+    if processed is not None:
+        monkeypatch.setattr(twinfield_mock.MockTwinfield, "process",
+                            lambda self, office, doc: processed(process(self, office, doc)))
+    return seen
+
+
+def test_every_day_is_booked(fragments):
+    with serve(twinfield_mock.mock_server) as (url, mock):
+        results = submit(url, fragments)
+    assert summarize(results) == {"sent": 6, "ok": 6, "failed": 0, "indeterminate": 0}
+    assert [r["date"] for r in results["1"]] == [day.strftime("%Y-%m-%d") for day, _ in fragments]
+    assert mock.requests == 3
+
+
+def test_503_is_retried(fragments):
+    with serve(twinfield_mock.mock_server, fail_rate=0.4, seed=3) as (url, mock):
+        results = submit(url, fragments, max_retries=8)
+    assert mock.failures > 0
+    assert summarize(results)["ok"] == 6
+    assert max(r["attempts"] for r in results["1"]) > 1
+
+
+def test_a_fault_rejects_the_batch(fragments):
+    with serve(twinfield_mock.mock_server) as (url, _):
+        results = submit(url, fragments, token="wrong")
+    assert summarize(results) == {"sent": 6, "ok": 0, "failed": 6, "indeterminate": 0}
+    assert "Access denied." in results["1"][0]["messages"][0]
+
+
+@pytest.mark.parametrize("status, body", [
+    (500, b"Internal Server Error"),  # a 5xx without a SOAP fault
+    (504, b"Gateway Timeout"),
+    (200, b"<not xml"),  # an unreadable answer
+])
+def test_a_lost_answer_is_indeterminate_and_not_resent(fragments, monkeypatch, status, body):
+    seen = answer(monkeypatch, status, body)
+    with serve(twinfield_mock.mock_server) as (url, _):
+        results = submit(url, fragments)
+    assert summarize(results) == {"sent": 6, "ok": 0, "failed": 6, "indeterminate": 6}
+    assert len(seen) == 3  # one request per batch
+    assert all(r["messages"][0].startswith("unknown:") for r in results["1"])
+
+
+def test_missing_results_make_the_batch_indeterminate(fragments, monkeypatch):
+    def drop_one(doc):
+        doc.remove(doc.findall("transaction")[-1])
+        return doc
+    answer(monkeypatch, processed=drop_one)
+    with serve(twinfield_mock.mock_server) as (url, _):
+        results = submit(url, fragments)
+    assert summarize(results)["indeterminate"] == 6
+
+
+def test_an_unexpected_error_fails_only_its_batch(fragments, monkeypatch):
+    build = twinfield_client.iter_xml_fragments
+
+    def broken_second_batch(tag, frags):
+        frags = list(frags)
+        if frags[0] == fragments[2][1]:
+            raise RuntimeError("boom")
+        return build(tag, frags)
+    monkeypatch.setattr(twinfield_client, "iter_xml_fragments", broken_second_batch)
+    with serve(twinfield_mock.mock_server) as (url, _):
+        results = submit(url, fragments)
+    assert [r["ok"] for r in results["1"]] == [True, True, False, False, True, True]
+    assert results["1"][2]["indeterminate"] and "RuntimeError: boom" in results["1"][2]["messages"][0]
+
+
+def test_a_refused_connection_is_retried_and_not_indeterminate(fragments):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # nothing listens here once the socket is closed
+
+    async def run():
+        async with TwinfieldClient(f"http://127.0.0.1:{port}", MOCK_TOKEN, max_retries=2, **FAST) as client:
+            return await client.submit("1", fragments[:1])
+
+    [result] = asyncio.run(run())
+    assert not result["ok"] and "indeterminate" not in result
+    assert "Gave up after 3 attempts" in result["messages"][0]
+
+
+def test_transactions_from_output_reads_every_download_format(synthetic, fragments):
+    xml = b"".join(iter_twinfield_xml(synthetic, "1", "TEBI", "9899"))
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("part 1.xml", xml)
+        zf.writestr("part 1 balance.csv", "date;debit\n")
+    for data in (xml, gzip.compress(xml), buf.getvalue()):
+        assert transactions_from_output(data) == fragments